@@ -113,7 +113,141 @@ bool get_cstring(DictionaryIterator *data, char *dest, uint8_t key, size_t max_l
   }
 }
 
-bool validate_data_message(DictionaryIterator *data, DataMessage *out) {
+static bool fail_bad_packing(uint8_t key) {
+#ifndef PBL_PLATFORM_APLITE
+  APP_LOG(APP_LOG_LEVEL_ERROR, "Can't unpack value for key %d", (int)key);
+#endif
+  return false;
+}
+
+// Start unpacking into dest, an array of values `size` bytes each: in append
+// mode, move the values already there along to make room for the new ones
+static bool unpack_header(Tuple *t, uint16_t previous_count, uint8_t *dest, uint8_t *previous, size_t size, uint16_t *count, uint16_t *new_count) {
+  if (t->length < PACKED_HEADER_LENGTH) {
+    return false;
+  }
+  *new_count = t->value->data[1];
+  if (t->value->data[0] == PACKED_MODE_FULL) {
+    *count = *new_count;
+  } else if (t->value->data[0] == PACKED_MODE_APPEND && previous != NULL) {
+    *count = previous_count;
+    if (*new_count <= *count) {
+      memcpy(dest + *new_count * size, previous, (*count - *new_count) * size);
+    }
+  } else {
+    return false;
+  }
+  return *new_count <= *count && *count <= GRAPH_MAX_SGV_COUNT;
+}
+
+static bool unpack_sgvs(Tuple *t, DataMessage *previous, DataMessage *out) {
+  uint16_t new_count;
+  if (!unpack_header(t, previous ? previous->sgv_count : 0, (uint8_t*)out->sgvs, previous ? (uint8_t*)previous->sgvs : NULL, sizeof(uint16_t), &out->sgv_count, &new_count)) {
+    return false;
+  }
+  uint8_t *packed = t->value->data;
+  uint16_t p = PACKED_HEADER_LENGTH;
+  uint16_t i = 0;
+  int32_t sgv = -1;
+  while (i < new_count) {
+    if (p >= t->length) {
+      return false;
+    }
+    uint8_t token = packed[p++];
+    if (token == PACKED_ABSOLUTE) {
+      if (p + 1 >= t->length) {
+        return false;
+      }
+      sgv = (packed[p] << 8) | packed[p + 1];
+      p += 2;
+      if (sgv > PACKED_MAX_SGV) {
+        return false;
+      }
+      out->sgvs[i++] = sgv;
+    } else if (token > PACKED_RUN_BASE) {
+      uint8_t missing = token - PACKED_RUN_BASE;
+      if (i + missing > new_count) {
+        return false;
+      }
+      memset(out->sgvs + i, 0, missing * sizeof(uint16_t));
+      i += missing;
+    } else {
+      // A difference from the previous SGV, so there must be one
+      if (sgv < 0) {
+        return false;
+      }
+      sgv += token - PACKED_DELTA_ZERO;
+      if (sgv < 1 || sgv > PACKED_MAX_SGV) {
+        return false;
+      }
+      out->sgvs[i++] = sgv;
+    }
+  }
+  return true;
+}
+
+static bool unpack_graph_extra(Tuple *t, DataMessage *previous, DataMessage *out) {
+  uint16_t count, new_count;
+  uint8_t *dest = (uint8_t*)out->graph_extra;
+  if (!unpack_header(t, previous ? previous->sgv_count : 0, dest, previous ? (uint8_t*)previous->graph_extra : NULL, sizeof(GraphExtra), &count, &new_count)) {
+    return false;
+  }
+  if (count != out->sgv_count) {
+    return false;
+  }
+  uint8_t *packed = t->value->data;
+  uint16_t p = PACKED_HEADER_LENGTH;
+  uint16_t i = 0;
+  while (i < new_count) {
+    if (p >= t->length) {
+      return false;
+    }
+    uint8_t token = packed[p++];
+    if (token <= PACKED_RUN_BASE) {
+      dest[i++] = token;
+    } else if (token < PACKED_ABSOLUTE && i > 0 && i + token - PACKED_RUN_BASE <= new_count) {
+      memset(dest + i, dest[i - 1], token - PACKED_RUN_BASE);
+      i += token - PACKED_RUN_BASE;
+    } else {
+      return false;
+    }
+  }
+  return true;
+}
+
+static bool get_sgvs(DictionaryIterator *data, DataMessage *previous, DataMessage *out) {
+  Tuple *t = dict_find(data, MESSAGE_KEY_sgvsPacked);
+  if (t == NULL) {
+    // Unpacked, as sent by older versions of the JS and by other clients: a byte per SGV, halved
+    static uint8_t halved[GRAPH_MAX_SGV_COUNT];
+    if (!get_byte_array(data, halved, MESSAGE_KEY_sgvs, GRAPH_MAX_SGV_COUNT, true, NULL)
+        || !get_byte_array_length(data, &out->sgv_count, GRAPH_MAX_SGV_COUNT, MESSAGE_KEY_sgvs)) {
+      return false;
+    }
+    for (uint16_t i = 0; i < out->sgv_count; i++) {
+      out->sgvs[i] = halved[i] * 2;
+    }
+  } else if (t->type != TUPLE_BYTE_ARRAY) {
+    return fail_unexpected_type(MESSAGE_KEY_sgvsPacked, t->type, "byte array");
+  } else if (!unpack_sgvs(t, previous, out)) {
+    return fail_bad_packing(MESSAGE_KEY_sgvsPacked);
+  }
+  return true;
+}
+
+static bool get_graph_extra(DictionaryIterator *data, DataMessage *previous, DataMessage *out, uint8_t *zeroes) {
+  Tuple *t = dict_find(data, MESSAGE_KEY_graphExtraPacked);
+  if (t == NULL) {
+    return get_byte_array(data, (uint8_t*)out->graph_extra, MESSAGE_KEY_graphExtra, GRAPH_MAX_SGV_COUNT, false, zeroes);
+  } else if (t->type != TUPLE_BYTE_ARRAY) {
+    return fail_unexpected_type(MESSAGE_KEY_graphExtraPacked, t->type, "byte array");
+  } else if (!unpack_graph_extra(t, previous, out)) {
+    return fail_bad_packing(MESSAGE_KEY_graphExtraPacked);
+  }
+  return true;
+}
+
+bool validate_data_message(DictionaryIterator *data, DataMessage *previous, DataMessage *out) {
   /*
    * Validation is not necessary for messages from the PebbleKit JS half of
    * Urchin since it is distributed with the C SDK half, but other clients
@@ -127,14 +261,14 @@ bool validate_data_message(DictionaryIterator *data, DataMessage *out) {
 
   return true
     && get_int32(data, &out->recency, MESSAGE_KEY_recency, false, 0)
-    && get_byte_array(data, out->sgvs, MESSAGE_KEY_sgvs, GRAPH_MAX_SGV_COUNT, true, NULL)
-    && get_byte_array_length(data, &out->sgv_count, GRAPH_MAX_SGV_COUNT, MESSAGE_KEY_sgvs)
+    && get_sgvs(data, previous, out)
     && get_int32(data, &out->last_sgv, MESSAGE_KEY_lastSgv, true, 0)
     && get_int32(data, &out->trend, MESSAGE_KEY_trend, false, 0)
     && get_int32(data, &out->delta, MESSAGE_KEY_delta, false, NO_DELTA_VALUE)
     && get_cstring(data, out->status_text, MESSAGE_KEY_statusText, STATUS_BAR_MAX_LENGTH, false, "")
     && get_int32(data, &out->status_recency, MESSAGE_KEY_statusRecency, false, -1)
-    && get_byte_array(data, (uint8_t*)out->graph_extra, MESSAGE_KEY_graphExtra, GRAPH_MAX_SGV_COUNT, false, zeroes);
+    && get_graph_extra(data, previous, out, zeroes)
+    && get_int32(data, &out->data_id, MESSAGE_KEY_dataId, false, 0);
 }
 
 static DataMessage *_last_data_message = NULL;
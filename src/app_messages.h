@@ -6,6 +6,15 @@
 #define STATUS_BAR_MAX_LENGTH 256
 #define NO_DELTA_VALUE 65536
 
+// See packSGVs and packGraphExtra in format.js
+#define PACKED_MODE_FULL 0
+#define PACKED_MODE_APPEND 1
+#define PACKED_HEADER_LENGTH 2
+#define PACKED_DELTA_ZERO 64
+#define PACKED_RUN_BASE 127
+#define PACKED_ABSOLUTE 255
+#define PACKED_MAX_SGV 32767
+
 typedef union GraphExtra {
   uint8_t raw;
   struct {
@@ -19,20 +28,22 @@ typedef struct __attribute__((__packed__)) DataMessage {
   time_t received_at;
   int32_t recency;
   uint16_t sgv_count;
-  uint8_t sgvs[GRAPH_MAX_SGV_COUNT];
+  // mg/dL, 0 if missing
+  uint16_t sgvs[GRAPH_MAX_SGV_COUNT];
   int32_t last_sgv;
   int32_t trend;
   int32_t delta;
   char status_text[STATUS_BAR_MAX_LENGTH];
   int32_t status_recency;
   GraphExtra graph_extra[GRAPH_MAX_SGV_COUNT];
+  int32_t data_id;
 } DataMessage;
 
 bool get_int32(DictionaryIterator *data, int32_t *dest, uint8_t key, bool required, int32_t fallback);
 bool get_byte_array(DictionaryIterator *data, uint8_t *dest, uint8_t key, size_t max_length, bool required, uint8_t *fallback);
 bool get_byte_array_length(DictionaryIterator *data, uint16_t *dest, uint16_t max_length, uint8_t key);
 bool get_cstring(DictionaryIterator *data, char *dest, uint8_t key, size_t max_length, bool required, const char* fallback);
-bool validate_data_message(DictionaryIterator *data, DataMessage *out);
+bool validate_data_message(DictionaryIterator *data, DataMessage *previous, DataMessage *out);
 
 void save_last_data_message(DataMessage *d);
 DataMessage *last_data_message();
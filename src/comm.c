@@ -84,6 +84,11 @@ static void request_update() {
     return;
   }
 
+  if (last_data_message() != NULL && last_data_message()->data_id != 0) {
+    // Tell the JS what data we have, so it can send just what's new
+    dict_write_int32(send_message, MESSAGE_KEY_dataId, last_data_message()->data_id);
+  }
+
   AppMessageResult send_result = app_message_outbox_send();
   if (send_result != APP_MSG_OK) {
     request_state_callback(REQUEST_STATE_SEND_FAILED, send_result);
@@ -109,7 +114,8 @@ static void in_received_handler(DictionaryIterator *received, void *context) {
 
   if (msg_type == MSG_TYPE_DATA) {
     static DataMessage d;
-    if (validate_data_message(received, &d)) {
+    // Only what's changed may have been sent, in which case the rest comes from the last message
+    if (validate_data_message(received, last_data_message(), &d)) {
       memcpy(_last_data_message, &d, sizeof(DataMessage));
       save_last_data_message(_last_data_message);
 
@@ -121,8 +121,7 @@ static void graph_update_proc(Layer *layer, GContext *ctx) {
   static GPoint to_plot[GRAPH_MAX_SGV_COUNT];
   int16_t bg;
   for(i = 0; i < data->sgv_count; i++) {
-    // XXX: JS divides by 2 to fit into 1 byte
-    bg = data->sgvs[i] * 2;
+    bg = data->sgvs[i];
     if(bg == 0) {
       continue;
     }
@@ -142,7 +141,7 @@ static void graph_update_proc(Layer *layer, GContext *ctx) {
     int16_t last_bg = NO_BG;
     GPoint last_center;
     for(i = 0; i < plot_count; i++) {
-      bg = data->sgvs[i] * 2;
+      bg = data->sgvs[i];
       if (bg == 0) {
         continue;
       }
@@ -163,7 +162,7 @@ static void graph_update_proc(Layer *layer, GContext *ctx) {
 
   // Points
   for(i = 0; i < plot_count; i++) {
-    bg = data->sgvs[i] * 2;
+    bg = data->sgvs[i];
     if (bg != 0) {
       plot_point(to_plot[i].x, to_plot[i].y, COLOR_FALLBACK(color_for_bg(bg, prefs), color), ctx);
     }
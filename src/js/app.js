@@ -7,6 +7,7 @@ function app(Pebble, c) {
 
   var format = require('./format')(c);
   var points = require('./points')(c);
+  var addGraph = require('./graph_messages')(c);
   var data;
   var config;
   var maxSGVs;
@@ -54,7 +55,7 @@ function app(Pebble, c) {
     });
   }
 
-  function requestAndSendData() {
+  function requestAndSendData(watchDataId) {
     function onData(sgvs, bolusHistory, basalHistory, status) {
       try {
         var endTime = sgvs.length > 0 ? sgvs[0]['date'] : new Date();
@@ -64,18 +65,21 @@ function app(Pebble, c) {
         var basals = format.basalGraphArray(endTime, basalHistory, maxSGVs, config);
         var graphExtra = format.graphExtraArray(boluses, basals);
 
-        sendMessage({
-          msgType: c.MSG_TYPE_DATA,
-          recency: format.recency(sgvs),
-          // XXX: divide BG by 2 to fit into 1 byte
-          sgvs: ys.map(function(y) { return Math.min(255, Math.floor(y / 2)); }),
-          lastSgv: format.lastSgv(sgvs),
-          trend: format.lastTrendNumber(sgvs),
-          delta: format.lastDelta(ys),
-          statusText: status.text.substr(0, 255),
-          graphExtra: graphExtra,
-          statusRecency: status.recency === undefined ? -1 : status.recency,
-        });
+        sendMessage(addGraph(
+          {
+            msgType: c.MSG_TYPE_DATA,
+            recency: format.recency(sgvs),
+            lastSgv: format.lastSgv(sgvs),
+            trend: format.lastTrendNumber(sgvs),
+            delta: format.lastDelta(ys),
+            statusText: format.truncateUTF8(status.text, c.STATUS_TEXT_MAX_BYTES),
+            statusRecency: status.recency === undefined ? -1 : status.recency,
+          },
+          watchDataId,
+          endTime,
+          ys.map(function(y) { return Math.min(c.PACKED_MAX_SGV, Math.round(y)); }),
+          graphExtra
+        ));
       } catch (e) {
         dataFetchError(e);
       }
@@ -251,12 +255,15 @@ function app(Pebble, c) {
 
       localStorage.setItem(c.LOCAL_STORAGE_KEY_CONFIG, JSON.stringify(config));
       console.log('Preferences updated: ' + JSON.stringify(config));
-      sendPreferences().then(requestAndSendData);
+      sendPreferences().then(function() {
+        requestAndSendData();
+      });
     });
 
     Pebble.addEventListener('appmessage', function(e) {
       console.log('Received message from watch: ' + JSON.stringify(e.payload));
-      requestAndSendData();
+      // The watch says which data message it has, if any
+      requestAndSendData(e.payload.dataId);
     });
 
     // Send data immediately after the watchface is launched
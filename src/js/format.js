@@ -133,6 +133,81 @@ var format = function(c) {
     return out;
   };
 
+  // Compact encodings of the graph arrays, unpacked by app_messages.c. Both
+  // start with [mode, count], then encode `count` values, newest first:
+  //
+  //   SGVs:        0x00-0x7F          the previous (newer) SGV plus (token - 64) mg/dL
+  //                0x80-0xFE          (token - 0x7F) missing SGVs
+  //                0xFF, high, low    an SGV in mg/dL, big-endian (the first, and any
+  //                                   too far from the previous one)
+  //   graph extra: 0x00-0x7F  a value
+  //                0x80-0xFE  the previous value, (token - 0x7F) more times
+  //
+  // In PACKED_MODE_APPEND, the values are newer than those the watch has.
+  f.packSGVs = function(mode, sgvs) {
+    var out = [mode, sgvs.length];
+    var previous;
+    var i = 0;
+    while (i < sgvs.length) {
+      if (sgvs[i] === 0) {
+        var missing = 0;
+        while (i < sgvs.length && sgvs[i] === 0 && missing < c.PACKED_MAX_RUN) {
+          missing++;
+          i++;
+        }
+        out.push(c.PACKED_RUN_BASE + missing);
+        continue;
+      }
+      var delta = sgvs[i] - previous;
+      if (previous !== undefined && delta >= -c.PACKED_DELTA_ZERO && delta < c.PACKED_DELTA_ZERO) {
+        out.push(c.PACKED_DELTA_ZERO + delta);
+      } else {
+        out.push(c.PACKED_ABSOLUTE, sgvs[i] >> 8, sgvs[i] & 0xFF);
+      }
+      previous = sgvs[i];
+      i++;
+    }
+    return out;
+  };
+
+  f.packGraphExtra = function(mode, values) {
+    var out = [mode, values.length];
+    var i = 0;
+    while (i < values.length) {
+      out.push(values[i]);
+      var repeats = 0;
+      while (i + 1 + repeats < values.length && values[i + 1 + repeats] === values[i] && repeats < c.PACKED_MAX_RUN) {
+        repeats++;
+      }
+      if (repeats > 0) {
+        out.push(c.PACKED_RUN_BASE + repeats);
+      }
+      i += 1 + repeats;
+    }
+    return out;
+  };
+
+  // Strings are sent to the watch as UTF-8, so cut them to fit its buffers in bytes, not characters
+  f.truncateUTF8 = function(text, maxBytes) {
+    var bytes = 0;
+    for (var i = 0; i < text.length; i++) {
+      var code = text.charCodeAt(i);
+      var size = code < 0x80 ? 1 : (code < 0x800 ? 2 : 3);
+      // A surrogate pair is one 4-byte character
+      if (code >= 0xD800 && code < 0xDC00 && i + 1 < text.length) {
+        size = 4;
+      }
+      if (bytes + size > maxBytes) {
+        return text.substr(0, i);
+      }
+      bytes += size;
+      if (size === 4) {
+        i++;
+      }
+    }
+    return text;
+  };
+
   f.lastTrendNumber = function(sgvs) {
     if (sgvs.length === 0) {
       return 0;
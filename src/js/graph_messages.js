@@ -0,0 +1,44 @@
+/* jshint browser: true */
+/* global module, require */
+
+// Adds the graph to data messages, packed (see packSGVs in format.js). If the
+// watch has the last message sent, and the graph has only moved on since, only
+// the newer points are sent, and the watch shifts what it has.
+var graphMessages = function(c) {
+  var format = require('./format')(c);
+  // The graph arrays last sent to the watch
+  var lastSent;
+  var nextDataId = 1 + Math.floor(Math.random() * 0x3fffffff);
+
+  function startsWith(arr, prefix) {
+    for (var i = 0; i < prefix.length; i++) {
+      if (arr[i] !== prefix[i]) {
+        return false;
+      }
+    }
+    return true;
+  }
+
+  // watchDataId is the dataId of the last data message the watch has, if any
+  return function addGraph(message, watchDataId, endTime, sgvs, graphExtra) {
+    var mode = c.PACKED_MODE_FULL;
+    var count = sgvs.length;
+    if (lastSent !== undefined && watchDataId === lastSent.dataId && sgvs.length === lastSent.sgvs.length) {
+      var shift = Math.round((endTime - lastSent.endTime) / (c.INTERVAL_SIZE_SECONDS * 1000));
+      if (shift >= 0 && shift < sgvs.length &&
+          startsWith(lastSent.sgvs, sgvs.slice(shift)) && startsWith(lastSent.graphExtra, graphExtra.slice(shift))) {
+        mode = c.PACKED_MODE_APPEND;
+        count = shift;
+      }
+    }
+    message.dataId = nextDataId++;
+    lastSent = {dataId: message.dataId, endTime: endTime, sgvs: sgvs, graphExtra: graphExtra};
+
+    // Always packed: the unpacked sgvs array only holds SGVs halved to a byte each
+    message.sgvsPacked = format.packSGVs(mode, sgvs.slice(0, count));
+    message.graphExtraPacked = format.packGraphExtra(mode, graphExtra.slice(0, count));
+    return message;
+  };
+};
+
+module.exports = graphMessages;
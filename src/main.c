@@ -115,6 +115,11 @@ static void data_callback(DataMessage *data) {
   if (s_bg_row_element != NULL) {
     bg_row_element_update(s_bg_row_element, data);
   }
+
+#ifdef IS_TEST_BUILD
+  // The screenshot tests wait for this before taking a screenshot
+  APP_LOG(APP_LOG_LEVEL_INFO, "Rendered data");
+#endif
 }
 
 static void prefs_callback(DictionaryIterator *received) {
@@ -0,0 +1,72 @@
+"""
+Skip `pebble build` when nothing that goes into the watchface has changed since
+the last build made by the test harness.
+
+The key is a hash of the sources, resources and build scripts, plus the
+environment variables which the wscript reads. The hash of the .pbw is saved
+with it, so a .pbw replaced since, e.g. by a build outside the harness, isn't
+taken to be the harness's.
+"""
+
+import hashlib
+import os
+
+BUILD_INPUTS = ['src', 'resources', 'config/js/vendor.min.js', 'package.json', 'wscript']
+# Written by the build itself
+GENERATED_DIRS = ['src/js/generated']
+BUILD_ENV_VARS = ['BUILD_ENV', 'DEBUG']
+KEY_FILENAME = '.test-build-key'
+
+
+def _input_files(project_dir):
+    for path in BUILD_INPUTS:
+        full_path = os.path.join(project_dir, path)
+        if os.path.isfile(full_path):
+            yield path
+        for dirpath, dirnames, filenames in os.walk(full_path):
+            rel_dir = os.path.relpath(dirpath, project_dir)
+            dirnames[:] = sorted(d for d in dirnames if os.path.join(rel_dir, d) not in GENERATED_DIRS)
+            for filename in sorted(filenames):
+                yield os.path.join(rel_dir, filename)
+
+def build_key(project_dir, env):
+    h = hashlib.sha1()
+    for var in BUILD_ENV_VARS:
+        h.update('{}={}\n'.format(var, env.get(var) or ''))
+    for path in _input_files(project_dir):
+        with open(os.path.join(project_dir, path), 'rb') as f:
+            h.update('{}\n{}\n'.format(path, hashlib.sha1(f.read()).hexdigest()))
+    return h.hexdigest()
+
+def _key_filename(build_dir):
+    return os.path.join(build_dir, KEY_FILENAME)
+
+def _pbw_hashes(build_dir):
+    hashes = []
+    for filename in sorted(os.listdir(build_dir)):
+        if filename.endswith('.pbw'):
+            with open(os.path.join(build_dir, filename), 'rb') as f:
+                hashes.append('{} {}'.format(filename, hashlib.sha1(f.read()).hexdigest()))
+    return hashes
+
+def is_built(build_dir, key):
+    """True if the last build in `build_dir` had this key, and the .pbw it produced is still there unchanged."""
+    try:
+        with open(_key_filename(build_dir)) as f:
+            saved = f.read().splitlines()
+    except IOError:
+        return False
+    pbw_hashes = _pbw_hashes(build_dir)
+    return bool(pbw_hashes) and saved == [key] + pbw_hashes
+
+def save_key(build_dir, key):
+    """Call after a build, once it has produced the .pbw."""
+    with open(_key_filename(build_dir), 'w') as f:
+        f.write('\n'.join([key] + _pbw_hashes(build_dir)))
+
+def forget(build_dir):
+    """E.g. before a build, so that a failed build is never taken to be current."""
+    try:
+        os.remove(_key_filename(build_dir))
+    except OSError:
+        pass
@@ -0,0 +1,226 @@
+"""
+The packed graph arrays of data messages from the phone to the watch, in
+Python: an encoder matching `packSGVs` and `packGraphExtra` in format.js, and
+a decoder matching `unpack_sgvs` and `unpack_graph_extra` in app_messages.c.
+
+Arrays are newest first, and SGVs are in mg/dL, with 0 for a missing SGV. A
+packed array is [mode, count] followed by `count` values:
+
+    SGVs:         0x00-0x7F        the previous (newer) SGV plus (token - 64) mg/dL
+                  0x80-0xFE        (token - 0x7F) missing SGVs
+                  0xFF, high, low  an SGV in mg/dL, big-endian (the first, and any
+                                   too far from the previous one)
+    graph extra:  0x00-0x7F        a value
+                  0x80-0xFE        the previous value, (token - 0x7F) more times
+
+In append mode the values are the newest, and the rest of the array is what
+the watch already has, moved along.
+
+The encoder's output for the cases in FIXTURE_CASES is kept in
+test/js/packing_fixtures.json, which the JS tests check format.js against.
+To regenerate it:
+
+    python test/data_packing.py
+
+To decode, as the watch would, the data messages written by
+`node test/js/soak.js ... --messages FILE`, and check them against the graph
+arrays they were made from:
+
+    python test/data_packing.py --check FILE
+"""
+
+import argparse
+import json
+import sys
+import os
+
+CONSTANTS_FILE = os.path.join(os.path.dirname(__file__), '../src/js/constants.json')
+FIXTURES_FILE = os.path.join(os.path.dirname(__file__), 'js', 'packing_fixtures.json')
+
+with open(CONSTANTS_FILE) as f:
+    _c = json.load(f)
+MODE_FULL = _c['PACKED_MODE_FULL']
+MODE_APPEND = _c['PACKED_MODE_APPEND']
+DELTA_ZERO = _c['PACKED_DELTA_ZERO']
+RUN_BASE = _c['PACKED_RUN_BASE']
+MAX_RUN = _c['PACKED_MAX_RUN']
+ABSOLUTE = _c['PACKED_ABSOLUTE']
+MAX_SGV = _c['PACKED_MAX_SGV']
+MAX_COUNT = 144
+
+
+def pack_sgvs(mode, sgvs):
+    out = [mode, len(sgvs)]
+    previous = None
+    i = 0
+    while i < len(sgvs):
+        if sgvs[i] == 0:
+            missing = 0
+            while i < len(sgvs) and sgvs[i] == 0 and missing < MAX_RUN:
+                missing += 1
+                i += 1
+            out.append(RUN_BASE + missing)
+            continue
+        if previous is not None and -DELTA_ZERO <= sgvs[i] - previous < DELTA_ZERO:
+            out.append(DELTA_ZERO + sgvs[i] - previous)
+        else:
+            out.extend([ABSOLUTE, sgvs[i] >> 8, sgvs[i] & 0xFF])
+        previous = sgvs[i]
+        i += 1
+    return out
+
+def pack_graph_extra(mode, values):
+    out = [mode, len(values)]
+    i = 0
+    while i < len(values):
+        out.append(values[i])
+        repeats = 0
+        while i + 1 + repeats < len(values) and values[i + 1 + repeats] == values[i] and repeats < MAX_RUN:
+            repeats += 1
+        if repeats > 0:
+            out.append(RUN_BASE + repeats)
+        i += 1 + repeats
+    return out
+
+
+def _unpack_header(packed, previous):
+    if len(packed) < 2:
+        raise ValueError('Packed array is too short')
+    mode, new_count = packed[:2]
+    if mode == MODE_FULL:
+        out = [None] * new_count
+    elif mode == MODE_APPEND and previous is not None:
+        if new_count > len(previous):
+            raise ValueError('Appending more values than the array holds')
+        out = [None] * new_count + list(previous[:len(previous) - new_count])
+    else:
+        raise ValueError('Bad mode {}, or nothing to append to'.format(mode))
+    if len(out) > MAX_COUNT:
+        raise ValueError('Too many values: {}'.format(len(out)))
+    return out, new_count
+
+def _token(packed, p):
+    if p >= len(packed):
+        raise ValueError('Packed array ends early')
+    return packed[p]
+
+def unpack_sgvs(packed, previous=None):
+    """SGVs from a packed array, in append mode added to `previous`."""
+    out, new_count = _unpack_header(packed, previous)
+    p = 2
+    i = 0
+    sgv = None
+    while i < new_count:
+        token = _token(packed, p)
+        p += 1
+        if token == ABSOLUTE:
+            sgv = _token(packed, p) << 8 | _token(packed, p + 1)
+            p += 2
+            if sgv > MAX_SGV:
+                raise ValueError('SGV out of range: {}'.format(sgv))
+            out[i] = sgv
+            i += 1
+        elif token > RUN_BASE:
+            missing = token - RUN_BASE
+            if i + missing > new_count:
+                raise ValueError('Run of missing SGVs overruns the array')
+            out[i:i + missing] = [0] * missing
+            i += missing
+        else:
+            if sgv is None:
+                raise ValueError('Difference with no SGV before it')
+            sgv += token - DELTA_ZERO
+            if not 1 <= sgv <= MAX_SGV:
+                raise ValueError('SGV out of range: {}'.format(sgv))
+            out[i] = sgv
+            i += 1
+    return out
+
+def unpack_graph_extra(packed, previous=None):
+    """Graph extra values from a packed array, in append mode added to `previous`."""
+    out, new_count = _unpack_header(packed, previous)
+    p = 2
+    i = 0
+    while i < new_count:
+        token = _token(packed, p)
+        p += 1
+        if token <= RUN_BASE:
+            out[i] = token
+            i += 1
+        elif token < ABSOLUTE and i > 0 and i + token - RUN_BASE <= new_count:
+            out[i:i + token - RUN_BASE] = [out[i - 1]] * (token - RUN_BASE)
+            i += token - RUN_BASE
+        else:
+            raise ValueError('Bad graph extra token {} at {}'.format(token, p - 1))
+    return out
+
+
+# Cases checked in both Python and JS: (mode, SGVs, graph extra)
+FIXTURE_CASES = [
+    (MODE_FULL, [], []),
+    (MODE_FULL, [190, 189, 188, 184, 0, 0, 181, 300, 0], [0, 0, 1, 0, 22, 22, 22, 23, 0]),
+    # Jumps too big for a difference, after a gap and without one, and SGVs over a byte
+    (MODE_FULL, [400, 0, 0, 0, 121, 381, 80], [3] * 7),
+    # Runs longer than a token can hold
+    (MODE_FULL, [0] * 144, [0] * 144),
+    (MODE_FULL, [200] * 130 + [0] * 14, [5] * 60 + [6] * 84),
+    (MODE_APPEND, [183], [2]),
+    (MODE_APPEND, [], []),
+]
+
+def fixtures():
+    return [
+        {
+            'mode': mode,
+            'sgvs': sgvs,
+            'graphExtra': graph_extra,
+            'sgvsPacked': pack_sgvs(mode, sgvs),
+            'graphExtraPacked': pack_graph_extra(mode, graph_extra),
+        }
+        for mode, sgvs, graph_extra in FIXTURE_CASES
+    ]
+
+def check_messages(records):
+    """Decode a sequence of data messages as the watch would, each record being
+    {"message": ..., "graph": {"sgvs": ..., "graphExtra": ...}}.
+
+    Returns (bytes of graph arrays sent, bytes if sent unpacked with 2-byte
+    SGVs, indices of messages which decoded to something other than their
+    graph).
+    """
+    sgvs = graph_extra = None
+    sent = unpacked = 0
+    mismatches = []
+    for i, record in enumerate(records):
+        message, graph = record['message'], record['graph']
+        sgvs = unpack_sgvs(message['sgvsPacked'], sgvs)
+        graph_extra = unpack_graph_extra(message['graphExtraPacked'], graph_extra)
+        sent += len(message['sgvsPacked']) + len(message['graphExtraPacked'])
+        unpacked += 2 * len(graph['sgvs']) + len(graph['graphExtra'])
+        if sgvs != graph['sgvs'] or graph_extra != graph['graphExtra']:
+            mismatches.append(i)
+    return sent, unpacked, mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--check', metavar='FILE', help='data messages written by soak.js --messages')
+    args = parser.parse_args()
+
+    if args.check:
+        with open(args.check) as f:
+            records = json.load(f)
+        sent, unpacked, mismatches = check_messages(records)
+        print '{} messages: {} bytes of graph arrays sent, {} unpacked; {} mismatches'.format(
+            len(records), sent, unpacked, len(mismatches))
+        if mismatches:
+            print 'First mismatch: message {}'.format(mismatches[0])
+            sys.exit(1)
+        return
+
+    with open(FIXTURES_FILE, 'w') as f:
+        # A case per line
+        f.write('[\n{}\n]\n'.format(',\n'.join(json.dumps(case, sort_keys=True) for case in fixtures())))
+    print 'Wrote {}'.format(FIXTURES_FILE)
+
+if __name__ == '__main__':
+    main()
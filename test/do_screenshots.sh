@@ -3,30 +3,56 @@
 export BUILD_ENV=test
 export MOCK_SERVER_PORT=5555
 
+# Number of emulator workers per platform. Each gets its own mock server on
+# MOCK_SERVER_PORT + n. See emulator_pool.py.
+export SCREENSHOT_WORKERS=${SCREENSHOT_WORKERS:-1}
+# When SCREENSHOT_BENCHMARK is set, all workers record latencies under one run ID.
+# See latency_benchmark.py.
+export SCREENSHOT_BENCHMARK_RUN=$(date +%Y%m%dT%H%M%S)
+# Generate test data relative to a frozen clock, so that it's as old when
+# rendered as when generated. Set to empty for real time. See virtual_clock.py.
+export SCREENSHOT_CLOCK=${SCREENSHOT_CLOCK-frozen}
+
 TEST_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
 
-# Start & background Flask server
-python "$TEST_DIR/server.py" & PID=$!
+# Start & background Flask servers, one per worker
+PIDS=""
+for (( i=0; i<$SCREENSHOT_WORKERS; i++ )); do
+  python "$TEST_DIR/server.py" --port $(( MOCK_SERVER_PORT + i )) & PIDS="$PIDS $!"
+done
 sleep 1
 bg
 
+if [ $SCREENSHOT_WORKERS -gt 1 ]; then
+  # Requires pytest-xdist
+  PARALLEL_ARGS="-n $SCREENSHOT_WORKERS"
+fi
+
 # Run tests
-py.test test/ -v $@
+py.test test/ -v $PARALLEL_ARGS $@
 TEST_RESULT=$?
 
 if [ $CIRCLECI ] && [ $TEST_RESULT -ne 0 ]; then
   # Run it again in case tests are just flaky
-  py.test test/ -v $@
+  py.test test/ -v $PARALLEL_ARGS $@
   TEST_RESULT=$?
 fi
 
 pebble kill
+# Emulators of the other pool workers live under their own HOME and TMPDIR
+for (( i=1; i<$SCREENSHOT_WORKERS; i++ )); do
+  WORKER_DIR="${EMULATOR_POOL_DIR:-${TMPDIR:-/tmp}/urchin-emulator-pool}/worker-$i"
+  HOME="$WORKER_DIR/home" TMPDIR="$WORKER_DIR/tmp" pebble kill
+done
 
-# Kill Flask server
-kill -9 $PID
+# Kill Flask servers
+kill -9 $PIDS
 
 unset BUILD_ENV
 unset MOCK_SERVER_PORT
+unset SCREENSHOT_WORKERS
+unset SCREENSHOT_BENCHMARK_RUN
+unset SCREENSHOT_CLOCK
 
 if [ $CIRCLECI ]; then
   exit $TEST_RESULT
@@ -0,0 +1,149 @@
+"""
+Long-lived connections to the emulators, shared by everything the screenshot
+harness does with them: pushing config, taking screenshots and capturing logs.
+
+A connection is re-established on next use if the emulator has gone away (e.g.
+after `pebble kill`). Connecting boots the emulator if it isn't running.
+"""
+
+import Queue
+import socket
+import sys
+import threading
+from datetime import datetime
+
+import numpy as np
+from dateutil.tz import tzlocal
+from libpebble2.communication import PebbleConnection
+from libpebble2.communication.transports.websocket import MessageTargetPhone
+from libpebble2.communication.transports.websocket.protocol import WebSocketInstallBundle
+from libpebble2.communication.transports.websocket.protocol import WebSocketInstallStatus
+from libpebble2.communication.transports.websocket.protocol import WebSocketPhoneAppLog
+from libpebble2.exceptions import AppInstallError
+from libpebble2.exceptions import ConnectionError
+from libpebble2.exceptions import TimeoutError
+from libpebble2.protocol.logs import AppLogMessage
+from libpebble2.protocol.logs import AppLogShippingControl
+from libpebble2.protocol.system import SetUTC
+from libpebble2.protocol.system import TimeMessage
+from libpebble2.services.screenshot import Screenshot
+from pebble_tool.sdk.emulator import ManagedEmulatorTransport
+from websocket import WebSocketException
+
+from emulator_logs import LogWatcher
+from screenshot_diff import correct_colors
+
+INSTALL_TIMEOUT_SECONDS = 30
+SCREENSHOT_TIMEOUT_SECONDS = 10
+
+
+def _close(pebble):
+    ws = pebble.transport.ws
+    if ws is None:
+        return
+    try:
+        # Wakes the connection's reader thread, which then exits
+        ws.abort()
+    except socket.error:
+        # The emulator already closed it
+        pass
+    ws.shutdown()
+
+
+class EmulatorConnection(object):
+    def __init__(self, platform):
+        self.platform = platform
+        self.logs = LogWatcher(platform)
+        self._pebble = None
+        self._lock = threading.RLock()
+
+    def connect(self):
+        """The connection, (re)connecting first if necessary."""
+        with self._lock:
+            if self._pebble is None or not self._pebble.connected:
+                self.disconnect()
+                pebble = PebbleConnection(ManagedEmulatorTransport(self.platform))
+                pebble.connect()
+                pebble.register_endpoint(AppLogMessage, self._on_watch_log)
+                pebble.register_transport_endpoint(MessageTargetPhone, WebSocketPhoneAppLog, self._on_phone_log)
+                pebble.run_async()
+                pebble.send_packet(AppLogShippingControl(enable=True))
+                self._pebble = pebble
+            return self._pebble
+
+    def disconnect(self):
+        """Close the connection, e.g. because the emulator is about to be killed."""
+        with self._lock:
+            if self._pebble is not None:
+                _close(self._pebble)
+                self._pebble = None
+
+    def _on_watch_log(self, packet):
+        # filename is a fixed-length, null-padded field
+        self.logs.append('{}:{}> {}'.format(packet.filename.rstrip('\x00'), packet.line_number, packet.message))
+
+    def _on_phone_log(self, packet):
+        self.logs.append('javascript> {}'.format(packet.payload))
+
+    def send_to_phone(self, packet):
+        try:
+            self.connect().transport.send_packet(packet, target=MessageTargetPhone())
+        except (ConnectionError, WebSocketException, socket.error):
+            # The emulator was restarted since the connection was last used
+            self.disconnect()
+            self.connect().transport.send_packet(packet, target=MessageTargetPhone())
+
+    def install(self, pbw_filename):
+        """Install and launch an app. pypkjs installs it on the watch and loads its JS, as for `pebble install`."""
+        with open(pbw_filename, 'rb') as f:
+            pbw = f.read()
+        statuses = Queue.Queue()
+        with self._lock:
+            pebble = self.connect()
+            handle = pebble.register_transport_endpoint(MessageTargetPhone, WebSocketInstallStatus, statuses.put)
+            try:
+                pebble.transport.send_packet(WebSocketInstallBundle(pbw=pbw), target=MessageTargetPhone())
+                status = statuses.get(timeout=INSTALL_TIMEOUT_SECONDS).status
+            except Queue.Empty:
+                raise TimeoutError('No install status from {} within {}s'.format(self.platform, INSTALL_TIMEOUT_SECONDS))
+            finally:
+                pebble.unregister_endpoint(handle)
+        if status != WebSocketInstallStatus.StatusCode.Success:
+            raise AppInstallError('App install failed on {}'.format(self.platform))
+
+    def set_time(self, seconds):
+        """Set the watch's clock to an epoch time, in the host's time zone."""
+        local = datetime.fromtimestamp(seconds, tzlocal())
+        packet = TimeMessage(message=SetUTC(
+            unix_time=int(seconds),
+            utc_offset=int(local.utcoffset().total_seconds() / 60),
+            tz_name=local.tzname() or '',
+        ))
+        with self._lock:
+            self.connect().send_packet(packet)
+
+    def screenshot(self):
+        """The current frame as a height x width x 3 array of uint8 RGB.
+
+        Colours are corrected as `pebble screenshot` does, which the gold images were taken with.
+        """
+        grabbed = Queue.Queue()
+        def grab(pebble):
+            try:
+                grabbed.put((Screenshot(pebble).grab_image(), None))
+            except Exception:
+                grabbed.put((None, sys.exc_info()))
+        with self._lock:
+            # grab_image waits on the emulator without a timeout, so it runs on its own thread
+            thread = threading.Thread(target=grab, args=(self.connect(),))
+            thread.daemon = True
+            thread.start()
+            try:
+                rows, error = grabbed.get(timeout=SCREENSHOT_TIMEOUT_SECONDS)
+            except Queue.Empty:
+                # The emulator is stuck; reconnect on next use. The abandoned thread is a daemon.
+                self.disconnect()
+                raise Exception('No screenshot from {} within {}s'.format(self.platform, SCREENSHOT_TIMEOUT_SECONDS))
+        if error:
+            raise error[0], error[1], error[2]
+        return correct_colors(np.array([bytearray(row) for row in rows], dtype=np.uint8).reshape(len(rows), -1, 3))
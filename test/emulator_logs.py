@@ -0,0 +1,68 @@
+"""
+Logs from an emulator's watchface and JS, so the test harness can wait for the
+watchface to do something instead of sleeping for a fixed time.
+
+Lines are formatted like the output of `pebble logs`.
+"""
+
+import re
+import threading
+import time
+
+# Logged by the watchface (test builds only) after it has updated its elements with new data
+RENDERED_DATA = re.compile(r'> Rendered data$')
+# Logged by the JS when it receives new config from the "phone"
+PREFERENCES_UPDATED = re.compile(r'> Preferences updated: ')
+# Logged by the JS for each request it makes (debug builds only)
+REQUEST_ISSUED = re.compile(r'> (GET|POST) \S+')
+# Logged by the JS when it sends a data message to the watch
+DATA_MESSAGE_SENT = re.compile(r'> sending \{"msgType":1,')
+# Logged by the JS for every message it sends to the watch, with the message as JSON
+MESSAGE_SENT = re.compile(r'> sending (\{.*\})$')
+
+
+class LogWatcher(object):
+    def __init__(self, platform):
+        self.platform = platform
+        self.lines = []
+        self.times = []
+        self._cond = threading.Condition()
+
+    def append(self, line):
+        with self._cond:
+            self.lines.append(line)
+            self.times.append(time.time())
+            self._cond.notify_all()
+
+    def mark(self):
+        """Position in the log, for waiting on lines logged after this point."""
+        with self._cond:
+            return len(self.lines)
+
+    def time_of(self, position):
+        """When the line just before `position` (as returned by `wait_for`) was received."""
+        with self._cond:
+            return self.times[position - 1]
+
+    def wait_for(self, pattern, since, timeout):
+        """Wait for a line matching `pattern` after position `since`.
+
+        Returns the position just after the matching line, or None on timeout.
+        """
+        deadline = time.time() + timeout
+        with self._cond:
+            while True:
+                for i in range(since, len(self.lines)):
+                    if pattern.search(self.lines[i]):
+                        return i + 1
+                since = len(self.lines)
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def matches_since(self, pattern, since):
+        """Matches of `pattern` in the lines logged after position `since`."""
+        with self._cond:
+            lines = self.lines[since:]
+        return [m for m in (pattern.search(line) for line in lines) if m]
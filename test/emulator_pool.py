@@ -0,0 +1,237 @@
+"""
+A pool of Pebble emulators, so that screenshot tests can run in parallel.
+
+Each worker in the pool has its own emulator for every platform and its own
+mock Nightscout server port. pebble-tool keeps track of running emulators in
+a file in the temp directory (one emulator per platform), and keeps emulator
+flash storage under the home directory, so workers are isolated from each other
+by giving each one its own TMPDIR and HOME.
+
+Workers are handed out to test processes (e.g. pytest-xdist workers) by taking
+an exclusive lock on a file in the worker's directory. The lock is held until
+the test process exits, so no other coordination is needed.
+"""
+
+import errno
+import fcntl
+import json
+import os
+import socket
+import tempfile
+import time
+
+POOL_SIZE = int(os.environ.get('SCREENSHOT_WORKERS') or 1)
+BASE_MOCK_SERVER_PORT = int(os.environ.get('MOCK_SERVER_PORT', 5555))
+POOL_DIR = os.environ.get(
+    'EMULATOR_POOL_DIR',
+    os.path.join(tempfile.gettempdir(), 'urchin-emulator-pool')
+)
+REAL_HOME = os.path.expanduser('~')
+REAL_TMPDIR = tempfile.gettempdir()
+
+
+def _mkdir_p(dirname):
+    try:
+        os.makedirs(dirname)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+def _pid_is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+def _port_is_open(port):
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.settimeout(1)
+    try:
+        s.connect(('localhost', port))
+    except socket.error:
+        return False
+    finally:
+        s.close()
+    return True
+
+
+class EmulatorWorker(object):
+    """One emulator per platform plus a mock server port.
+
+    Worker 0 uses the real HOME and TMPDIR, so that it's the same emulator seen
+    by `pebble logs --emulator basalt` etc. from a terminal.
+    """
+    def __init__(self, index, platforms):
+        self.index = index
+        self.platforms = platforms
+        self.mock_server_port = BASE_MOCK_SERVER_PORT + index
+
+    def __repr__(self):
+        return '<EmulatorWorker {} port={}>'.format(self.index, self.mock_server_port)
+
+    @property
+    def dirname(self):
+        return os.path.join(POOL_DIR, 'worker-{}'.format(self.index))
+
+    @property
+    def home_dir(self):
+        return REAL_HOME if self.index == 0 else os.path.join(self.dirname, 'home')
+
+    @property
+    def tmp_dir(self):
+        return REAL_TMPDIR if self.index == 0 else os.path.join(self.dirname, 'tmp')
+
+    @property
+    def mock_host(self):
+        return 'http://localhost:{}'.format(self.mock_server_port)
+
+    def prepare(self):
+        """Create this worker's HOME and TMPDIR, sharing installed SDKs with the real HOME."""
+        if self.index == 0:
+            return
+        _mkdir_p(self.tmp_dir)
+        sdk_dir = os.path.join(self.home_dir, '.pebble-sdk')
+        _mkdir_p(sdk_dir)
+        real_sdk_dir = os.path.join(REAL_HOME, '.pebble-sdk')
+        if not os.path.isdir(real_sdk_dir):
+            return
+        for name in os.listdir(real_sdk_dir):
+            # Share the installed SDKs and settings files, but not the
+            # per-SDK-version directories which hold emulator flash storage.
+            real_path = os.path.join(real_sdk_dir, name)
+            if name == 'SDKs' or os.path.isfile(real_path):
+                link = os.path.join(sdk_dir, name)
+                if not os.path.lexists(link):
+                    os.symlink(real_path, link)
+
+    def activate(self):
+        """Point this process, and any `pebble` commands it spawns, at this worker's emulators."""
+        self.prepare()
+        os.environ['HOME'] = self.home_dir
+        os.environ['TMPDIR'] = self.tmp_dir
+        os.environ['MOCK_SERVER_PORT'] = str(self.mock_server_port)
+        # gettempdir() caches its result
+        tempfile.tempdir = None
+
+    def emulator_info(self):
+        try:
+            with open(os.path.join(self.tmp_dir, 'pb-emulator.json')) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def is_healthy(self):
+        """True if every platform's QEMU and pypkjs processes are alive and accepting connections."""
+        info = self.emulator_info()
+        for platform in self.platforms:
+            if not info.get(platform):
+                return False
+            for emu in info[platform].values():
+                for proc in ('qemu', 'pypkjs'):
+                    if not _pid_is_alive(emu[proc]['pid']) or not _port_is_open(emu[proc]['port']):
+                        return False
+        return True
+
+    def _emulator_pids(self):
+        info = self.emulator_info()
+        return dict(
+            (platform, sorted(emu['qemu']['pid'] for emu in info.get(platform, {}).values()))
+            for platform in self.platforms
+        )
+
+    def installed_app(self):
+        """What was passed to `set_installed_app`, if the same emulators are still running."""
+        try:
+            with open(os.path.join(self.dirname, 'installed-app.json')) as f:
+                installed = json.load(f)
+        except (IOError, ValueError):
+            return None
+        if installed['emulators'] != self._emulator_pids() or not self.is_healthy():
+            return None
+        return installed['app']
+
+    def set_installed_app(self, app):
+        """Record which app was just installed on this worker's emulators, e.g. a hash of the .pbw."""
+        with open(os.path.join(self.dirname, 'installed-app.json'), 'w') as f:
+            json.dump({'app': app, 'emulators': self._emulator_pids()}, f)
+
+    @property
+    def snapshot_dir(self):
+        return os.path.join(self.dirname, 'snapshot')
+
+    def snapshot_app(self):
+        """What was passed to `set_snapshot_app` when the emulator storage in `snapshot_dir` was saved."""
+        try:
+            with open(os.path.join(self.dirname, 'snapshot-app.json')) as f:
+                return json.load(f)['app']
+        except (IOError, ValueError):
+            return None
+
+    def set_snapshot_app(self, app):
+        with open(os.path.join(self.dirname, 'snapshot-app.json'), 'w') as f:
+            json.dump({'app': app}, f)
+
+    def mock_server_is_up(self):
+        return _port_is_open(self.mock_server_port)
+
+
+class EmulatorPool(object):
+    def __init__(self, size, platforms):
+        self.workers = [EmulatorWorker(i, platforms) for i in range(size)]
+        self._lock_file = None
+
+    def _preferred_order(self):
+        # Under pytest-xdist, worker "gw3" prefers pool worker 3, so that the
+        # assignment is stable across runs when every worker is free.
+        xdist_id = os.environ.get('PYTEST_XDIST_WORKER', '')
+        start = int(xdist_id[2:]) if xdist_id.startswith('gw') and xdist_id[2:].isdigit() else 0
+        n = len(self.workers)
+        return [self.workers[(start + i) % n] for i in range(n)]
+
+    def acquire(self, timeout=600):
+        """Lease a worker for the rest of this process's lifetime."""
+        deadline = time.time() + timeout
+        while True:
+            for worker in self._preferred_order():
+                _mkdir_p(worker.dirname)
+                f = open(os.path.join(worker.dirname, 'lease.lock'), 'w')
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except IOError:
+                    f.close()
+                    continue
+                f.write(str(os.getpid()))
+                f.flush()
+                self._lock_file = f
+                return worker
+            if time.time() > deadline:
+                raise Exception('No free emulator worker after {}s (pool size {})'.format(timeout, len(self.workers)))
+            time.sleep(1)
+
+    def run_once(self, name, fn):
+        """Call fn in only one of the test processes sharing the pool during this test run.
+
+        The other processes block until it's done.
+        """
+        # pytest-xdist workers are all children of the same pytest process
+        run_id = str(os.getppid() if os.environ.get('PYTEST_XDIST_WORKER') else os.getpid())
+        _mkdir_p(POOL_DIR)
+        with open(os.path.join(POOL_DIR, '{}.lock'.format(name)), 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                if f.read() != run_id:
+                    fn()
+                    f.seek(0)
+                    f.truncate()
+                    f.write(run_id)
+                    f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def release(self):
+        if self._lock_file is not None:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
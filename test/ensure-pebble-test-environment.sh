@@ -7,7 +7,6 @@ set -x
 set -e
 
 PEBBLE_TOOL_PATH=pebble-sdk-$PEBBLE_TOOL-linux64
-IMAGEMAGICK_PATH=ImageMagick-7.0.3-0
 
 ######## Python testing dependencies
 
@@ -43,20 +42,3 @@ sudo apt-get install libsdl1.2debian libfdt1 libpixman-1-0
 # Ignore bad return code when SDK is already installed
 (yes | pebble sdk install $PEBBLE_SDK) || true
 pebble sdk activate $PEBBLE_SDK
-
-######## ImageMagick
-
-if [ ! -e ~/imagemagick ]; then
-  # http://www.imagemagick.org/script/install-source.php
-  mkdir ~/imagemagick
-  cd ~/imagemagick
-  wget http://www.imagemagick.org/download/$IMAGEMAGICK_PATH.tar.gz
-  tar -xvzf $IMAGEMAGICK_PATH.tar.gz
-  cd $IMAGEMAGICK_PATH
-  ./configure
-  make
-fi
-cd ~/imagemagick/$IMAGEMAGICK_PATH
-sudo make install
-sudo ldconfig /usr/local/lib
-(convert logo: logo.gif && rm logo.gif) || { echo "ImageMagick install failed"; exit 1; }
@@ -0,0 +1,262 @@
+"""
+Packed store of gold images, the screenshots which tests are compared against.
+
+Frames are stored once per distinct image, keyed by a hash of their pixels, in
+`frames.bin`. `index.json` maps each gold image name (<TestName>-<platform>)
+to a frame, and says where each frame is and how it's encoded:
+
+    1bit      two colors (aplite), a bit per pixel
+    palette8  up to 256 colors (basalt), a byte per pixel
+    rgb       anything else, 3 bytes per pixel
+
+each followed by zlib compression. The harness memory-maps `frames.bin` and
+decodes only the frames it compares against.
+
+To take the screenshots of the tests which failed in the last run as their new
+gold images, or those of the given tests:
+
+    python test/gold_store.py rebaseline
+    python test/gold_store.py rebaseline TestBasalGraph TestBatteryAsNumber-basalt
+
+Other commands:
+
+    python test/gold_store.py list
+    python test/gold_store.py export /tmp/gold [TestName ...]   # as PNGs, for review
+    python test/gold_store.py import path/to/TestName-basalt.png ...
+    python test/gold_store.py prune                             # drop unused frames
+"""
+
+import argparse
+import errno
+import hashlib
+import json
+import mmap
+import os
+import zlib
+
+import numpy as np
+
+import report
+from screenshot_diff import load_image
+from screenshot_diff import save_image
+
+GOLD_DIR = os.path.join(os.path.dirname(__file__), 'gold')
+INDEX_FILENAME = 'index.json'
+FRAMES_FILENAME = 'frames.bin'
+OUTPUT_DIR = os.path.join(os.path.dirname(__file__), 'output')
+
+FORMAT_VERSION = 1
+
+
+def frame_hash(pixels):
+    return hashlib.sha1('{}\n{}'.format(pixels.shape, pixels.tobytes())).hexdigest()
+
+def _hex_colors(palette):
+    return ['{:02x}{:02x}{:02x}'.format(*color) for color in palette]
+
+def encode(pixels):
+    """A height x width x 3 uint8 array as (encoding, palette, bytes)."""
+    flat = pixels.reshape(-1, 3)
+    colors, codes = np.unique(flat.view([('', np.uint8)] * 3), return_inverse=True)
+    palette = colors.view(np.uint8).reshape(-1, 3)
+    if len(palette) <= 2:
+        return '1bit', _hex_colors(palette), np.packbits(codes.astype(np.uint8)).tobytes()
+    elif len(palette) <= 256:
+        return 'palette8', _hex_colors(palette), codes.astype(np.uint8).tobytes()
+    else:
+        return 'rgb', None, flat.tobytes()
+
+def decode(encoding, palette, data, shape):
+    height, width = shape
+    if encoding == 'rgb':
+        return np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3)
+    if encoding == '1bit':
+        codes = np.unpackbits(np.frombuffer(data, dtype=np.uint8))[:height * width]
+    else:
+        codes = np.frombuffer(data, dtype=np.uint8)
+    colors = np.array([[int(c[i:i + 2], 16) for i in (0, 2, 4)] for c in palette], dtype=np.uint8)
+    return colors[codes].reshape(height, width, 3)
+
+
+class GoldStore(object):
+    def __init__(self, dirname=GOLD_DIR):
+        self.dirname = dirname
+        self._frames_file = None
+        self._mmap = None
+        try:
+            with open(self._path(INDEX_FILENAME)) as f:
+                index = json.load(f)
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            index = {'version': FORMAT_VERSION, 'frames': {}, 'golds': {}}
+        if index['version'] != FORMAT_VERSION:
+            raise Exception('Unsupported gold store version {} in {}'.format(index['version'], dirname))
+        self.frames = index['frames']
+        self.golds = index['golds']
+
+    def _path(self, filename):
+        return os.path.join(self.dirname, filename)
+
+    def __contains__(self, name):
+        return name in self.golds
+
+    def names(self):
+        return sorted(self.golds)
+
+    def frame_hash(self, name):
+        """Hash of a gold image's pixels, or None if there is no such image."""
+        return self.golds.get(name)
+
+    def _compressed(self, entry):
+        if self._mmap is None:
+            self._frames_file = open(self._path(FRAMES_FILENAME), 'rb')
+            self._mmap = mmap.mmap(self._frames_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap[entry['offset']:entry['offset'] + entry['size']]
+
+    def frame(self, name):
+        """A gold image as a height x width x 3 array of uint8 RGB, or None if there is no such image."""
+        if name not in self.golds:
+            return None
+        entry = self.frames[self.golds[name]]
+        return decode(entry['encoding'], entry.get('palette'), zlib.decompress(self._compressed(entry)), entry['shape'])
+
+    def _close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._frames_file.close()
+            self._mmap = self._frames_file = None
+
+    def put(self, name, pixels):
+        """Set a gold image, adding its frame unless an identical one is already stored. Call `save` after."""
+        key = frame_hash(pixels)
+        if key not in self.frames:
+            encoding, palette, data = encode(pixels)
+            data = zlib.compress(data, 9)
+            if not os.path.isdir(self.dirname):
+                os.makedirs(self.dirname)
+            with open(self._path(FRAMES_FILENAME), 'ab') as f:
+                f.seek(0, os.SEEK_END)
+                offset = f.tell()
+                f.write(data)
+            self._close()
+            self.frames[key] = {'offset': offset, 'size': len(data), 'shape': list(pixels.shape[:2]), 'encoding': encoding}
+            if palette is not None:
+                self.frames[key]['palette'] = palette
+        self.golds[name] = key
+
+    def remove(self, name):
+        del self.golds[name]
+
+    def save(self):
+        tmp_filename = self._path(INDEX_FILENAME + '.tmp')
+        with open(tmp_filename, 'w') as f:
+            json.dump(
+                {'version': FORMAT_VERSION, 'frames': self.frames, 'golds': self.golds},
+                f, indent=1, separators=(',', ': '), sort_keys=True
+            )
+            f.write('\n')
+        os.rename(tmp_filename, self._path(INDEX_FILENAME))
+
+    def prune(self):
+        """Drop frames which no gold image uses, and compact the rest. Returns how many were dropped."""
+        used = set(self.golds.values())
+        unused = [key for key in self.frames if key not in used]
+        tmp_filename = self._path(FRAMES_FILENAME + '.tmp')
+        frames = {}
+        with open(tmp_filename, 'wb') as f:
+            for key in sorted(used, key=lambda k: self.frames[k]['offset']):
+                entry = dict(self.frames[key], offset=f.tell())
+                f.write(self._compressed(self.frames[key]))
+                frames[key] = entry
+        self._close()
+        os.rename(tmp_filename, self._path(FRAMES_FILENAME))
+        self.frames = frames
+        self.save()
+        return len(unused)
+
+    def export(self, dirname, names=None):
+        """Write gold images as <name>.png files. Returns the filenames."""
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        filenames = []
+        for name in names if names is not None else self.names():
+            filenames.append(os.path.join(dirname, '{}.png'.format(name)))
+            save_image(self.frame(name), filenames[-1])
+        return filenames
+
+
+########## Command line
+
+def _expand(store, names, available):
+    """Gold image names for command line arguments, which may leave out the platform."""
+    out = []
+    for name in names:
+        matches = [n for n in available if n == name or n.rsplit('-', 1)[0] == name]
+        if not matches:
+            raise SystemExit('No gold image or screenshot for {}'.format(name))
+        out.extend(matches)
+    return out
+
+def _screenshots(out_dir):
+    img_dir = os.path.join(out_dir, 'img')
+    if not os.path.isdir(img_dir):
+        return {}
+    return dict(
+        (os.path.splitext(f)[0], os.path.join(img_dir, f))
+        for f in os.listdir(img_dir) if f.endswith('.png')
+    )
+
+def rebaseline(store, names, out_dir):
+    """Take screenshots from the last run as gold images: of `names`, or else of every failed test."""
+    screenshots = _screenshots(out_dir)
+    if names:
+        names = _expand(store, names, sorted(screenshots))
+    else:
+        names = [
+            os.path.splitext(os.path.basename(r['image']))[0]
+            for r in report.load_results(out_dir) if not r['passed']
+        ]
+    for name in names:
+        store.put(name, load_image(screenshots[name]))
+        print 'Updated {}'.format(name)
+    store.save()
+    return names
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--store', default=GOLD_DIR, help='gold store directory')
+    commands = parser.add_subparsers(dest='command')
+    commands.add_parser('list')
+    rebaseline_parser = commands.add_parser('rebaseline')
+    rebaseline_parser.add_argument('names', nargs='*')
+    rebaseline_parser.add_argument('--from', dest='out_dir', default=OUTPUT_DIR, help='test output directory')
+    export_parser = commands.add_parser('export')
+    export_parser.add_argument('dirname')
+    export_parser.add_argument('names', nargs='*')
+    import_parser = commands.add_parser('import')
+    import_parser.add_argument('filenames', nargs='+')
+    commands.add_parser('prune')
+    args = parser.parse_args()
+
+    store = GoldStore(args.store)
+    if args.command == 'list':
+        for name in store.names():
+            entry = store.frames[store.golds[name]]
+            print '{}  {}  {} {} bytes'.format(store.golds[name][:10], name, entry['encoding'], entry['size'])
+    elif args.command == 'rebaseline':
+        if not rebaseline(store, args.names, args.out_dir):
+            print 'Nothing to rebaseline'
+    elif args.command == 'export':
+        names = _expand(store, args.names, store.names()) if args.names else None
+        print 'Exported {} images to {}'.format(len(store.export(args.dirname, names)), args.dirname)
+    elif args.command == 'import':
+        for filename in args.filenames:
+            store.put(os.path.splitext(os.path.basename(filename))[0], load_image(filename))
+        store.save()
+        print 'Imported {} images'.format(len(args.filenames))
+    elif args.command == 'prune':
+        print 'Dropped {} unused frames'.format(store.prune())
+
+if __name__ == '__main__':
+    main()
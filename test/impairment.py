@@ -0,0 +1,97 @@
+"""
+Simulated network trouble for the mock Nightscout server, to exercise the
+request timeouts and retries of the JS and the watchface without a bad network.
+
+Rules are set per collection, or for all collections with "*", by POSTing JSON
+like this to /impair (POST {} to clear them):
+
+    {
+        "devicestatus": {"latency_ms": 3000, "jitter_ms": 1000},
+        "*": {"bandwidth_bps": 2000, "drop_rate": 0.1, "error_rate": 0.2, "error_status": 503}
+    }
+
+latency_ms, jitter_ms  delay before responding, +/- a uniformly random jitter
+bandwidth_bps          bytes per second at which the body is sent
+drop_rate              fraction of responses cut off partway through the body
+error_rate             fraction of requests answered with error_status
+"""
+
+import random
+import threading
+from collections import namedtuple
+
+DEFAULT_RULE = {
+    'latency_ms': 0,
+    'jitter_ms': 0,
+    'bandwidth_bps': None,
+    'drop_rate': 0,
+    'error_rate': 0,
+    'error_status': 500,
+}
+ALL_COLLECTIONS = '*'
+# How often a bandwidth-limited body is written
+CHUNKS_PER_SECOND = 10
+
+# What to do with one request: wait `delay` seconds, then either respond with
+# an error `status`, or send the body, cut off partway if `drop`
+Plan = namedtuple('Plan', ['delay', 'status', 'drop', 'bytes_per_second'])
+NO_IMPAIRMENT = Plan(0, None, False, None)
+
+
+def _validate(rules):
+    if not isinstance(rules, dict):
+        raise ValueError('Impairment rules must be an object')
+    for coll, rule in rules.items():
+        if not isinstance(rule, dict):
+            raise ValueError('Rule for {} must be an object'.format(coll))
+        unknown = set(rule) - set(DEFAULT_RULE)
+        if unknown:
+            raise ValueError('Unknown impairment settings for {}: {}'.format(coll, ', '.join(sorted(unknown))))
+    return dict((coll, dict(DEFAULT_RULE, **rule)) for coll, rule in rules.items())
+
+
+class Impairments(object):
+    def __init__(self, seed=None):
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._rules = {}
+
+    def set(self, rules):
+        """Replace all rules. Raises ValueError if they're malformed."""
+        rules = _validate(rules)
+        with self._lock:
+            self._rules = rules
+
+    def to_json(self):
+        with self._lock:
+            return dict(self._rules)
+
+    def plan(self, coll):
+        with self._lock:
+            rule = self._rules.get(coll, self._rules.get(ALL_COLLECTIONS))
+            if rule is None:
+                return NO_IMPAIRMENT
+            jitter = self._random.uniform(-rule['jitter_ms'], rule['jitter_ms'])
+            error = self._random.random() < rule['error_rate']
+            drop = self._random.random() < rule['drop_rate']
+        return Plan(
+            delay=max(0, rule['latency_ms'] + jitter) / 1000.0,
+            status=rule['error_status'] if error else None,
+            drop=drop and not error,
+            bytes_per_second=rule['bandwidth_bps'],
+        )
+
+
+def chunks(body, plan):
+    """(pause in seconds, chunk) pairs to send the body as the plan says.
+
+    A dropped response ends halfway through the body.
+    """
+    end = len(body) // 2 if plan.drop else len(body)
+    if not plan.bytes_per_second:
+        yield 0, body[:end]
+        return
+    size = max(1, int(plan.bytes_per_second // CHUNKS_PER_SECOND))
+    for start in range(0, end, size):
+        chunk = body[start:min(end, start + size)]
+        yield len(chunk) / float(plan.bytes_per_second), chunk
@@ -3,10 +3,9 @@
 /*
  * Run the Urchin request loop repeatedly, for profiling.
  *
- * This requires installing a few Node modules:
+ * This requires installing a couple of Node modules besides those in package.json:
  *   npm install v8-profiler
  *   npm install node-inspector
- *   npm install xmlhttprequest
  *
  * Run this from the command line with a file containing Urchin config JSON:
  *   node --debug profiler.js config.json
@@ -0,0 +1,279 @@
+/* jshint node: true */
+
+/*
+ * Soak test of the phone-side caches: poll a mock Nightscout server every few
+ * minutes of virtual time through a day or more of data, checking after each
+ * poll that the caches hold the data the server has, each element once.
+ *
+ * The server's virtual clock (see test/virtual_clock.py) is frozen at the
+ * start, then advanced by the poll interval before each poll. The server hides
+ * data from after the virtual time, so it arrives as it would have live, and
+ * the JS's Date follows the same clock (via timekeeper). A day takes seconds.
+ *
+ * Run `npm install` in test/js first, for xmlhttprequest and timekeeper.
+ *
+ * Fill a mock server with a couple of days of data and soak the last 24 hours:
+ *   MOCK_SERVER_PORT=5555 python test/server.py &
+ *   python test/synthetic_data.py --days 2 --post http://localhost:5555
+ *   node test/js/soak.js http://localhost:5555 --hours 24
+ *
+ * Like the watch, each poll passes the dataId of the last data message, so the
+ * JS sends only new graph points when it can. To check that the watch would
+ * decode them into the graph the JS meant, and see how many bytes packing saves:
+ *   node test/js/soak.js http://localhost:5555 --hours 12 --messages /tmp/messages.json
+ *   python test/data_packing.py --check /tmp/messages.json
+ *
+ * Options:
+ *   --hours N             virtual hours to poll through (default 24)
+ *   --interval-minutes N  virtual minutes between polls (default 5)
+ *   --config FILE         Urchin config JSON, as in profiler.js (default: bolus ticks, basal
+ *                         graph and loop, rig battery and basal status)
+ *   --messages FILE       write each data message, with the graph arrays it was made from
+ */
+
+var http = require('http');
+var url = require('url');
+
+var timekeeper = require('timekeeper');
+
+global.localStorage = require('./make_mock_local_storage.js')();
+global.XMLHttpRequest = require('xmlhttprequest').XMLHttpRequest;
+
+var c = require('../../src/js/constants.json');
+
+// The graph arrays each data message was made from, recorded by wrapping graph_messages.js before app.js loads it
+var graphMessagesPath = require.resolve('../../src/js/graph_messages.js');
+var graphMessages = require(graphMessagesPath);
+var lastGraph;
+require.cache[graphMessagesPath].exports = function(c) {
+  var addGraph = graphMessages(c);
+  return function(message, watchDataId, endTime, sgvs, graphExtra) {
+    lastGraph = {sgvs: sgvs, graphExtra: graphExtra};
+    return addGraph.apply(this, arguments);
+  };
+};
+
+// Caches of data.js, by localStorage key, and the field each is ordered by
+var CACHES = {
+  'cache_sgv': 'date',
+  'cache_tempBasal': 'created_at',
+  'cache_bolus': 'created_at',
+  'cache_uploaderBattery': 'created_at',
+  'cache_calibration': 'date',
+  'cache_loop': 'created_at',
+  'cache_loopEnacted': 'created_at',
+  'cache_openAPSStatus': 'created_at',
+};
+// Without --config, fetch everything which has a cache
+var SOAK_CONFIG = {
+  statusContent: 'multiple',
+  statusLine1: 'loop',
+  statusLine2: 'rigbattery',
+  statusLine3: 'basal',
+  bolusTicks: true,
+  basalGraph: true,
+};
+var MAX_FAILURES_SHOWN = 20;
+
+function parseArgs(argv) {
+  var args = {hours: 24, intervalMinutes: 5};
+  for (var i = 0; i < argv.length; i++) {
+    if (argv[i] === '--hours') {
+      args.hours = parseFloat(argv[++i]);
+    } else if (argv[i] === '--interval-minutes') {
+      args.intervalMinutes = parseFloat(argv[++i]);
+    } else if (argv[i] === '--config') {
+      args.config = JSON.parse(require('fs').readFileSync(argv[++i]));
+    } else if (argv[i] === '--messages') {
+      args.messages = argv[++i];
+    } else {
+      args.host = argv[i].replace(/\/$/, '');
+    }
+  }
+  if (args.host === undefined || isNaN(args.hours) || isNaN(args.intervalMinutes)) {
+    console.error('Usage: node soak.js <mock server> [--hours N] [--interval-minutes N] [--config FILE] [--messages FILE]');
+    process.exit(1);
+  }
+  return args;
+}
+
+// Requests to the mock server itself, which bypass the JS under test
+function request(method, path, body) {
+  return new Promise(function(resolve, reject) {
+    var options = url.parse(host + path);
+    options.method = method;
+    var req = http.request(options, function(res) {
+      var chunks = [];
+      res.on('data', function(chunk) { chunks.push(chunk); });
+      res.on('end', function() {
+        var text = Buffer.concat(chunks).toString();
+        if (res.statusCode !== 200) {
+          reject(new Error(method + ' ' + path + ' failed, status ' + res.statusCode + ': ' + text));
+        } else {
+          resolve(text ? JSON.parse(text) : null);
+        }
+      });
+    });
+    req.on('error', reject);
+    req.end(body === undefined ? undefined : JSON.stringify(body));
+  });
+}
+
+function setClock(settings) {
+  return request('POST', '/clock', settings).then(function(clock) {
+    timekeeper.freeze(new Date(clock.time));
+    return clock.time;
+  });
+}
+
+var args = parseArgs(process.argv.slice(2));
+var host = args.host;
+var config = args.config || SOAK_CONFIG;
+config.nightscout_url = host;
+localStorage.setItem(c.LOCAL_STORAGE_KEY_CONFIG, JSON.stringify(config));
+
+// Each poll ends with a data or error message to the watch
+var onPollDone;
+var readyHandler;
+var appMessageHandler;
+var errors = 0;
+// The dataId of the last data message, which the watch would have
+var watchDataId;
+var dataMessages = [];
+// Requests made by the checks, which the server counts along with those of the JS
+var checkRequests = 0;
+var Pebble = {
+  addEventListener: function(e, fn) {
+    if (e === 'ready') {
+      readyHandler = fn;
+    } else if (e === 'appmessage') {
+      appMessageHandler = fn;
+    }
+  },
+  sendAppMessage: function(message, resolve) {
+    resolve();
+    if (message.msgType === c.MSG_TYPE_ERROR) {
+      errors++;
+    }
+    if (message.msgType === c.MSG_TYPE_DATA) {
+      watchDataId = message.dataId;
+      dataMessages.push({message: JSON.parse(JSON.stringify(message)), graph: lastGraph});
+    }
+    if ((message.msgType === c.MSG_TYPE_DATA || message.msgType === c.MSG_TYPE_ERROR) && onPollDone) {
+      var done = onPollDone;
+      onPollDone = undefined;
+      done(message);
+    }
+  },
+};
+
+function poll(trigger) {
+  return new Promise(function(resolve) {
+    onPollDone = resolve;
+    trigger();
+  });
+}
+
+function cacheEntries(key) {
+  var stored = localStorage.getItem(key);
+  return stored ? JSON.parse(stored) : [];
+}
+
+function checkSGVCache(now, failures) {
+  var cached = cacheEntries('cache_sgv');
+  if (cached.length === 0) {
+    return Promise.resolve();
+  }
+  var oldest = cached[cached.length - 1]['date'];
+  // Everything the server has since the oldest cached SGV should be cached, in the same order
+  checkRequests++;
+  return request('GET', '/api/v1/entries/sgv.json?count=100000&find[date][$gte]=' + oldest).then(function(served) {
+    var cachedDates = cached.map(function(e) { return e['date']; }).join(',');
+    var servedDates = served.map(function(e) { return e['date']; }).join(',');
+    if (cachedDates !== servedDates) {
+      failures.push(new Date(now).toISOString() + ': SGV cache has ' + cached.length + ' entries, server has ' + served.length);
+    }
+  });
+}
+
+function checkCaches(now, failures) {
+  Object.keys(CACHES).forEach(function(key) {
+    var field = CACHES[key];
+    var times = cacheEntries(key).map(function(e) { return new Date(e[field]).getTime(); });
+    for (var i = 1; i < times.length; i++) {
+      if (!(times[i - 1] > times[i])) {
+        failures.push(new Date(now).toISOString() + ': ' + key + ' is out of order or has duplicates at ' + i);
+        break;
+      }
+    }
+    if (times.length && times[0] > now) {
+      failures.push(new Date(now).toISOString() + ': ' + key + ' has an element from the future');
+    }
+  });
+  return checkSGVCache(now, failures);
+}
+
+function soak() {
+  var failures = [];
+  var polls = 0;
+  // Date is frozen in virtual time
+  var started = process.hrtime();
+  var end;
+
+  function step(now) {
+    polls++;
+    return checkCaches(now, failures).then(function() {
+      if (now + args.intervalMinutes * 60 * 1000 > end) {
+        return;
+      }
+      return setClock({advance_ms: args.intervalMinutes * 60 * 1000}).then(function(now) {
+        return poll(function() { appMessageHandler({payload: {dataId: watchDataId}}); }).then(function() {
+          return step(now);
+        });
+      });
+    });
+  }
+
+  return request('GET', '/clock').then(function(clock) {
+    end = clock.time;
+    return request('POST', '/stats/reset');
+  }).then(function() {
+    return setClock({time: end - args.hours * 60 * 60 * 1000, rate: 0});
+  }).then(function(now) {
+    var app = require('../../src/js/app');
+    app(Pebble, c);
+    // Send data immediately after the watchface is launched
+    return poll(readyHandler).then(function() {
+      return step(now);
+    });
+  }).then(function() {
+    return request('GET', '/stats');
+  }).then(function(stats) {
+    var requests = stats.requests.reduce(function(total, s) { return total + s.count; }, 0) - checkRequests;
+    var elapsed = process.hrtime(started);
+    var sizes = Object.keys(CACHES).map(function(key) {
+      return key.replace('cache_', '') + ' ' + cacheEntries(key).length;
+    });
+    console.log(
+      polls + ' polls over ' + args.hours + 'h in ' + (elapsed[0] + elapsed[1] / 1e9).toFixed(1) + 's, ' +
+      requests + ' requests, ' + errors + ' errors'
+    );
+    console.log('Cached: ' + sizes.join(', '));
+    if (args.messages) {
+      require('fs').writeFileSync(args.messages, JSON.stringify(dataMessages));
+      console.log('Wrote ' + dataMessages.length + ' data messages to ' + args.messages);
+    }
+    failures.slice(0, MAX_FAILURES_SHOWN).forEach(function(f) { console.log('FAIL ' + f); });
+    return failures.length === 0 && errors === 0;
+  });
+}
+
+soak().then(function(passed) {
+  timekeeper.reset();
+  return request('POST', '/clock', {}).then(function() {
+    process.exit(passed ? 0 : 1);
+  });
+}).catch(function(e) {
+  console.error(e.stack);
+  process.exit(1);
+});
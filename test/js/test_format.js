@@ -57,4 +57,15 @@ describe('format', function() {
       );
     });
   });
+
+  describe('truncateUTF8', function() {
+    it('should cut text to a number of bytes once encoded, without splitting characters', function() {
+      expect(format.truncateUTF8('abcdef', 4)).to.be('abcd');
+      expect(format.truncateUTF8('abc', 4)).to.be('abc');
+      expect(format.truncateUTF8('a\u00e9\u00e9', 4)).to.be('a\u00e9');
+      expect(format.truncateUTF8('\u2192\u2192', 5)).to.be('\u2192');
+      expect(format.truncateUTF8('a\ud83d\ude00', 4)).to.be('a');
+      expect(format.truncateUTF8('a\ud83d\ude00', 5)).to.be('a\ud83d\ude00');
+    });
+  });
 });
@@ -0,0 +1,82 @@
+/* jshint node: true */
+/* globals describe, it, beforeEach */
+"use strict";
+
+var expect = require('expect.js');
+
+var Format = require('../../src/js/format.js');
+var GraphMessages = require('../../src/js/graph_messages.js');
+
+var constants = require('../../src/js/constants.json');
+
+describe('addGraph', function() {
+  var INTERVAL_MS = constants.INTERVAL_SIZE_SECONDS * 1000;
+  var END_TIME = 1476000000000;
+  // Newest first
+  var SGVS = [141, 140, 139, 138, 0, 131, 130, 128, 127, 125, 121, 120];
+  var GRAPH_EXTRA = [0, 0, 0, 1, 0, 0, 0, 0, 2, 2, 2, 2];
+  var format = Format(constants);
+  var addGraph;
+
+  beforeEach(function() {
+    addGraph = GraphMessages(constants);
+  });
+
+  function send(watchDataId, shift, sgvs, graphExtra) {
+    return addGraph({msgType: constants.MSG_TYPE_DATA}, watchDataId, END_TIME + shift * INTERVAL_MS, sgvs, graphExtra);
+  }
+
+  it('should pack the whole graph in the first message', function() {
+    var message = send(undefined, 0, SGVS, GRAPH_EXTRA);
+    expect(message.sgvsPacked).to.eql(format.packSGVs(constants.PACKED_MODE_FULL, SGVS));
+    expect(message.graphExtraPacked).to.eql(format.packGraphExtra(constants.PACKED_MODE_FULL, GRAPH_EXTRA));
+    expect(message.sgvs).to.be(undefined);
+    expect(message.dataId).to.be.a('number');
+  });
+
+  it('should only send newer points if the watch has the last message', function() {
+    var first = send(undefined, 0, SGVS, GRAPH_EXTRA);
+    var second = send(first.dataId, 2, [145, 143].concat(SGVS.slice(0, 10)), [3, 3].concat(GRAPH_EXTRA.slice(0, 10)));
+    expect(second.sgvsPacked).to.eql([constants.PACKED_MODE_APPEND, 2, 255, 0, 145, 62]);
+    expect(second.graphExtraPacked).to.eql([constants.PACKED_MODE_APPEND, 2, 3, 128]);
+    expect(second.dataId).not.to.be(first.dataId);
+
+    // Nothing new: the watch keeps what it has
+    var third = send(second.dataId, 2, [145, 143].concat(SGVS.slice(0, 10)), [3, 3].concat(GRAPH_EXTRA.slice(0, 10)));
+    expect(third.sgvsPacked).to.eql([constants.PACKED_MODE_APPEND, 0]);
+    expect(third.graphExtraPacked).to.eql([constants.PACKED_MODE_APPEND, 0]);
+  });
+
+  it('should send the whole graph if the watch has another message, e.g. after restarting', function() {
+    var first = send(undefined, 0, SGVS, GRAPH_EXTRA);
+    var second = send(first.dataId + 1, 1, [143].concat(SGVS.slice(0, 11)), [0].concat(GRAPH_EXTRA.slice(0, 11)));
+    expect(second.sgvsPacked[0]).to.be(constants.PACKED_MODE_FULL);
+    expect(second.sgvsPacked[1]).to.be(SGVS.length);
+
+    var third = send(undefined, 1, [143].concat(SGVS.slice(0, 11)), [0].concat(GRAPH_EXTRA.slice(0, 11)));
+    expect(third.sgvsPacked[0]).to.be(constants.PACKED_MODE_FULL);
+  });
+
+  it('should send the whole graph if the history has changed or there is a gap', function() {
+    var first = send(undefined, 0, SGVS, GRAPH_EXTRA);
+    // A point the watch has was backfilled
+    var backfilled = [143, 141, 140, 139, 138, 134, 131, 130, 128, 127, 125, 121];
+    var second = send(first.dataId, 1, backfilled, [0].concat(GRAPH_EXTRA.slice(0, 11)));
+    expect(second.sgvsPacked[0]).to.be(constants.PACKED_MODE_FULL);
+
+    // Longer ago than the graph is wide
+    var third = send(second.dataId, 1 + SGVS.length, SGVS, GRAPH_EXTRA);
+    expect(third.sgvsPacked[0]).to.be(constants.PACKED_MODE_FULL);
+    expect(third.sgvsPacked[1]).to.be(SGVS.length);
+  });
+
+  it('should pack erratic data too, since unpacked SGVs are halved', function() {
+    var erratic = [10, 401, 10, 401, 10, 401];
+    var alternating = [1, 2, 1, 2, 1, 2];
+    var message = send(undefined, 0, erratic, alternating);
+    expect(message.sgvsPacked).to.eql(format.packSGVs(constants.PACKED_MODE_FULL, erratic));
+    expect(message.graphExtraPacked).to.eql(format.packGraphExtra(constants.PACKED_MODE_FULL, alternating));
+    expect(message.sgvs).to.be(undefined);
+    expect(message.graphExtra).to.be(undefined);
+  });
+});
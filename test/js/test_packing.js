@@ -0,0 +1,32 @@
+/* jshint node: true */
+/* globals describe, it */
+"use strict";
+
+var expect = require('expect.js');
+
+var Format = require('../../src/js/format.js');
+
+var constants = require('../../src/js/constants.json');
+
+// Generated by test/data_packing.py, whose decoder matches the watch's
+var fixtures = require('./packing_fixtures.json');
+
+describe('packing', function() {
+  var format = Format(constants);
+
+  describe('packSGVs', function() {
+    it('should match the Python encoder', function() {
+      fixtures.forEach(function(fixture) {
+        expect(format.packSGVs(fixture.mode, fixture.sgvs)).to.eql(fixture.sgvsPacked);
+      });
+    });
+  });
+
+  describe('packGraphExtra', function() {
+    it('should match the Python encoder', function() {
+      fixtures.forEach(function(fixture) {
+        expect(format.packGraphExtra(fixture.mode, fixture.graphExtra)).to.eql(fixture.graphExtraPacked);
+      });
+    });
+  });
+});
@@ -0,0 +1,183 @@
+"""
+Latency of the path from new Nightscout data to a new frame on the watch, as
+measured by the screenshot tests in benchmark mode.
+
+For each scenario and platform, the harness records when each phase finished,
+in seconds since the test started setting data:
+
+    data_set          the mock server has stored the scenario's data
+    config_delivered  the JS logged the new preferences
+    fetch_issued      the JS made its first request to Nightscout
+    message_sent      the JS sent the data AppMessage
+    rendered          the watchface logged that it updated its elements
+    frame_changed     a screenshot first differed from the frame before (an
+                      upper bound: screenshots are taken from `rendered` on,
+                      50ms apart, and each takes a while)
+
+Each scenario is measured twice: "first_data", with the JS caches cleared as
+for the screenshot itself, and "refresh", when the same config is sent again
+with warm caches. Refreshes don't set data, and leave the frame unchanged.
+
+Requests are only logged by debug builds, which the harness makes when
+benchmarking. Records are appended as JSON lines to the file named by
+SCREENSHOT_BENCHMARK, so runs accumulate into a time series. Compare the
+latest run to a baseline:
+
+    python test/latency_benchmark.py benchmark.jsonl --baseline baseline.jsonl
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+
+PHASES = ['data_set', 'config_delivered', 'fetch_issued', 'message_sent', 'rendered', 'frame_changed']
+KINDS = ['first_data', 'refresh']
+
+BENCHMARK_FILE = os.environ.get('SCREENSHOT_BENCHMARK')
+# Shared by every test process in a run, e.g. pytest-xdist workers
+RUN_ID = os.environ.get('SCREENSHOT_BENCHMARK_RUN') or time.strftime('%Y%m%dT%H%M%S')
+
+# A phase has regressed if it is this much slower than the baseline, relatively and absolutely
+REGRESSION_RATIO = 1.25
+REGRESSION_MIN_SECONDS = 0.25
+
+
+def enabled():
+    return bool(BENCHMARK_FILE)
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.STDOUT
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Timer(object):
+    """Phase times for one scenario on one platform, relative to when it was started."""
+    def __init__(self, scenario, platform, kind, started=None):
+        self.scenario = scenario
+        self.platform = platform
+        self.kind = kind
+        self.started = time.time() if started is None else started
+        self.phases = {}
+
+    def mark(self, phase, at=None):
+        if phase not in PHASES:
+            raise ValueError('Unknown phase: {}'.format(phase))
+        if at is not None:
+            self.phases[phase] = round(at - self.started, 4)
+
+    def record(self):
+        return {
+            'run': RUN_ID,
+            'time': int(self.started),
+            'scenario': self.scenario,
+            'platform': self.platform,
+            'kind': self.kind,
+            'phases': self.phases,
+        }
+
+
+class BenchmarkFile(object):
+    def __init__(self, filename):
+        self.filename = filename
+        self.commit = _git_commit()
+        self._lock = threading.Lock()
+
+    def append(self, timer):
+        line = json.dumps(dict(timer.record(), commit=self.commit), sort_keys=True) + '\n'
+        with self._lock:
+            # A single small append, so that test processes can share the file
+            with open(self.filename, 'a') as f:
+                f.write(line)
+
+
+def load(filename):
+    with open(filename) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def latest_run(records):
+    """Records from the run which was started last."""
+    if not records:
+        return []
+    run = max(records, key=lambda r: (r['time'], r['run']))['run']
+    return [r for r in records if r['run'] == run]
+
+def _median(values):
+    values = sorted(values)
+    mid = len(values) // 2
+    return values[mid] if len(values) % 2 else (values[mid - 1] + values[mid]) / 2.0
+
+def medians(records):
+    """Median time of each (scenario, platform, kind, phase)."""
+    samples = defaultdict(list)
+    for r in records:
+        for phase, seconds in r['phases'].items():
+            samples[(r['scenario'], r['platform'], r['kind'], phase)].append(seconds)
+    return dict((key, _median(values)) for key, values in samples.items())
+
+def regressions(current, baseline, ratio=REGRESSION_RATIO, min_seconds=REGRESSION_MIN_SECONDS):
+    """(key, baseline seconds, current seconds) for each phase which got slower than allowed."""
+    current, baseline = medians(current), medians(baseline)
+    out = []
+    for key in sorted(set(current) & set(baseline)):
+        if current[key] > baseline[key] * ratio and current[key] - baseline[key] > min_seconds:
+            out.append((key, baseline[key], current[key]))
+    return out
+
+def summary(records):
+    """Median of each phase per kind and platform, across scenarios."""
+    by_kind = defaultdict(list)
+    for (scenario, platform, kind, phase), seconds in medians(records).items():
+        by_kind[(kind, platform, phase)].append(seconds)
+    lines = []
+    for kind in KINDS:
+        for platform in sorted(set(p for k, p, _ in by_kind if k == kind)):
+            phases = [
+                '{} {:.2f}s'.format(phase, _median(by_kind[(kind, platform, phase)]))
+                for phase in PHASES if (kind, platform, phase) in by_kind
+            ]
+            lines.append('{} [{}]: {}'.format(kind, platform, ', '.join(phases)))
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('history', help='JSON lines written by the screenshot tests')
+    parser.add_argument('--baseline', help='JSON lines to compare against; defaults to the run before the latest')
+    parser.add_argument('--ratio', type=float, default=REGRESSION_RATIO)
+    parser.add_argument('--min-seconds', type=float, default=REGRESSION_MIN_SECONDS)
+    args = parser.parse_args()
+
+    records = load(args.history)
+    current = latest_run(records)
+    if not current:
+        parser.error('no records in {}'.format(args.history))
+    if args.baseline:
+        baseline = latest_run(load(args.baseline))
+    else:
+        baseline = latest_run([r for r in records if r['run'] != current[0]['run']])
+
+    print 'Run {} ({} records)'.format(current[0]['run'], len(current))
+    print summary(current)
+    if not baseline:
+        print 'No baseline to compare against'
+        return
+
+    slower = regressions(current, baseline, args.ratio, args.min_seconds)
+    print 'Compared to run {}: {} regressions'.format(baseline[0]['run'], len(slower))
+    for (scenario, platform, kind, phase), before, after in slower:
+        print '  {} [{}] {} {}: {:.2f}s -> {:.2f}s'.format(scenario, platform, kind, phase, before, after)
+    if slower:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,7 @@
 #!/bin/bash
 # A hacky script to make test-driven iteration much faster.
 #
-# Call with the name of a test class defined in test_screenshots.py, and it
+# Call with the name of a test class defined in screenshot_scenarios.py, and it
 # will reload the emulator with its config and data on every file change.
 #
 # For other options, see: python test/set_config.py -h
@@ -20,7 +20,7 @@ run () {
 
   # Requires watchdog
   COMMAND="python $TEST_DIR/set_config.py --test-class $@"
-  watchmedo shell-command --patterns="**/test_screenshots.py" --recursive --command="$COMMAND" $TEST_DIR
+  watchmedo shell-command --patterns="**/screenshot_scenarios.py" --recursive --command="$COMMAND" $TEST_DIR
 
   kill -9 $PID
 
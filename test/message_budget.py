@@ -0,0 +1,178 @@
+"""
+Sizes of the AppMessages the JS sends to the watchface, as Pebble encodes them,
+against the watchface's inbox (CONTENT_SIZE in comm.h). A message which doesn't
+fit is dropped before the watchface sees it.
+
+A message is a dictionary: a byte for the number of tuples, then for each, a
+4-byte key, a type byte, a 2-byte length and the value. The JS's values are
+encoded as
+
+    numbers, booleans  int32
+    strings            UTF-8, null-terminated
+    arrays             a byte per element
+
+For every layout in LAYOUTS, point style in POINT_STYLES and kind of status
+text, this builds the preferences and the largest data message the JS can send
+(see sendPreferences and requestAndSendData in app.js): the graph as wide as the
+layout allows, and its arrays packed as long as they can be: every SGV 3 bytes
+and no runs (see packSGVs and packGraphExtra in format.js). Status
+sources differ, as far as the message goes, only in the length of their text.
+Report the headroom of every scenario, worst first:
+
+    python test/message_budget.py
+
+Exits with status 1 if any scenario is over budget. The screenshot tests also
+check the size of every message their JS sends.
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(__file__), '..', 'src')
+
+with open(os.path.join(SRC_DIR, 'js', 'constants.json')) as f:
+    CONSTANTS = json.load(f)
+with open(os.path.join(SRC_DIR, 'comm.h')) as f:
+    CONTENT_SIZE = int(re.search(r'#define CONTENT_SIZE (\d+)', f.read()).group(1))
+
+DICT_HEADER_BYTES = 1
+TUPLE_HEADER_BYTES = 4 + 1 + 2
+INT_BYTES = 4
+
+STATUS_TEXTS = [
+    ('none', u''),
+    ('short', u'IOB 1.25U COB 20g'),
+    ('full', u'x' * CONSTANTS['STATUS_TEXT_MAX_BYTES']),
+    # e.g. arrows in custom text, 3 bytes each
+    ('full, non-ASCII', u'\u2192' * CONSTANTS['STATUS_TEXT_MAX_BYTES']),
+]
+
+
+def value_size(value):
+    if isinstance(value, (bool, int, long, float)):
+        return INT_BYTES
+    elif isinstance(value, basestring):
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        return len(value) + 1
+    elif isinstance(value, list):
+        return len(value)
+    else:
+        raise ValueError('Cannot send {!r} in an AppMessage'.format(value))
+
+def message_size(message):
+    """Bytes the dictionary for `message`, as passed to Pebble.sendAppMessage, takes in the inbox."""
+    return DICT_HEADER_BYTES + sum(TUPLE_HEADER_BYTES + value_size(value) for value in message.values())
+
+def truncate_utf8(text, max_bytes):
+    """Like truncateUTF8 in format.js."""
+    return text.encode('utf-8')[:max_bytes].decode('utf-8', 'ignore')
+
+
+def get_layout(config):
+    return config['customLayout'] if config['layout'] == 'custom' else CONSTANTS['LAYOUTS'][config['layout']]
+
+def graph_width(layout):
+    """Like computeGraphWidth in points.js."""
+    for element in layout['elements']:
+        if CONSTANTS['ELEMENTS'][element['el']] == 'GRAPH_ELEMENT':
+            return int(round(CONSTANTS['SCREEN_WIDTH'] * element['width'] / 100.0))
+    return 0
+
+def visible_points(width, config):
+    """Like computeVisiblePoints in points.js."""
+    available = width - config['pointRightMargin']
+    points = (available + max(0, config['pointMargin'])) // (config['pointWidth'] + config['pointMargin'])
+    return max(0, points)
+
+def preferences_message(config):
+    layout = get_layout(config)
+    message = dict((key, config[key]) for key in [
+        'mmol', 'topOfGraph', 'topOfRange', 'bottomOfRange', 'bottomOfGraph', 'hGridlines', 'batteryAsNumber',
+        'basalGraph', 'basalHeight', 'updateEveryMinute', 'pointRectHeight', 'pointWidth', 'pointMargin',
+        'pointRightMargin', 'plotLine', 'plotLineWidth', 'plotLineIsCustomColor', 'statusMinRecencyToShowMinutes',
+        'statusMaxAgeMinutes',
+    ])
+    enabled = [e for e in layout['elements'] if e['enabled']]
+    message.update({
+        'msgType': CONSTANTS['MSG_TYPE_PREFERENCES'],
+        'timeAlign': CONSTANTS['ALIGN'][layout['timeAlign']],
+        'batteryLoc': CONSTANTS['BATTERY_LOC'][layout['batteryLoc']],
+        'connStatusLoc': CONSTANTS['CONN_STATUS_LOC'][layout['connStatusLoc']],
+        'recencyLoc': CONSTANTS['RECENCY_LOC'][layout['recencyLoc']],
+        'recencyStyle': CONSTANTS['RECENCY_STYLE'][layout['recencyStyle']],
+        'pointShape': CONSTANTS['POINT_SHAPE'][config['pointShape']],
+        'numElements': len(enabled),
+        'elements': [0] * (len(enabled) * len(CONSTANTS['PROPERTIES'])),
+        'colors': [0] * len(CONSTANTS['COLOR_KEYS']),
+        'statusRecencyFormat': CONSTANTS['STATUS_RECENCY_FORMAT'][config['statusRecencyFormat']],
+    })
+    return message
+
+def data_message(config, status_text):
+    points = visible_points(graph_width(get_layout(config)), config)
+    return {
+        'msgType': CONSTANTS['MSG_TYPE_DATA'],
+        'recency': 0,
+        'lastSgv': 0,
+        'trend': 0,
+        'delta': 0,
+        'statusText': truncate_utf8(status_text, CONSTANTS['STATUS_TEXT_MAX_BYTES']),
+        'statusRecency': 0,
+        'dataId': 0,
+        # A 2-byte header, then 3 bytes per SGV and 1 per graph extra value
+        'sgvsPacked': [0] * (2 + 3 * points),
+        'graphExtraPacked': [0] * (2 + points),
+    }
+
+
+def scenarios():
+    """(layout, point style, status text, messages) for every combination."""
+    out = []
+    for layout in sorted(CONSTANTS['LAYOUTS']):
+        for point_style in sorted(CONSTANTS['POINT_STYLES']):
+            config = dict(CONSTANTS['DEFAULT_CONFIG'], layout=layout, **CONSTANTS['POINT_STYLES'][point_style])
+            for status, status_text in STATUS_TEXTS:
+                messages = {
+                    'preferences': preferences_message(config),
+                    'data': data_message(config, status_text),
+                }
+                out.append((layout, point_style, status, messages))
+    return out
+
+def over_budget(message, budget=CONTENT_SIZE):
+    """A reason if `message` doesn't fit in the watchface's inbox, or None."""
+    size = message_size(message)
+    if size <= budget:
+        return None
+    sizes = sorted(((TUPLE_HEADER_BYTES + value_size(v), k) for k, v in message.items()), reverse=True)
+    return 'Message is {} bytes, over the {}-byte inbox. Largest values: {}'.format(
+        size, budget, ', '.join('{} ({} bytes)'.format(k, s) for s, k in sizes[:3]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--budget', type=int, default=CONTENT_SIZE, help='inbox size in bytes')
+    parser.add_argument('--worst', type=int, help='only report this many scenarios')
+    args = parser.parse_args()
+
+    rows = []
+    for layout, point_style, status, messages in scenarios():
+        for kind, message in messages.items():
+            size = message_size(message)
+            rows.append((args.budget - size, size, layout, point_style, status, kind))
+    rows.sort()
+
+    print '{:>8} {:>6}  {:<7}{:<7}{:<17}{}'.format('headroom', 'bytes', 'layout', 'points', 'status', 'message')
+    for headroom, size, layout, point_style, status, kind in rows[:args.worst]:
+        print '{:>8} {:>6}  {:<7}{:<7}{:<17}{}'.format(headroom, size, layout, point_style, status, kind)
+    over = [row for row in rows if row[0] < 0]
+    print '{} of {} messages over the {}-byte budget'.format(len(over), len(rows), args.budget)
+    if over:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+"""
+Query engine for the mock Nightscout server.
+
+Supports the subset of Nightscout's MongoDB-style query string syntax which the
+JS actually sends, e.g.:
+
+    find[date][$gt]=1476800000000
+    find[created_at][$gt]=2016-10-18T12:00:00-07:00
+    find[eventType]=Temp+Basal
+    find[$or][0][uploaderBattery][$exists]=true&find[$or][1][uploader][$exists]=true
+    find[loop.failureReason][$not][$exists]=true
+    count=10
+
+A query using anything else, e.g. an unsupported $operator or a count which
+isn't a number, raises ValueError when it's parsed.
+
+Like Nightscout, results are sorted by time, most recent first. Range queries
+on a collection's time field are answered from a sorted index using bisect,
+so incremental fetches cost about as much as the number of new elements.
+"""
+
+import bisect
+import re
+from datetime import datetime
+
+from dateutil import parser as date_parser
+from dateutil.tz import tzlocal
+from dateutil.tz import tzutc
+
+TIME_FIELDS = {
+    'entries': 'date',
+    'treatments': 'created_at',
+    'devicestatus': 'created_at',
+}
+
+EPOCH = datetime(1970, 1, 1, tzinfo=tzutc())
+MISSING = object()
+
+_KEY_PARTS = re.compile(r'\[([^\]]*)\]')
+
+
+def to_millis(value):
+    """Epoch milliseconds from a number, numeric string or ISO 8601 string, or None."""
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, long, float)):
+        return float(value)
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        dt = date_parser.parse(value)
+    except (ValueError, OverflowError):
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=tzlocal())
+    return (dt - EPOCH).total_seconds() * 1000
+
+def parse_query(args):
+    """Nest flat query args like `find[a][b]=v` into dicts, as Nightscout's query string parser does.
+
+    Dicts whose keys are all array indices (e.g. under `$or`) become lists.
+    """
+    out = {}
+    for key, value in args.items():
+        head = key.split('[', 1)[0]
+        parts = [head] + _KEY_PARTS.findall(key[len(head):])
+        node = out
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = value
+    query = _lists_from_indexed_dicts(out)
+    _check_query(query)
+    return query
+
+def _lists_from_indexed_dicts(node):
+    if not isinstance(node, dict):
+        return node
+    node = dict((k, _lists_from_indexed_dicts(v)) for k, v in node.items())
+    if node and all(k.isdigit() for k in node):
+        return [node[k] for k in sorted(node, key=int)]
+    return node
+
+def _check_query(query):
+    if 'count' in query:
+        try:
+            int(query['count'])
+        except (TypeError, ValueError):
+            raise ValueError('count must be a whole number: {}'.format(query['count']))
+    _check_criteria(query.get('find') or {})
+
+def _check_criteria(criteria):
+    if not isinstance(criteria, dict):
+        raise ValueError('Query criteria must be fields: {}'.format(criteria))
+    for key, condition in criteria.items():
+        if key == '$or':
+            if not isinstance(condition, list):
+                raise ValueError('$or must be a list: {}'.format(condition))
+            for c in condition:
+                _check_criteria(c)
+        else:
+            _check_condition(condition)
+
+def _check_condition(condition):
+    if not isinstance(condition, dict):
+        return
+    for op, operand in condition.items():
+        if op == '$not':
+            _check_condition(operand)
+        elif op != '$exists' and op not in _COMPARISONS:
+            raise ValueError('Unsupported query operator: {}'.format(op))
+
+def _get_path(element, path):
+    value = element
+    for part in path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return MISSING
+        value = value[part]
+    return value
+
+def _is_true(operand):
+    return operand not in (False, 'false', '0', 0)
+
+def _comparable(value, operand, is_time):
+    """Coerce a stored value and a query string operand to comparable types."""
+    if is_time:
+        return to_millis(value), to_millis(operand)
+    if isinstance(value, (int, long, float)) and not isinstance(value, bool):
+        try:
+            return value, float(operand)
+        except (TypeError, ValueError):
+            pass
+    return value, operand
+
+_COMPARISONS = {
+    '$gt': lambda a, b: a > b,
+    '$gte': lambda a, b: a >= b,
+    '$lt': lambda a, b: a < b,
+    '$lte': lambda a, b: a <= b,
+    '$ne': lambda a, b: a != b,
+}
+
+def _field_matches(value, condition, is_time):
+    if not isinstance(condition, dict):
+        if value is MISSING:
+            return False
+        a, b = _comparable(value, condition, is_time)
+        return a == b
+
+    for op, operand in condition.items():
+        if op == '$exists':
+            if (value is not MISSING) != _is_true(operand):
+                return False
+        elif op == '$not':
+            if _field_matches(value, operand, is_time):
+                return False
+        elif op in _COMPARISONS:
+            if value is MISSING:
+                if op != '$ne':
+                    return False
+                continue
+            a, b = _comparable(value, operand, is_time)
+            if a is None or b is None or not _COMPARISONS[op](a, b):
+                return False
+        else:
+            raise ValueError('Unsupported query operator: {}'.format(op))
+    return True
+
+def matches(element, criteria, time_field=None):
+    for key, condition in criteria.items():
+        if key == '$or':
+            if not any(matches(element, c, time_field) for c in condition):
+                return False
+        elif not _field_matches(_get_path(element, key), condition, key == time_field):
+            return False
+    return True
+
+
+class IndexedCollection(object):
+    """Elements of one collection, indexed by time for range queries."""
+    def __init__(self, elements, time_field=None):
+        self.time_field = time_field
+        if time_field is None:
+            # No notion of time (e.g. profile): keep the stored order
+            self.times = None
+            self.elements = list(reversed(elements))
+        else:
+            # Sort oldest first. Among equal times, keep the original order when read newest first.
+            decorated = sorted(
+                ((to_millis(e.get(time_field)) or 0, -i, e) for i, e in enumerate(elements)),
+                key=lambda d: d[:2]
+            )
+            self.times = [d[0] for d in decorated]
+            self.elements = [d[2] for d in decorated]
+
+    def __len__(self):
+        return len(self.elements)
+
+    def _time_range(self, criteria):
+        """Index range satisfying any comparisons on the time field, and the remaining criteria."""
+        lo, hi = 0, len(self.elements)
+        condition = criteria.get(self.time_field) if self.time_field else None
+        if not isinstance(condition, dict):
+            return lo, hi, criteria
+
+        remaining = dict(condition)
+        for op, bound_fn in (
+            ('$gt', lambda t: bisect.bisect_right(self.times, t)),
+            ('$gte', lambda t: bisect.bisect_left(self.times, t)),
+        ):
+            if op in remaining and to_millis(remaining[op]) is not None:
+                lo = max(lo, bound_fn(to_millis(remaining.pop(op))))
+        for op, bound_fn in (
+            ('$lt', lambda t: bisect.bisect_left(self.times, t)),
+            ('$lte', lambda t: bisect.bisect_right(self.times, t)),
+        ):
+            if op in remaining and to_millis(remaining[op]) is not None:
+                hi = min(hi, bound_fn(to_millis(remaining.pop(op))))
+
+        criteria = dict(criteria)
+        if remaining:
+            criteria[self.time_field] = remaining
+        else:
+            del criteria[self.time_field]
+        return lo, hi, criteria
+
+    def find(self, query):
+        """Elements matching a parsed query, most recent first, limited by `count` if given."""
+        criteria = query.get('find') or {}
+        count = int(query['count']) if 'count' in query else None
+        lo, hi, criteria = self._time_range(criteria)
+        out = []
+        for i in xrange(hi - 1, lo - 1, -1):
+            if count is not None and len(out) >= count:
+                break
+            if not criteria or matches(self.elements[i], criteria, self.time_field):
+                out.append(self.elements[i])
+        return out
@@ -0,0 +1,354 @@
+"""
+Recordings of real Nightscout data, stored column by column so that the mock
+server can memory-map them instead of loading and parsing JSON.
+
+A recording is a directory with a subdirectory per collection, holding:
+
+    meta.json       row count, time field and a description of each column
+    time.npy        the time field in epoch milliseconds, sorted oldest first
+    <n>.npy         values of column n (codes into meta.json for strings with
+                    few distinct values, UTF-8 bytes for other strings and JSON)
+    <n>.offsets.npy where each row's bytes start and end, for byte columns
+    <n>.rows.npy    which rows have a value, for fields not in every element
+
+Nested objects are flattened into a column per leaf field. ISO 8601 strings and
+millisecond timestamps are stored as numbers, so a recording can be replayed
+shifted in time; ISO strings come back in UTC, e.g. 2016-10-18T19:00:00.000Z.
+
+Record from a Nightscout site, or from JSON or NDJSON files such as those
+written by synthetic_data.py:
+
+    python test/nightscout_recording.py https://my.nightscout.site --hours 48 --out /tmp/rec
+    python test/nightscout_recording.py --from-files /tmp/history --out /tmp/rec
+
+Then replay it, moved so that the most recent data is from the time the server
+started:
+
+    MOCK_SERVER_PORT=5555 python test/server.py --replay /tmp/rec --shift-to-now
+"""
+
+import argparse
+import calendar
+import json
+import os
+import re
+import time
+from datetime import datetime
+
+import numpy as np
+import requests
+
+from nightscout_query import IndexedCollection
+from nightscout_query import TIME_FIELDS
+from nightscout_query import to_millis
+
+COLLECTIONS = ['entries', 'treatments', 'devicestatus', 'profile']
+# Numeric fields which hold epoch milliseconds
+MILLIS_FIELDS = ['date', 'mills']
+ISO_DATE = re.compile(r'^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}')
+# The usual formats, which can be parsed much faster than with dateutil
+SIMPLE_ISO_DATE = re.compile(
+    r'^(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})(?:\.(\d{1,6}))?(?:(Z)|([+-])(\d{2}):?(\d{2}))$'
+)
+# Strings with at most this many distinct values (or a quarter of the rows) are stored as codes
+MAX_CODES = 256
+# Nightscout returns only 10 elements unless asked for more
+MAX_RECORD_COUNT = 1000000
+
+FORMAT_VERSION = 1
+
+
+########## Writing
+
+def _leaves(element, prefix=()):
+    """(path, value) for each leaf field of a JSON object. Empty objects are leaves."""
+    if isinstance(element, dict) and element:
+        for key, value in element.items():
+            for leaf in _leaves(value, prefix + (key,)):
+                yield leaf
+    else:
+        yield prefix, element
+
+def _iso_millis(value):
+    """Epoch milliseconds of an ISO 8601 string, or None."""
+    if not ISO_DATE.match(value):
+        return None
+    m = SIMPLE_ISO_DATE.match(value)
+    if m is None or not (m.group(8) or m.group(9)):
+        # Other formats, and local times
+        return to_millis(value)
+    year, month, day, hour, minute, second = [int(g) for g in m.groups()[:6]]
+    millis = calendar.timegm((year, month, day, hour, minute, second)) * 1000
+    if m.group(7):
+        millis += int(m.group(7).ljust(6, '0')) / 1000.0
+    if m.group(9):
+        offset = (int(m.group(10)) * 60 + int(m.group(11))) * 60 * 1000
+        millis += -offset if m.group(9) == '+' else offset
+    return millis
+
+def _time_millis(value):
+    return _iso_millis(value) if isinstance(value, basestring) else to_millis(value)
+
+def _is_number(value):
+    return isinstance(value, (int, long, float)) and not isinstance(value, bool)
+
+def _column_kind(path, values):
+    """The kind of a column, plus its values as epoch milliseconds if they're ISO strings."""
+    if all(isinstance(v, bool) for v in values):
+        return 'bool', None
+    if all(_is_number(v) for v in values):
+        if path[-1] in MILLIS_FIELDS:
+            return 'millis', None
+        return 'int' if all(isinstance(v, (int, long)) for v in values) else 'float', None
+    if all(isinstance(v, basestring) for v in values):
+        millis = []
+        for v in values:
+            millis.append(_iso_millis(v))
+            if millis[-1] is None:
+                break
+        else:
+            return 'iso', millis
+        if len(set(values)) <= max(MAX_CODES, len(values) // 4):
+            return 'codes', None
+        return 'text', None
+    return 'json', None
+
+def _bytes_column(strings):
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+    return np.array(bytearray(b''.join(encoded)), dtype=np.uint8), offsets
+
+def write_collection(dirname, elements, time_field):
+    """Write one collection's elements as columns."""
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+
+    if time_field is not None:
+        # Oldest first, like IndexedCollection; among equal times, keep the order when read newest first
+        decorated = sorted(
+            ((_time_millis(e.get(time_field)) or 0, -i, e) for i, e in enumerate(elements)),
+            key=lambda d: d[:2]
+        )
+        elements = [e for _, _, e in decorated]
+        times = [t for t, _, _ in decorated]
+        np.save(os.path.join(dirname, 'time.npy'), np.array(times, dtype=np.int64))
+    else:
+        # Stored the same way as IndexedCollection, which reads them from the end
+        elements = list(reversed(elements))
+
+    fields = {}
+    for row, element in enumerate(elements):
+        for path, value in _leaves(element):
+            rows, values = fields.setdefault(path, ([], []))
+            rows.append(row)
+            values.append(value)
+
+    columns = []
+    for n, (path, (rows, values)) in enumerate(sorted(fields.items())):
+        kind, millis = _column_kind(path, values)
+        column = {'path': list(path), 'kind': kind}
+        base = os.path.join(dirname, str(n))
+        if kind == 'bool':
+            np.save(base + '.npy', np.array(values, dtype=np.uint8))
+        elif kind in ('int', 'millis'):
+            np.save(base + '.npy', np.array(values, dtype=np.int64))
+        elif kind == 'float':
+            np.save(base + '.npy', np.array(values, dtype=np.float64))
+        elif kind == 'iso':
+            np.save(base + '.npy', np.array(millis, dtype=np.int64))
+        elif kind == 'codes':
+            column['values'] = sorted(set(values))
+            codes = dict((v, i) for i, v in enumerate(column['values']))
+            np.save(base + '.npy', np.array([codes[v] for v in values], dtype=np.int32))
+        else:
+            data, offsets = _bytes_column(values if kind == 'text' else [json.dumps(v) for v in values])
+            np.save(base + '.npy', data)
+            np.save(base + '.offsets.npy', offsets)
+        if len(rows) < len(elements):
+            np.save(base + '.rows.npy', np.array(rows, dtype=np.int32))
+        columns.append(column)
+
+    with open(os.path.join(dirname, 'meta.json'), 'w') as f:
+        json.dump({
+            'version': FORMAT_VERSION,
+            'count': len(elements),
+            'time_field': time_field,
+            'columns': columns,
+        }, f)
+
+def write(data, dirname):
+    """Write a dict of collection name to elements as a recording."""
+    for coll, elements in data.items():
+        write_collection(os.path.join(dirname, coll), elements, TIME_FIELDS.get(coll))
+
+
+########## Reading
+
+def _iso(millis):
+    return datetime.utcfromtimestamp(millis / 1000.0).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+def _load(filename):
+    if not os.path.exists(filename):
+        return None
+    try:
+        return np.load(filename, mmap_mode='r')
+    except ValueError:
+        # Empty arrays can't be memory-mapped
+        return np.load(filename)
+
+class _Column(object):
+    def __init__(self, dirname, n, column, shift_ms):
+        base = os.path.join(dirname, str(n))
+        self.path = column['path']
+        self.kind = column['kind']
+        self.codes = column.get('values')
+        self.shift_ms = shift_ms
+        self.values = _load(base + '.npy')
+        self.offsets = _load(base + '.offsets.npy')
+        self.rows = _load(base + '.rows.npy')
+
+    def get(self, row):
+        """A 1-tuple of the value for a row, or None if the row has no value (as opposed to a null one)."""
+        if self.rows is not None:
+            i = int(np.searchsorted(self.rows, row))
+            if i == len(self.rows) or self.rows[i] != row:
+                return None
+        else:
+            i = row
+        return (self._decode(i),)
+
+    def _decode(self, i):
+        if self.kind == 'bool':
+            return bool(self.values[i])
+        elif self.kind == 'int':
+            return int(self.values[i])
+        elif self.kind == 'float':
+            return float(self.values[i])
+        elif self.kind == 'millis':
+            return int(self.values[i]) + self.shift_ms
+        elif self.kind == 'iso':
+            return _iso(int(self.values[i]) + self.shift_ms)
+        elif self.kind == 'codes':
+            return self.codes[self.values[i]]
+        text = self.values[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8')
+        return text if self.kind == 'text' else json.loads(text)
+
+class _Rows(object):
+    """Elements of a recorded collection, built from its columns when indexed."""
+    def __init__(self, count, columns):
+        self.count = count
+        self.columns = columns
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, row):
+        element = {}
+        for column in self.columns:
+            found = column.get(row)
+            if found is None:
+                continue
+            node = element
+            for part in column.path[:-1]:
+                node = node.setdefault(part, {})
+            if column.path:
+                node[column.path[-1]] = found[0]
+        return element
+
+class _ShiftedTimes(object):
+    def __init__(self, times, shift_ms):
+        self.times = times
+        self.shift_ms = shift_ms
+
+    def __len__(self):
+        return len(self.times)
+
+    def __getitem__(self, i):
+        return float(self.times[i] + self.shift_ms)
+
+
+class RecordedCollection(IndexedCollection):
+    """A memory-mapped recorded collection, queried like an IndexedCollection."""
+    def __init__(self, dirname, shift_ms=0):
+        with open(os.path.join(dirname, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta['version'] != FORMAT_VERSION:
+            raise Exception('Unsupported recording format version {} in {}'.format(meta['version'], dirname))
+        self.time_field = meta['time_field']
+        columns = [_Column(dirname, n, column, shift_ms) for n, column in enumerate(meta['columns'])]
+        self.elements = _Rows(meta['count'], columns)
+        if self.time_field is None:
+            self.times = None
+        else:
+            self.times = _ShiftedTimes(_load(os.path.join(dirname, 'time.npy')), shift_ms)
+
+    def latest_time(self):
+        return self.times[len(self.times) - 1] if self.times is not None and len(self.times) else None
+
+def load(dirname, shift_to_now=False):
+    """A dict of collection name to RecordedCollection.
+
+    With `shift_to_now`, times are moved so that the most recent element of any
+    collection is from now.
+    """
+    colls = [c for c in COLLECTIONS if os.path.exists(os.path.join(dirname, c, 'meta.json'))]
+    shift_ms = 0
+    if shift_to_now:
+        latest = [t for t in (RecordedCollection(os.path.join(dirname, c)).latest_time() for c in colls) if t is not None]
+        if latest:
+            shift_ms = int(time.time() * 1000 - max(latest))
+    return dict((c, RecordedCollection(os.path.join(dirname, c), shift_ms)) for c in colls)
+
+
+########## Recording
+
+def fetch(host, hours):
+    """Each collection's elements from a Nightscout site, going back `hours`."""
+    since_ms = int((time.time() - hours * 60 * 60) * 1000)
+    since_iso = _iso(since_ms)
+    queries = {
+        'entries': {'find[date][$gte]': since_ms},
+        'treatments': {'find[created_at][$gte]': since_iso},
+        'devicestatus': {'find[created_at][$gte]': since_iso},
+        'profile': {},
+    }
+    out = {}
+    for coll, query in queries.items():
+        params = dict(query, count=MAX_RECORD_COUNT) if coll != 'profile' else query
+        response = requests.get('{}/api/v1/{}.json'.format(host.rstrip('/'), coll), params=params)
+        response.raise_for_status()
+        out[coll] = response.json()
+    return out
+
+def read_files(dirname):
+    """Each collection's elements from <collection>.json or <collection>.ndjson files."""
+    out = {}
+    for coll in COLLECTIONS:
+        for ext in ('.json', '.ndjson'):
+            filename = os.path.join(dirname, coll + ext)
+            if os.path.exists(filename):
+                with open(filename) as f:
+                    if ext == '.json':
+                        out[coll] = json.load(f)
+                    else:
+                        out[coll] = [json.loads(line) for line in f if line.strip()]
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('host', nargs='?', help='Nightscout site to record from')
+    parser.add_argument('--hours', type=float, default=24)
+    parser.add_argument('--from-files', metavar='DIR', help='record <collection>.json or .ndjson files instead')
+    parser.add_argument('--out', required=True, help='directory to write the recording to')
+    args = parser.parse_args()
+    if bool(args.host) == bool(args.from_files):
+        parser.error('give either a Nightscout host or --from-files')
+
+    data = read_files(args.from_files) if args.from_files else fetch(args.host, args.hours)
+    write(data, args.out)
+    print 'Recorded {}'.format(', '.join('{} {}'.format(len(data[coll]), coll) for coll in COLLECTIONS if coll in data))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""
+In-memory storage for the mock Nightscout server's collections.
+"""
+
+import threading
+
+from nightscout_query import IndexedCollection
+from nightscout_query import TIME_FIELDS
+
+COLLECTIONS = ['entries', 'treatments', 'profile', 'devicestatus']
+
+
+class CollectionStore(object):
+    """Thread-safe map of collection name to an IndexedCollection of its elements.
+
+    Collections returned by `get` are never mutated by the store (`set` replaces
+    them), so callers may query them without holding a lock.
+    """
+    def __init__(self, collections=COLLECTIONS):
+        self._lock = threading.Lock()
+        self._elements = dict((coll, IndexedCollection([], TIME_FIELDS.get(coll))) for coll in collections)
+
+    def __contains__(self, coll):
+        return coll in self._elements
+
+    def get(self, coll):
+        with self._lock:
+            return self._elements.get(coll)
+
+    def set(self, coll, elements):
+        if coll not in self._elements:
+            raise KeyError(coll)
+        # Index outside the lock, since sorting a large collection takes a while
+        self.set_collection(coll, IndexedCollection(elements, TIME_FIELDS.get(coll)))
+
+    def set_collection(self, coll, collection):
+        """Replace a collection with one that's already indexed, e.g. a RecordedCollection."""
+        if coll not in self._elements:
+            raise KeyError(coll)
+        with self._lock:
+            self._elements[coll] = collection
@@ -0,0 +1,145 @@
+"""
+The `pebble` commands the screenshot harness runs on its emulators -- kill,
+wipe and install -- done in this process, over the connections it already has
+(see emulator_connection.py), rather than each paying for a new Python
+interpreter and the pebble-tool imports.
+
+With PEBBLE_BACKEND=cli, or if an in-process operation can't reach the
+emulator, the `pebble` command is run instead. Building still goes through
+`pebble build`.
+"""
+
+import errno
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import time
+
+from libpebble2.exceptions import PebbleError
+from websocket import WebSocketException
+
+BACKEND = os.environ.get('PEBBLE_BACKEND', 'inprocess')
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Processes pebble-tool starts for each emulator, as named in its emulator info file
+EMULATOR_PROCESSES = ('qemu', 'pypkjs', 'websockify')
+KILL_TIMEOUT_SECONDS = 5
+# Failures to talk to an emulator, which the `pebble` command may get past; anything else is a bug
+FALLBACK_ERRORS = (ImportError, PebbleError, WebSocketException, socket.error)
+
+
+def _run_cli(command_str, **kwargs):
+    print command_str
+    return subprocess.Popen(
+        command_str.split(' '),
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        **kwargs
+    ).communicate()
+
+def _in_process(fn, command_str, **cli_kwargs):
+    """Call fn, or run the `pebble` command (with `cli_kwargs` for Popen) if the backend is the CLI or fn can't reach the emulator."""
+    if BACKEND == 'cli':
+        _run_cli(command_str, **cli_kwargs)
+        return
+    print '{} (in-process)'.format(command_str)
+    try:
+        fn()
+    except FALLBACK_ERRORS as e:
+        print 'In-process `{}` failed, running it instead: {}'.format(command_str, e)
+        _run_cli(command_str, **cli_kwargs)
+
+def _signal(pid, sig):
+    try:
+        os.kill(pid, sig)
+    except OSError as e:
+        if e.errno != errno.ESRCH:
+            raise
+        return False
+    return True
+
+def _is_alive(pid):
+    # Emulators booted by connecting from this process are its children, and linger as zombies until reaped
+    try:
+        if os.waitpid(pid, os.WNOHANG)[0] == pid:
+            return False
+    except OSError as e:
+        if e.errno != errno.ECHILD:
+            raise
+    return _signal(pid, 0)
+
+def _kill(worker):
+    pids = [
+        emu[proc]['pid']
+        for versions in worker.emulator_info().values()
+        for emu in versions.values()
+        for proc in EMULATOR_PROCESSES if proc in emu
+    ]
+    pids = [pid for pid in pids if _signal(pid, signal.SIGTERM)]
+    deadline = time.time() + KILL_TIMEOUT_SECONDS
+    while pids and time.time() < deadline:
+        time.sleep(0.05)
+        pids = [pid for pid in pids if _is_alive(pid)]
+    for pid in pids:
+        _signal(pid, signal.SIGKILL)
+
+def kill(worker):
+    """Stop the worker's emulators, like `pebble kill`."""
+    _in_process(lambda: _kill(worker), 'pebble kill')
+
+def _sdk_version(worker):
+    """The version of the SDK which `pebble` runs the worker's emulators with, or None if none is installed."""
+    manifest = os.path.join(worker.home_dir, '.pebble-sdk', 'SDKs', 'current', 'sdk-core', 'manifest.json')
+    try:
+        with open(manifest) as f:
+            return json.load(f)['version']
+    except (IOError, ValueError, KeyError):
+        return None
+
+def _storage_dir(worker):
+    """The directory under the worker's ~/.pebble-sdk which holds the current SDK's emulator storage, or None."""
+    # Emulator flash and pypkjs storage live in per-SDK-version directories.
+    # Like `pebble wipe`, only touch the current version's: worker 0's HOME is
+    # the real one, and other versions' storage isn't the harness's to lose.
+    version = _sdk_version(worker)
+    return os.path.join(worker.home_dir, '.pebble-sdk', version) if version else None
+
+def _wipe(worker):
+    dirname = _storage_dir(worker)
+    if dirname and os.path.isdir(dirname):
+        shutil.rmtree(dirname)
+
+def wipe(worker):
+    """Erase the worker's emulator storage for the current SDK, like `pebble wipe`. Kill the emulators first."""
+    _in_process(lambda: _wipe(worker), 'pebble wipe')
+
+def save_storage(worker, dirname):
+    """Copy the worker's emulator storage to `dirname`. Kill the emulators first, so it's consistent."""
+    storage_dir = _storage_dir(worker)
+    tmp_dirname = dirname + '.tmp'
+    if os.path.isdir(tmp_dirname):
+        shutil.rmtree(tmp_dirname)
+    if storage_dir and os.path.isdir(storage_dir):
+        shutil.copytree(storage_dir, tmp_dirname)
+    else:
+        os.makedirs(tmp_dirname)
+    if os.path.isdir(dirname):
+        shutil.rmtree(dirname)
+    os.rename(tmp_dirname, dirname)
+
+def restore_storage(worker, dirname):
+    """Replace the worker's emulator storage with a copy saved by `save_storage`. Kill the emulators first."""
+    _wipe(worker)
+    storage_dir = _storage_dir(worker)
+    if storage_dir:
+        shutil.copytree(dirname, storage_dir)
+
+def install(connection, pbw_filename):
+    """Install and launch the app on an emulator, like `pebble install --emulator <platform>`."""
+    _in_process(
+        lambda: connection.install(pbw_filename),
+        'pebble install {} --emulator {}'.format(os.path.abspath(pbw_filename), connection.platform),
+        cwd=PROJECT_DIR,
+    )
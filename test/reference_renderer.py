@@ -0,0 +1,600 @@
+"""
+Pure-Python model of how the watchface lays out its elements and draws its
+graph, so layout and point-style cases can be checked against the gold images
+in milliseconds, without booting an emulator.
+
+This follows layout.c, graph_element.c, status_bar_element.c and
+sidebar_element.c, and the parts of the JS (app.js, format.js, data.js) which
+turn Nightscout data and config into the data and preferences messages. Text,
+icons and the recency circle are drawn with Pebble's fonts and resources, which
+aren't modelled, and nor are the time area and BG row elements: `render` also
+returns a mask of the pixels it does model, and only those are compared. Modelled pixels
+must match the gold image exactly, after the colour correction which
+`pebble screenshot` applies on color platforms.
+
+To see how much of each screenshot test's frame is modelled, and how many of
+those pixels differ from its gold image, least modelled first:
+
+    python test/reference_renderer.py
+"""
+
+import math
+import time
+from datetime import datetime
+
+import numpy as np
+
+from gold_store import GoldStore
+from nightscout_query import IndexedCollection
+from nightscout_query import TIME_FIELDS
+from nightscout_query import parse_query
+from nightscout_query import to_millis
+from screenshot_diff import correct_colors
+from screenshot_scenarios import BASE_CONFIG
+from screenshot_scenarios import CONSTANTS
+from screenshot_scenarios import scenarios
+from virtual_clock import CLOCK
+
+PLATFORMS = ('aplite', 'basalt')
+SCREEN_SIZE = (144, 168)
+
+BLACK = (0, 0, 0)
+WHITE = (255, 255, 255)
+LIGHT_GRAY = (170, 170, 170)
+
+BOLUS_TICK_HEIGHT = 7
+GRAPH_STALENESS_GRACE_PERIOD_SECONDS = 3 * 60
+MAX_BOLUSES_PER_HOUR_TO_CACHE = 6
+
+# From recency_component.c: diameter of each recency style
+RECENCY_DIAMETERS = [11, 23, 23, 15, 29, 29, 19]
+# From connection_status_component.c
+CONN_STATUS_ICON_WIDTH = 25
+# Widest recency text without a circle, e.g. "59m"
+RECENCY_MAX_TEXT_WIDTH = 40
+# From fonts.c: (height, padding_top, padding_bottom)
+FONT_18_BOLD = (11, 7, 3)
+FONT_24_BOLD = (14, 10, 4)
+# From status_bar_element.c
+SM_TEXT_MARGIN = 2
+# From battery_component.c
+BATTERY_ICON_WIDTH = 24
+BATTERY_ICON_HEIGHT = 22
+BATTERY_ICON_PADDING = 4
+BATTERY_ICON_TOP_FUDGE = 1
+BATTERY_TEXT_WIDTH = 50
+# From trend_arrow_component.c
+TREND_ARROW_WIDTH = 25
+
+
+def _layout(config, constants):
+    return config['customLayout'] if config['layout'] == 'custom' else constants['LAYOUTS'][config['layout']]
+
+def color_from_hex(hex_string):
+    """The RGB of the Pebble color nearest a config color like 0x55FFAA, as in app.js."""
+    return tuple(int(hex_string[-6:][i:i + 2], 16) // 85 * 85 for i in (0, 2, 4))
+
+def preferences(config, constants):
+    """The preferences the JS would send to the watch for a config, as a dict."""
+    layout = _layout(config, constants)
+    return {
+        'top_of_graph': config['topOfGraph'],
+        'top_of_range': config['topOfRange'],
+        'bottom_of_range': config['bottomOfRange'],
+        'bottom_of_graph': config['bottomOfGraph'],
+        'h_gridlines': config['hGridlines'],
+        'basal_graph': bool(config['basalGraph']),
+        'basal_height': config['basalHeight'],
+        'conn_status_loc': constants['CONN_STATUS_LOC'][layout['connStatusLoc']],
+        'recency_loc': constants['RECENCY_LOC'][layout['recencyLoc']],
+        'recency_style': constants['RECENCY_STYLE'][layout['recencyStyle']],
+        'battery_loc': constants['BATTERY_LOC'][layout['batteryLoc']],
+        'battery_as_number': bool(config['batteryAsNumber']),
+        'point_shape': config['pointShape'],
+        'point_rect_height': config['pointRectHeight'],
+        'point_width': config['pointWidth'],
+        'point_margin': config['pointMargin'],
+        'point_right_margin': config['pointRightMargin'],
+        'plot_line': bool(config['plotLine']),
+        'plot_line_width': config['plotLineWidth'],
+        'plot_line_is_custom_color': bool(config['plotLineIsCustomColor']),
+        'elements': [
+            dict((prop, e[prop]) for prop in constants['PROPERTIES'])
+            for e in layout['elements'] if e['enabled']
+        ],
+        'colors': dict(
+            (key, color_from_hex(layout[key] if key in constants['LAYOUT_COLOR_KEYS'] else config[key]))
+            for key in constants['COLOR_KEYS']
+        ),
+    }
+
+
+########## Data (app.js, format.js, data.js)
+
+def max_sgvs(config, constants):
+    """Number of points which fit in the graph, as computed by points.js."""
+    graph = [e for e in _layout(config, constants)['elements'] if constants['ELEMENTS'][e['el']] == 'GRAPH_ELEMENT']
+    if not graph:
+        return 0
+    # JS Math.round rounds halves up
+    width = int(math.floor(constants['SCREEN_WIDTH'] * graph[0]['width'] / 100.0 + 0.5))
+    available = width - config['pointRightMargin']
+    points = (available + max(0, config['pointMargin'])) // (config['pointWidth'] + config['pointMargin'])
+    return max(0, points)
+
+def _query(elements, coll, query):
+    return IndexedCollection(elements, TIME_FIELDS.get(coll)).find(parse_query(query))
+
+def _graph_intervals(end_time, count, interval_ms):
+    return [(end_time - interval_ms * i - interval_ms / 2.0, end_time - interval_ms * i + interval_ms / 2.0) for i in range(count)]
+
+def sgv_array(end_time, sgvs, count, constants):
+    interval_ms = constants['INTERVAL_SIZE_SECONDS'] * 1000
+    xs = end_time - interval_ms * np.arange(count)
+    graphed_dates = np.full(count, np.inf)
+    ys = [0] * count
+    for sgv in sgvs:
+        # Don't graph missing sgvs or error codes
+        if sgv.get('sgv') is None or sgv['sgv'] <= constants['DEXCOM_ERROR_CODE_MAX'] or count == 0:
+            continue
+        distances = np.abs(sgv['date'] - xs)
+        xi = int(np.argmin(distances))
+        if distances[xi] < interval_ms and distances[xi] < abs(graphed_dates[xi] - xs[xi]):
+            graphed_dates[xi] = sgv['date']
+            ys[xi] = sgv['sgv']
+    return ys
+
+def bolus_graph_array(end_time, boluses, count, constants):
+    times = [to_millis(b['created_at']) for b in boluses]
+    return [
+        1 if any(start < t < end for t in times) else 0
+        for start, end in _graph_intervals(end_time, count, constants['INTERVAL_SIZE_SECONDS'] * 1000)
+    ]
+
+def _hhmm(mills):
+    return datetime.fromtimestamp(mills / 1000.0).strftime('%H:%M')
+
+def _hhmm_after(hhmm, mills):
+    date = datetime.fromtimestamp(mills / 1000.0)
+    same_date = date.replace(hour=int(hhmm[:2]), minute=int(hhmm[3:5]), second=0, microsecond=0)
+    same_date_ms = time.mktime(same_date.timetuple()) * 1000
+    return same_date_ms if same_date_ms > mills else same_date_ms + 24 * 60 * 60 * 1000
+
+def _profile_basals_in_window(basals, start, end):
+    if not basals:
+        return []
+    i = 0
+    start_hhmm = _hhmm(start)
+    while i < len(basals) - 1 and basals[i + 1]['time'] <= start_hhmm:
+        i += 1
+    out = [{'start': start, 'absolute': float(basals[i]['value'])}]
+    while True:
+        i = (i + 1) % len(basals)
+        next_basal = {'start': _hhmm_after(basals[i]['time'], out[-1]['start']), 'absolute': float(basals[i]['value'])}
+        if next_basal['start'] >= end:
+            return out
+        out.append(next_basal)
+
+def basal_history(temp_basals, profile, now_ms):
+    if profile and profile[0].get('basal'):
+        profile_basals = profile[0]['basal']
+    elif profile and profile[0].get('defaultProfile'):
+        profile_basals = profile[0]['store'][profile[0]['defaultProfile']]['basal']
+    else:
+        profile_basals = []
+
+    temps = [
+        {
+            'start': to_millis(t['created_at']),
+            'duration': int(t['duration']) * 60 * 1000 if 'duration' in t else 0,
+            'absolute': float(t['absolute']) if 'absolute' in t else 0,
+        }
+        for t in temp_basals
+    ] + [
+        {'start': now_ms - 24 * 60 * 60 * 1000, 'duration': 0},
+        {'start': now_ms, 'duration': 0},
+    ]
+    out = []
+    for temp in sorted(temps, key=lambda t: t['start']):
+        if out and out[-1]['start'] + out[-1]['duration'] < temp['start']:
+            out.extend(_profile_basals_in_window(profile_basals, out[-1]['start'] + out[-1]['duration'], temp['start']))
+        out.append(temp)
+    return out
+
+def basal_rate_array(end_time, history, count, constants):
+    out = []
+    for interval_start, interval_end in _graph_intervals(end_time, count, constants['INTERVAL_SIZE_SECONDS'] * 1000):
+        rate_totals = {}
+        order = []
+        for basal, next_basal in zip(history, history[1:]):
+            if next_basal['start'] <= interval_start or basal['start'] > interval_end:
+                continue
+            duration = min(next_basal['start'], interval_end) - max(basal['start'], interval_start)
+            # Like the JS, rates without an absolute value are keyed as "undefined"
+            rate = basal.get('absolute')
+            if rate not in rate_totals:
+                order.append(rate)
+                rate_totals[rate] = 0
+            rate_totals[rate] += duration
+        if not order:
+            out.append(0)
+        else:
+            best = order[0]
+            for rate in order[1:]:
+                if rate_totals[rate] > rate_totals[best]:
+                    best = rate
+            out.append(best if best is not None else float('nan'))
+    return out
+
+def _rescale(values, pixel_height):
+    top = max(values) if values else 0
+    return [int(math.floor(v / float(top) * pixel_height + 0.5)) if top > 0 else 0 for v in values]
+
+def data_message(config, constants, sgvs, treatments=(), profile=(), now=None):
+    """The graph-related parts of the data message the JS would send, given Nightscout data.
+
+    Includes `padding`, the number of intervals the watch would shift the graph
+    by if it received this data now, per staleness.c.
+    """
+    now_ms = (CLOCK.now() if now is None else now) * 1000
+    count = max_sgvs(config, constants)
+    interval_ms = constants['INTERVAL_SIZE_SECONDS'] * 1000
+
+    sgvs = [s for s in _query(sgvs, 'entries', {'count': '1000'}) if s['date'] > now_ms - (count + 1) * interval_ms]
+    end_time = sgvs[0]['date'] if sgvs else now_ms
+    ys = sgv_array(end_time, sgvs, count, constants)
+
+    if config['bolusTicks']:
+        boluses = _query(treatments, 'treatments', {
+            'find[insulin][$exists]': 'true',
+            'count': str(int(math.ceil(count / 12.0 * MAX_BOLUSES_PER_HOUR_TO_CACHE))),
+        })
+    else:
+        boluses = []
+    if config['basalGraph']:
+        temps = _query(treatments, 'treatments', {'find[eventType]': 'Temp Basal', 'count': str(count)})
+        basals = _rescale(basal_rate_array(end_time, basal_history(temps, profile, now_ms), count, constants), config['basalHeight'])
+    else:
+        basals = [0] * count
+
+    recency = int((now_ms - sgvs[0]['date']) // 1000) if sgvs else 999 * 60 * 60
+    padding = recency // constants['INTERVAL_SIZE_SECONDS']
+    if padding == 1 and recency < constants['INTERVAL_SIZE_SECONDS'] + GRAPH_STALENESS_GRACE_PERIOD_SECONDS:
+        padding = 0
+
+    return {
+        'sgvs': [min(y, constants['PACKED_MAX_SGV']) for y in ys],
+        'boluses': bolus_graph_array(end_time, boluses, count, constants),
+        'basals': [min(b, 2 ** constants['GRAPH_EXTRA_BASAL_BITS'] - 1) for b in basals],
+        'recency': recency,
+        'padding': padding,
+    }
+
+
+########## Drawing (layout.c, graph_element.c)
+
+class Canvas(object):
+    """RGB pixels, plus a mask of which pixels are modelled."""
+    def __init__(self, size, platform):
+        self.platform = platform
+        self.pixels = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+        self.pixels[:] = WHITE
+        self.modelled = np.ones((size[1], size[0]), dtype=bool)
+
+    def color(self, color, fallback):
+        """COLOR_FALLBACK: the color on basalt, the fallback on aplite."""
+        return fallback if self.platform == 'aplite' else color
+
+    def fill_rect(self, clip, x, y, w, h, color):
+        """Fill a rect given relative to `clip`, the (x, y, w, h) bounds of the layer being drawn."""
+        cx, cy, cw, ch = clip
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(cw, x + w), min(ch, y + h)
+        if x1 <= x0 or y1 <= y0:
+            return
+        if color == LIGHT_GRAY and self.platform == 'aplite':
+            # Gray is dithered on black and white displays
+            ys, xs = np.mgrid[cy + y0:cy + y1, cx + x0:cx + x1]
+            self.pixels[cy + y0:cy + y1, cx + x0:cx + x1] = np.where(((xs + ys) % 2 == 1)[..., None], BLACK, WHITE)
+        else:
+            self.pixels[cy + y0:cy + y1, cx + x0:cx + x1] = color
+
+    def draw_line(self, clip, p0, p1, color):
+        """A 1px line. Only horizontal and vertical lines are drawn exactly."""
+        (x0, y0), (x1, y1) = p0, p1
+        if y0 == y1:
+            self.fill_rect(clip, min(x0, x1), y0, abs(x1 - x0) + 1, 1, color)
+        elif x0 == x1:
+            self.fill_rect(clip, x0, min(y0, y1), 1, abs(y1 - y0) + 1, color)
+        else:
+            self.unmodelled(clip, min(x0, x1), min(y0, y1), abs(x1 - x0) + 1, abs(y1 - y0) + 1)
+
+    def unmodelled(self, clip, x, y, w, h):
+        cx, cy, cw, ch = clip
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(cw, x + w), min(ch, y + h)
+        if x1 > x0 and y1 > y0:
+            self.modelled[cy + y0:cy + y1, cx + x0:cx + x1] = False
+
+
+def _round_percent(total, percent):
+    # layout.c: division without floats, rounding halves up
+    out = total * percent // 100
+    if total * percent // 10 - 10 * out >= 5:
+        out += 1
+    return out
+
+def element_frames(prefs, size=SCREEN_SIZE):
+    """(element, (x, y, w, h)) for each element, as positioned by layout.c."""
+    elements = prefs['elements']
+    sizes = [[_round_percent(size[0], e['width']), _round_percent(size[1], e['height'])] for e in elements]
+
+    def position(pos, e, w, h):
+        width = (size[0] - pos[0] if w == 0 else w) + e['right']
+        height = h + e['bottom']
+        frame = (pos[0], pos[1], width, height)
+        pos[0] += width
+        if pos[0] >= size[0]:
+            pos[0] = 0
+            pos[1] += height
+        return frame
+
+    pos = [0, 0]
+    auto_rows = 0
+    for e, (w, h) in zip(elements, sizes):
+        auto_rows += pos[0] == 0 and e['height'] == 0
+        position(pos, e, w, h)
+    if auto_rows:
+        auto_height = ((size[1] - pos[1]) & 0xff) // auto_rows
+        for s in sizes:
+            if s[1] == 0:
+                s[1] = auto_height
+
+    pos = [0, 0]
+    return [(e, position(pos, e, w, h)) for e, (w, h) in zip(elements, sizes)]
+
+def _element_bounds(e, frame):
+    """element_get_bounds: the frame, less its borders."""
+    x, y, w, h = frame
+    return (x, y, w - e['right'], h - e['bottom'])
+
+def _bg_to_y(height, bg, prefs):
+    graph_min, graph_max = prefs['bottom_of_graph'], prefs['top_of_graph']
+    # Single precision, truncated toward zero, as in C
+    y = np.float32(height) - np.float32(bg - graph_min) / np.float32(graph_max - graph_min) * np.float32(height) + np.float32(0.5)
+    return int(y)
+
+def _index_to_x(i, graph_width, padding, prefs):
+    return graph_width - (prefs['point_width'] + prefs['point_margin']) * (1 + i + padding) + prefs['point_margin'] - prefs['point_right_margin']
+
+def _point_diameter(prefs):
+    return prefs['point_width'] if prefs['point_shape'] == 'circle' else prefs['point_rect_height']
+
+def _bg_to_y_for_point(height, bg, prefs):
+    diameter = _point_diameter(prefs)
+    y = _bg_to_y(height, bg, prefs) - diameter // 2
+    return max(0, min((height - diameter) & 0xff, y))
+
+def _color_for_bg(bg, prefs):
+    if bg > prefs['top_of_range']:
+        return prefs['colors']['pointColorHigh']
+    elif bg < prefs['bottom_of_range']:
+        return prefs['colors']['pointColorLow']
+    else:
+        return prefs['colors']['pointColorDefault']
+
+def _draw_graph(canvas, clip, fg, prefs, data):
+    _, _, graph_width, layer_height = clip
+    graph_height = (layer_height - prefs['basal_height'] if prefs['basal_graph'] else layer_height) & 0xff
+    padding = data['padding']
+
+    # Target range bounds
+    canvas.fill_rect(clip, 0, _bg_to_y(graph_height, prefs['top_of_range'], prefs) - 1, graph_width, 4, LIGHT_GRAY)
+    canvas.fill_rect(clip, 0, _bg_to_y(graph_height, prefs['bottom_of_range'], prefs) - 2, graph_width, 4, LIGHT_GRAY)
+
+    # Horizontal gridlines
+    if prefs['h_gridlines'] > 0:
+        for g in range(0, prefs['top_of_graph'], prefs['h_gridlines']):
+            if g <= prefs['bottom_of_graph'] or g == prefs['top_of_range'] or g == prefs['bottom_of_range']:
+                continue
+            y = _bg_to_y(graph_height, g, prefs)
+            for x in range(2, graph_width, 8):
+                canvas.draw_line(clip, (x, y), (x + 1, y), fg)
+
+    # Points, and the line between them
+    to_plot = []
+    for i, bg in enumerate(data['sgvs']):
+        if bg == 0:
+            continue
+        x = _index_to_x(i, graph_width, padding, prefs)
+        # stop plotting if the SGV is off-screen
+        if x < 0:
+            break
+        to_plot.append((x, _bg_to_y_for_point(graph_height, bg, prefs), bg))
+
+    width, diameter = prefs['point_width'], _point_diameter(prefs)
+    if prefs['plot_line']:
+        # Antialiased lines aren't modelled, so leave out the box around each segment
+        margin = prefs['plot_line_width']
+        for (x0, y0, _), (x1, y1, _) in zip(to_plot, to_plot[1:]):
+            canvas.unmodelled(clip, min(x0, x1) - margin, min(y0, y1) - margin, abs(x1 - x0) + width + 2 * margin, abs(y1 - y0) + diameter + 2 * margin)
+
+    for x, y, bg in to_plot:
+        color = canvas.color(_color_for_bg(bg, prefs), fg)
+        if prefs['point_shape'] == 'rectangle':
+            canvas.fill_rect(clip, x, y, width, diameter, color)
+        else:
+            _fill_circle(canvas, clip, x, y, width, color)
+
+    # Boluses
+    tick_width = 3 if width >= 5 and width % 2 == 1 else 2
+    for i, bolus in enumerate(data['boluses']):
+        if bolus:
+            x = _index_to_x(i, graph_width, padding, prefs)
+            canvas.fill_rect(clip, x + width // 2 - tick_width // 2, graph_height - BOLUS_TICK_HEIGHT, tick_width, BOLUS_TICK_HEIGHT, fg)
+
+    # Basals
+    if prefs['basal_graph']:
+        canvas.draw_line(clip, (0, graph_height), (graph_width, graph_height), fg)
+        count = len(data['basals'])
+        for i, basal in enumerate(data['basals']):
+            x = _index_to_x(i, graph_width, padding, prefs)
+            y = layer_height - basal
+            w = (prefs['point_width'] + prefs['point_margin']) & 0xff
+            if i == count - 1 and x >= 0:
+                # if this is the last point to draw, extend its basal data to the left edge
+                w += x
+                x = 0
+            canvas.draw_line(clip, (x, y), (x + w - 1, y), fg)
+            if basal > 1:
+                canvas.fill_rect(clip, x, y + 1, w, basal - 1, LIGHT_GRAY)
+        if padding > 0:
+            x = _index_to_x(padding - 1, graph_width, 0, prefs)
+            canvas.fill_rect(clip, x, graph_height, graph_width - x, prefs['basal_height'], fg)
+
+def _fill_circle(canvas, clip, x, y, diameter, color):
+    # Pebble's circle rasterization isn't modelled, only the pixels which are certainly inside or outside
+    radius = diameter // 2
+    cx, cy = x + radius, y + radius
+    canvas.unmodelled(clip, cx - radius - 1, cy - radius - 1, 2 * radius + 3, 2 * radius + 3)
+    inner = int(radius / math.sqrt(2)) - 1
+    if inner >= 0:
+        canvas.fill_rect(clip, cx - inner, cy - inner, 2 * inner + 1, 2 * inner + 1, color)
+        canvas.modelled[clip[1] + max(0, cy - inner):clip[1] + max(0, cy + inner + 1),
+                        clip[0] + max(0, cx - inner):clip[0] + max(0, cx + inner + 1)] = True
+
+def _mask_graph_overlays(canvas, clip, prefs):
+    """Leave out the recency and connection status components drawn over the graph."""
+    sgv_height = clip[3] - prefs['basal_height'] if prefs['basal_graph'] else clip[3]
+    diameter = RECENCY_DIAMETERS[prefs['recency_style']]
+    recency_width = diameter + 2 if diameter in (23, 29) else RECENCY_MAX_TEXT_WIDTH
+    box_height = max(diameter + 2, CONN_STATUS_ICON_WIDTH + 1)
+    for loc, width in ((prefs['recency_loc'], recency_width), (prefs['conn_status_loc'], recency_width + CONN_STATUS_ICON_WIDTH)):
+        if loc == 1:
+            canvas.unmodelled(clip, 0, 0, width, box_height)
+        elif loc == 2:
+            canvas.unmodelled(clip, 0, sgv_height - box_height, width, box_height)
+
+def _c_div(a, b):
+    """Integer division truncated toward zero, as in C."""
+    q = abs(a) // abs(b)
+    return q if (a < 0) == (b < 0) else -q
+
+def _mask_status_bar(canvas, frame, bounds, prefs, constants):
+    """Leave out the status bar's text, battery and recency, as placed by status_bar_element.c."""
+    _, _, w, h = bounds
+    font_height, padding_top, padding_bottom = FONT_18_BOLD
+    if h <= font_height * 2 + padding_top + padding_bottom:
+        text_y = _c_div(h - font_height, 2) - padding_top
+        text_height = font_height + padding_top + padding_bottom
+    else:
+        text_y = _c_div(-1 * padding_top, 2)
+        text_height = h - text_y
+    # Text layers are clipped to the element's frame, borders included, not its bounds
+    canvas.unmodelled(frame, SM_TEXT_MARGIN, text_y, w - SM_TEXT_MARGIN, text_height)
+    line_height = font_height + padding_top
+
+    if prefs['battery_loc'] == constants['BATTERY_LOC']['statusRight']:
+        if prefs['battery_as_number']:
+            battery_width, battery_height, battery_padding = BATTERY_TEXT_WIDTH, font_height + 2 * padding_bottom, padding_bottom
+        else:
+            battery_width, battery_height, battery_padding = BATTERY_ICON_WIDTH, BATTERY_ICON_HEIGHT, BATTERY_ICON_PADDING
+        lines = _c_div(h - text_y, line_height)
+        battery_y = text_y + line_height * (lines - 1) + padding_top + font_height // 2 - battery_height // 2
+        if battery_y + battery_height - battery_padding > h - SM_TEXT_MARGIN:
+            battery_y = h - battery_height + battery_padding - SM_TEXT_MARGIN
+        battery_x = w - battery_width - SM_TEXT_MARGIN
+        if prefs['battery_as_number']:
+            canvas.unmodelled(frame, battery_x, battery_y - padding_top + padding_bottom, BATTERY_TEXT_WIDTH, font_height + padding_top + padding_bottom)
+        else:
+            canvas.unmodelled(frame, battery_x, battery_y + BATTERY_ICON_TOP_FUDGE, BATTERY_ICON_WIDTH, BATTERY_ICON_HEIGHT)
+
+    if prefs['recency_loc'] in (constants['RECENCY_LOC']['statusTopRight'], constants['RECENCY_LOC']['statusBottomRight']):
+        lines = 1 if prefs['recency_loc'] == constants['RECENCY_LOC']['statusTopRight'] else _c_div(h - text_y, line_height)
+        diameter = RECENCY_DIAMETERS[prefs['recency_style']]
+        # recency_component.c: a 1px padding around a layer as wide as the element
+        recency_height = diameter + 2
+        recency_y = text_y + line_height * (lines - 1) + padding_top + font_height // 2 - recency_height // 2
+        if recency_y + 1 < 0:
+            recency_y = -1
+        elif recency_y + recency_height > h:
+            recency_y = h - recency_height + 1
+        canvas.unmodelled(frame, 1, recency_y + 1, w - 2, diameter)
+
+def _mask_sidebar(canvas, frame, bounds):
+    """Leave out the sidebar's last BG, trend arrow and delta, as placed by sidebar_element.c."""
+    _, _, w, h = bounds
+    font_height, padding_top, padding_bottom = FONT_24_BOLD
+    text_height = font_height + padding_top + padding_bottom
+    trend_arrow_y = _c_div(h - TREND_ARROW_WIDTH, 2)
+    last_bg_y = (_c_div(trend_arrow_y, 4) + h // 8) - font_height // 2 - padding_top
+    delta_y = ((h + trend_arrow_y + TREND_ARROW_WIDTH) // 4 + h * 3 // 8) - font_height // 2 - padding_top
+    canvas.unmodelled(frame, 0, last_bg_y, w, text_height)
+    canvas.unmodelled(frame, _c_div(w - TREND_ARROW_WIDTH, 2), trend_arrow_y, TREND_ARROW_WIDTH, TREND_ARROW_WIDTH)
+    canvas.unmodelled(frame, 0, delta_y, w, text_height)
+
+def render(config, constants, data, platform, size=SCREEN_SIZE):
+    """Draw the layout and graph for a config and data message.
+
+    Returns (pixels, modelled): a height x width x 3 array of uint8 RGB, and a
+    height x width boolean array which is False where the result isn't known.
+    """
+    prefs = preferences(config, constants)
+    canvas = Canvas(size, platform)
+    for e, frame in element_frames(prefs, size):
+        x, y, w, h = frame
+        bg, fg = (BLACK, WHITE) if e['black'] else (WHITE, BLACK)
+        clip = frame
+        canvas.fill_rect(clip, 0, 0, w, h, bg)
+        if e['bottom']:
+            canvas.draw_line(clip, (0, h - 1), (w - 1, h - 1), fg)
+        if e['right']:
+            canvas.draw_line(clip, (w - 1, 0), (w - 1, h - 1), fg)
+
+        bounds = _element_bounds(e, frame)
+        element = constants['ELEMENTS'][e['el']]
+        if element == 'GRAPH_ELEMENT':
+            _draw_graph(canvas, bounds, fg, prefs, data)
+            _mask_graph_overlays(canvas, bounds, prefs)
+        elif element == 'STATUS_BAR_ELEMENT':
+            _mask_status_bar(canvas, frame, bounds, prefs, constants)
+        elif element == 'SIDEBAR_ELEMENT':
+            _mask_sidebar(canvas, frame, bounds)
+        else:
+            # Text and icons
+            canvas.unmodelled(bounds, 0, 0, bounds[2], bounds[3])
+    return canvas.pixels, canvas.modelled
+
+def count_mismatches(pixels, modelled, gold, platform):
+    """Number of modelled pixels which differ from a gold image."""
+    if platform != 'aplite':
+        pixels = correct_colors(pixels)
+    return int(np.count_nonzero(np.any(pixels != gold, axis=-1) & modelled))
+
+def coverage(modelled):
+    """Fraction of the frame which is modelled."""
+    return float(np.count_nonzero(modelled)) / modelled.size
+
+def render_scenario(scenario_class, platform):
+    """Render a screenshot test case, as `render` does."""
+    scenario = scenario_class()
+    config = dict(BASE_CONFIG, **getattr(scenario, 'config', {}))
+    data = data_message(config, CONSTANTS, scenario.sgvs(), scenario.treatments(), scenario.profile())
+    return render(config, CONSTANTS, data, platform)
+
+
+def main():
+    gold_store = GoldStore()
+    rows = []
+    for scenario_class in scenarios():
+        for platform in PLATFORMS:
+            gold = gold_store.frame(scenario_class.gold_name(platform))
+            if gold is None:
+                continue
+            pixels, modelled = render_scenario(scenario_class, platform)
+            rows.append((coverage(modelled), scenario_class.__name__, platform, count_mismatches(pixels, modelled, gold, platform)))
+    for fraction, name, platform, mismatches in sorted(rows):
+        print '{:6.1%}  {:>5} differ  {}-{}'.format(fraction, mismatches, name, platform)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+HTML report of screenshot test results.
+
+Each test process appends its results, as they come in, to a JSON-lines file
+in the output directory. The report is rendered from all of them in one pass
+when a test process exits, or by hand with:
+
+    python test/report.py [output dir]
+
+Failures come first. Results are split into pages, with screenshots shown as
+thumbnails which link to the full-size images.
+"""
+
+import cgi
+import glob
+import json
+import os
+import sys
+
+RESULTS_PATTERN = 'results*.jsonl'
+INDEX_FILENAME = 'screenshots.html'
+PAGE_SIZE = 100
+THUMBNAIL_WIDTH = 72
+
+BASE_CONFIG_FILE = os.path.join(os.path.dirname(__file__), '../src/js/constants.json')
+
+PAGE_TEMPLATE = """
+<head>
+  <style>
+    td {{ border: 1px solid #666; padding: 4px; vertical-align: top; }}
+    table {{ border-collapse: collapse; margin-bottom: 2em; }}
+    img.pass {{ border: 5px solid #aea; }}
+    img.fail {{ border: 5px solid red; }}
+    code {{ display: block; border-top: 1px solid #999; margin-top: 0.5em; padding-top: 0.5em; white-space: pre-wrap; }}
+    nav {{ margin-bottom: 1em; }}
+  </style>
+</head>
+<body>
+  <nav>{counts} {pages}</nav>
+  <table>
+    {rows}
+  </table>
+  <strong>Default config</strong> (each test's config is merged into this):
+  <br>
+  <code>{base_config}</code>
+</body>
+"""
+
+ROW_TEMPLATE = """
+<tr>
+  <td><a href="{image}"><img src="{image}" class="{klass}" width="{width}" loading="lazy"></a></td>
+  <td>{diff}</td>
+  <td>
+    <strong>{name} [{platform}]</strong> {doc}
+    {details}
+  </td>
+</tr>
+"""
+
+
+class ResultsFile(object):
+    """Results of one test process, appended a line at a time."""
+    def __init__(self, filename):
+        self.filename = filename
+
+    def append(self, result):
+        """Append a result: a dict of name, platform, doc, passed, image and diff
+        (paths relative to the output directory, diff possibly None), and
+        details (a list of strings).
+        """
+        line = json.dumps(result, sort_keys=True) + '\n'
+        # One write per line, so lines from other processes can't end up in the middle of it
+        with open(self.filename, 'a') as f:
+            f.write(line)
+
+def load_results(out_dir):
+    results = []
+    for filename in sorted(glob.glob(os.path.join(out_dir, RESULTS_PATTERN))):
+        with open(filename) as f:
+            results.extend(json.loads(line) for line in f if line.strip())
+    # Failures first, then in the order they finished
+    return sorted(results, key=lambda r: (r['passed'], r['time']))
+
+def page_filename(page):
+    if page == 0:
+        return INDEX_FILENAME
+    return '{}-{}.html'.format(os.path.splitext(INDEX_FILENAME)[0], page + 1)
+
+def _row(result):
+    return ROW_TEMPLATE.format(
+        image=cgi.escape(result['image'], quote=True),
+        klass='pass' if result['passed'] else 'fail',
+        width=THUMBNAIL_WIDTH,
+        # diff images are only written for failures
+        diff='<img src="{}">'.format(cgi.escape(result['diff'], quote=True)) if result['diff'] else '',
+        name=cgi.escape(result['name']),
+        platform=cgi.escape(result['platform']),
+        doc=cgi.escape(result['doc']),
+        details=''.join('<code>{}</code>'.format(cgi.escape(d)) for d in result['details']),
+    )
+
+def _nav(page, page_count):
+    if page_count < 2:
+        return ''
+    return 'Page ' + ' '.join(
+        str(p + 1) if p == page else '<a href="{}">{}</a>'.format(page_filename(p), p + 1)
+        for p in range(page_count)
+    )
+
+def render(out_dir, base_config, page_size=PAGE_SIZE):
+    """Write the report's pages from every results file in `out_dir`. Returns the number of results."""
+    results = load_results(out_dir)
+    fails = sum(1 for r in results if not r['passed'])
+    counts = '{} failed, {} passed.'.format(fails, len(results) - fails)
+    page_count = max(1, (len(results) + page_size - 1) // page_size)
+    for page in range(page_count):
+        html = PAGE_TEMPLATE.format(
+            counts=counts,
+            pages=_nav(page, page_count),
+            rows=''.join(_row(r) for r in results[page * page_size:(page + 1) * page_size]),
+            base_config=cgi.escape(json.dumps(base_config)),
+        )
+        filename = os.path.join(out_dir, page_filename(page))
+        # Other test processes may be rendering too; each rename leaves a whole page
+        tmp_filename = '{}.{}.tmp'.format(filename, os.getpid())
+        with open(tmp_filename, 'w') as f:
+            f.write(html)
+        os.rename(tmp_filename, filename)
+    return len(results)
+
+
+def main():
+    out_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), 'output')
+    with open(BASE_CONFIG_FILE) as f:
+        base_config = json.load(f)['DEFAULT_CONFIG']
+    count = render(out_dir, base_config)
+    print 'Rendered {} results to {}'.format(count, os.path.join(out_dir, INDEX_FILENAME))
+
+if __name__ == '__main__':
+    main()
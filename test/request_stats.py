@@ -0,0 +1,52 @@
+"""
+Accounting of the requests served by the mock Nightscout server, to see how
+many requests the phone side actually makes, e.g. in one refresh cycle. Every
+request is counted, including those which fail or are impaired, but not the
+test harness's own requests to control the server.
+"""
+
+import threading
+
+from response_cache import normalize_query
+
+
+class RequestStats(object):
+    """Count, bytes served and handler time per path, normalized query and status, since the last reset."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, path, query, status, size, seconds):
+        key = (path, normalize_query(query), status)
+        with self._lock:
+            stats = self._stats.setdefault(key, {'count': 0, 'bytes': 0, 'seconds': 0})
+            stats['count'] += 1
+            stats['bytes'] += size
+            stats['seconds'] += seconds
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+
+    def to_json(self):
+        """A list with an entry per path, query and status, most requested first."""
+        with self._lock:
+            items = [
+                dict(stats, path=path, query=dict(query), status=status)
+                for (path, query, status), stats in self._stats.items()
+            ]
+        return sorted(items, key=lambda s: (-s['count'], s['path'], sorted(s['query'].items()), s['status']))
+
+
+def format_stats(stats):
+    """One line per path, query and status, plus a total, e.g. for a test report."""
+    lines = [
+        '{count}x {path}{query_string} ({status}): {bytes} bytes, {ms:.1f}ms'.format(
+            query_string='?' + '&'.join('{}={}'.format(k, v) for k, v in sorted(s['query'].items())) if s['query'] else '',
+            ms=1000 * s['seconds'],
+            **s
+        )
+        for s in stats
+    ]
+    lines.append('total: {} requests, {} bytes'.format(sum(s['count'] for s in stats), sum(s['bytes'] for s in stats)))
+    return lines
@@ -0,0 +1,70 @@
+"""
+Cache of encoded responses for the mock Nightscout server, so repeated polls
+of an unchanged collection don't re-serialize it.
+"""
+
+import threading
+from collections import OrderedDict
+
+# Cache-busting parameter which doesn't affect the response
+IGNORED_QUERY_KEYS = ['_']
+
+
+def normalize_query(query):
+    return tuple(sorted((k, v) for k, v in query.items() if k not in IGNORED_QUERY_KEYS))
+
+
+class ResponseCache(object):
+    """LRU map of (collection, normalized query) to response body.
+
+    Each collection has a version which `invalidate` bumps. A response computed
+    while its collection was being set isn't stored, so it can't outlive the
+    invalidation.
+    """
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._versions = {}
+
+    def get(self, coll, query, compute):
+        """The cached response, or the result of `compute()`, which is cached unless it is None."""
+        key = (coll, normalize_query(query))
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                value = self._entries.pop(key)
+                self._entries[key] = value
+                return value
+            self.misses += 1
+            version = self._versions.get(coll, 0)
+
+        value = compute()
+
+        with self._lock:
+            if value is not None and self._versions.get(coll, 0) == version:
+                self._entries[key] = value
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, coll):
+        with self._lock:
+            self._versions[coll] = self._versions.get(coll, 0) + 1
+            for key in [k for k in self._entries if k[0] == coll]:
+                del self._entries[key]
+
+    def to_json(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
+
+    def reset_counts(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def report(self):
+        with self._lock:
+            return 'cache {} hits, {} misses, {} entries'.format(self.hits, self.misses, len(self._entries))
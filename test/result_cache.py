@@ -0,0 +1,131 @@
+"""
+Cache of passing screenshot test results, so that a test whose inputs haven't
+changed since it last passed can be skipped and its screenshot reused.
+
+A result is keyed by a hash of everything that decides the screenshot and
+whether it passes: the built watchface, the platform, the merged config, the
+fixture data, the time of day, the diff settings and the gold image. Fixtures
+are generated relative to the current time, so times in them are replaced by
+how long ago they are, rounded to 10 seconds. The local time of day, rounded
+the same way, is kept, since the watchface's clock and a profile's basal
+schedule depend on it; a frozen SCREENSHOT_CLOCK makes it the same each run.
+
+The cache lives in SCREENSHOT_CACHE_DIR (by default in the temp directory). Set
+it to an empty string to run every test.
+"""
+
+import errno
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+from datetime import datetime
+
+from nightscout_query import to_millis
+
+# Change this to invalidate every cached result, e.g. when the harness changes how screenshots are taken
+CACHE_VERSION = 1
+CACHE_DIR = os.environ.get(
+    'SCREENSHOT_CACHE_DIR',
+    os.path.join(tempfile.gettempdir(), 'urchin-screenshot-cache')
+)
+
+# Numeric fields which hold epoch milliseconds
+MILLIS_KEYS = ['date', 'mills', 'timestamp']
+ISO_DATE = re.compile(r'^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}')
+# Fixtures are relative to when they were generated, which varies by up to a second or so
+TIME_RESOLUTION_MS = 10 * 1000
+
+# Build timestamps in the .pbw which don't affect the watchface
+MANIFEST_TIMESTAMP_KEYS = ['generatedAt', 'timestamp']
+PBPACK_TIMESTAMP = slice(8, 12)
+
+
+def _sha1(data):
+    return hashlib.sha1(data).hexdigest()
+
+def pbw_hash(filename):
+    """Hash of a built .pbw, ignoring when it was built."""
+    h = hashlib.sha1()
+    with zipfile.ZipFile(filename) as pbw:
+        for name in sorted(pbw.namelist()):
+            data = pbw.read(name)
+            if name.endswith('manifest.json'):
+                manifest = json.loads(data)
+                for key in MANIFEST_TIMESTAMP_KEYS:
+                    manifest.pop(key, None)
+                    manifest.get('resources', {}).pop(key, None)
+                data = json.dumps(manifest, sort_keys=True)
+            elif name.endswith('.pbpack'):
+                # The resource pack header holds a CRC of the resources, then a timestamp
+                data = data[:PBPACK_TIMESTAMP.start] + '\0' * 4 + data[PBPACK_TIMESTAMP.stop:]
+            h.update(name)
+            h.update(_sha1(data))
+    return h.hexdigest()
+
+def normalize_times(value, now_ms):
+    """Fixture data with times replaced by how long before `now_ms` they are."""
+    if isinstance(value, dict):
+        out = {}
+        for k, v in value.items():
+            if k in MILLIS_KEYS and isinstance(v, (int, long, float)) and not isinstance(v, bool):
+                out[k] = _ago(v, now_ms)
+            else:
+                out[k] = normalize_times(v, now_ms)
+        return out
+    elif isinstance(value, list):
+        return [normalize_times(v, now_ms) for v in value]
+    elif isinstance(value, basestring) and ISO_DATE.match(value):
+        millis = to_millis(value)
+        return value if millis is None else _ago(millis, now_ms)
+    else:
+        return value
+
+def _ago(millis, now_ms):
+    return {'ago': int(round((now_ms - millis) / float(TIME_RESOLUTION_MS))) * TIME_RESOLUTION_MS}
+
+def time_of_day(now_ms):
+    """Milliseconds since local midnight at `now_ms`, rounded as fixture times are."""
+    now = datetime.fromtimestamp(now_ms / 1000.0)
+    since_midnight = (now - now.replace(hour=0, minute=0, second=0, microsecond=0)).total_seconds() * 1000
+    return int(round(since_midnight / TIME_RESOLUTION_MS)) * TIME_RESOLUTION_MS % (24 * 60 * 60 * 1000)
+
+def result_key(pbw, platform, config, fixtures, time_of_day, diff_settings, gold):
+    """Key for one test on one platform. `fixtures` must already be normalized."""
+    return _sha1(json.dumps([CACHE_VERSION, pbw, platform, config, fixtures, time_of_day, diff_settings, gold], sort_keys=True))
+
+
+class ResultCache(object):
+    """Screenshots of passing results, stored as <key>.png."""
+    def __init__(self, dirname=CACHE_DIR):
+        self.dirname = dirname
+        if dirname:
+            try:
+                os.makedirs(dirname)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+
+    def enabled(self):
+        return bool(self.dirname)
+
+    def filename(self, key):
+        return os.path.join(self.dirname, '{}.png'.format(key))
+
+    def lookup(self, key):
+        """The cached screenshot for a passing result, or None."""
+        if not self.enabled():
+            return None
+        filename = self.filename(key)
+        return filename if os.path.exists(filename) else None
+
+    def store(self, key, screenshot_filename):
+        if not self.enabled():
+            return
+        # Write under a temporary name and rename, so other test processes never see a partial file
+        tmp_filename = '{}.{}.tmp'.format(self.filename(key), os.getpid())
+        shutil.copyfile(screenshot_filename, tmp_filename)
+        os.rename(tmp_filename, self.filename(key))
@@ -0,0 +1,145 @@
+"""
+Compare screenshots in-process, as arrays of pixels.
+
+Screenshots which match exactly (the common case) cost one buffer comparison.
+Otherwise pixels are compared a band of rows at a time, stopping as soon as
+the number of differing pixels exceeds the tolerance. A diff image is only
+rendered when the comparison fails.
+
+Screenshots are compared as they come from the emulator connection, without
+going through a file; `ImageWriter` saves them for the report afterwards.
+"""
+
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+from PIL import Image
+
+# Rows compared at a time when looking for differences
+BAND_HEIGHT = 8
+
+# What `pebble screenshot` (and so the basalt gold images) shows for each of
+# Pebble's 64 colors, indexed by (r, g, b) // 85 as base-4 digits. From
+# ScreenshotCommand._correct_colours in pebble-tool.
+COLOR_CORRECTION = np.array([
+    (0, 0, 0), (0, 30, 65), (0, 67, 135), (0, 104, 202),
+    (43, 74, 44), (39, 81, 79), (22, 99, 141), (0, 125, 206),
+    (94, 152, 96), (92, 155, 114), (87, 165, 162), (76, 180, 219),
+    (142, 227, 145), (142, 230, 158), (138, 235, 192), (132, 245, 241),
+    (74, 22, 27), (72, 39, 72), (64, 72, 138), (47, 107, 204),
+    (86, 78, 54), (84, 84, 84), (79, 103, 144), (65, 128, 208),
+    (117, 154, 100), (117, 157, 118), (113, 166, 164), (105, 181, 221),
+    (158, 229, 148), (157, 231, 160), (155, 236, 194), (149, 246, 242),
+    (153, 53, 63), (152, 62, 90), (149, 86, 148), (143, 116, 210),
+    (157, 91, 77), (157, 96, 100), (154, 112, 153), (149, 135, 213),
+    (175, 160, 114), (174, 163, 130), (171, 171, 171), (167, 186, 226),
+    (201, 232, 157), (201, 234, 167), (199, 240, 200), (195, 249, 247),
+    (227, 84, 98), (226, 88, 116), (225, 106, 163), (222, 131, 220),
+    (230, 110, 107), (230, 114, 124), (227, 127, 167), (225, 148, 223),
+    (241, 170, 134), (241, 173, 147), (239, 181, 184), (236, 195, 235),
+    (255, 238, 171), (255, 241, 181), (255, 246, 211), (255, 255, 255),
+], dtype=np.uint8)
+
+
+def load_image(filename):
+    """Decode an image file to a height x width x 3 array of uint8 RGB."""
+    return np.asarray(Image.open(filename).convert('RGB'))
+
+def save_image(pixels, filename):
+    Image.fromarray(pixels).save(filename)
+
+def correct_colors(pixels):
+    """Pebble RGB pixels as `pebble screenshot` shows them on color platforms."""
+    levels = pixels.astype(np.int32) // 85
+    return COLOR_CORRECTION[levels[..., 0] * 16 + levels[..., 1] * 4 + levels[..., 2]]
+
+def ignore_mask(shape, ignore_regions):
+    """Boolean mask which is False inside any of the (x, y, w, h) regions."""
+    mask = np.ones(shape[:2], dtype=bool)
+    for x, y, w, h in ignore_regions:
+        mask[y:y + h, x:x + w] = False
+    return mask
+
+def count_differing_pixels(test, gold, mask=None, limit=None):
+    """Count pixels which differ between two same-shape arrays.
+
+    If `limit` is given, stop counting once it has been exceeded.
+    """
+    if test.shape != gold.shape:
+        raise ValueError('Image sizes differ: {} vs {}'.format(test.shape, gold.shape))
+    if mask is None and test.tobytes() == gold.tobytes():
+        return 0
+
+    count = 0
+    for y in range(0, test.shape[0], BAND_HEIGHT):
+        differs = (test[y:y + BAND_HEIGHT] != gold[y:y + BAND_HEIGHT]).any(axis=2)
+        if mask is not None:
+            differs &= mask[y:y + BAND_HEIGHT]
+        count += int(differs.sum())
+        if limit is not None and count > limit:
+            break
+    return count
+
+def render_diff(test, gold, mask=None):
+    """Faded copy of the gold image with differing pixels in red, like ImageMagick's `compare`.
+
+    If the images differ in size, everything outside either of them is red too.
+    """
+    height, width = min(test.shape[0], gold.shape[0]), min(test.shape[1], gold.shape[1])
+    differs = np.ones((max(test.shape[0], gold.shape[0]), max(test.shape[1], gold.shape[1])), dtype=bool)
+    differs[:height, :width] = (test[:height, :width] != gold[:height, :width]).any(axis=2)
+    if mask is not None:
+        differs &= mask
+    out = np.zeros(differs.shape + (3,), dtype=np.uint8)
+    out[:gold.shape[0], :gold.shape[1]] = gold / 3 + 170
+    out[differs] = (255, 0, 0)
+    return out
+
+def frames_match(test, gold, diff_file, tolerance=0, ignore_regions=()):
+    """True if at most `tolerance` pixels differ outside the ignored regions.
+
+    On failure, including if the images differ in size, a diff image is written to `diff_file`.
+    """
+    if test.shape != gold.shape:
+        save_image(render_diff(test, gold), diff_file)
+        return False
+
+    mask = ignore_mask(test.shape, ignore_regions) if ignore_regions else None
+    if count_differing_pixels(test, gold, mask, limit=tolerance) <= tolerance:
+        return True
+    save_image(render_diff(test, gold, mask), diff_file)
+    return False
+
+
+class ImageWriter(object):
+    """Saves images on a background thread, so PNG encoding and disk writes stay out of the test loop."""
+    def __init__(self):
+        self._pool = None
+        self._pending = []
+
+    def write(self, pixels, filename, callback=None):
+        """Save an image, then call `callback` (e.g. to copy the file elsewhere), on the writer thread."""
+        if self._pool is None:
+            self._pool = ThreadPool(1)
+        self._pending.append(self._pool.apply_async(_write, (pixels, filename, callback)))
+
+    def wait(self):
+        """Block until every image so far is saved, raising any error from saving one."""
+        pending, self._pending = self._pending, []
+        for result in pending:
+            result.get()
+
+    def close(self):
+        """Wait for every image to be saved, then stop the writer thread."""
+        try:
+            self.wait()
+        finally:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool.join()
+                self._pool = None
+
+def _write(pixels, filename, callback):
+    save_image(pixels, filename)
+    if callback is not None:
+        callback()
@@ -1,83 +1,263 @@
 """
 Mock Nightscout server. Two modes for data source:
-1. the values received in a POST to /set-sgv, /set-treatments, etc. (default)
+1. the values received in a POST to /set-sgv, /set-treatments, etc. (default),
+   initially those of a recording if given by --replay
 2. the values defined on a screenshot test case, specified by --test-class
+
+POST /impair to simulate a slow or unreliable network; see impairment.py.
+
+POST /clock to serve in virtual time, e.g. frozen or faster than real time; see
+virtual_clock.py.
+
+GET /stats returns the count, bytes and handler time of the requests served
+per path, query and status, and the response cache's hits and misses, since
+the last POST to /stats/reset.
+
+By default this runs the Flask development server. With --async it runs on
+Tornado instead, which can serve thousands of concurrent polling clients (e.g.
+when load-testing phone-side code) and periodically reports throughput and
+latency.
 """
 
 import argparse
 import json
 import os
 import sys
-import urllib
+import threading
+import time
 
-import requests
-from flask import Flask, request
-from werkzeug.contrib.cache import SimpleCache
+import tornado.gen
+import tornado.httpserver
+import tornado.ioloop
+import tornado.web
+from flask import Flask, Response, g, request
+from werkzeug.exceptions import BadRequest
 from werkzeug.exceptions import NotFound
 
-import test_screenshots
+import impairment
+import nightscout_recording
+import screenshot_scenarios
+import virtual_clock
+from impairment import Impairments
+from nightscout_query import IndexedCollection
+from nightscout_query import TIME_FIELDS
+from nightscout_query import parse_query
+from nightscout_store import CollectionStore
+from request_stats import RequestStats
+from response_cache import ResponseCache
+from virtual_clock import CLOCK
 
 parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
 parser.add_argument('--port')
 parser.add_argument('--test-class')
+parser.add_argument('--replay', metavar='DIR', help='serve a recording made with nightscout_recording.py')
+parser.add_argument('--shift-to-now', action='store_true', help='with --replay, move the recording to end now')
+parser.add_argument('--async', dest='async_mode', action='store_true', help='serve with Tornado')
+parser.add_argument('--stats-interval', type=int, default=10, help='seconds between throughput reports with --async')
 args, _ = parser.parse_known_args()
 
 port = int(args.port or os.environ.get('MOCK_SERVER_PORT') or 0)
-if port == 0:
-    print "Port must be set via MOCK_SERVER_PORT or --port"
-    sys.exit()
 
-COLLECTIONS = ['entries', 'treatments', 'profile', 'devicestatus']
+# Pending connections to queue with --async, so bursts of clients aren't refused
+ASYNC_BACKLOG = 4096
+# The test harness's own requests, which aren't counted in the stats
+CONTROL_PATHS = ('/impair', '/clock', '/stats', '/stats/reset')
 
-cache = SimpleCache(default_timeout=999999)
-for coll in COLLECTIONS:
-    cache.set(coll, '[]')
 
-app = Flask(__name__)
+class LatencyStats(object):
+    """Throughput and latency percentiles of requests since the last report."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
 
-def _get_post_json(request):
-    return json.loads(request.data or request.form.keys()[0])
+    def _reset(self):
+        self.started = time.time()
+        self.latencies = []
 
-@app.route('/api/v1/<coll>.json')
-def get_collection(coll):
-    elements = _collection_from_test(coll, args.test_class) if args.test_class else _collection_from_cache(coll)
-    if coll == 'treatments':
-        return json.dumps(_filter_treatments(elements, request.args))
-    elif elements is not None:
-        return json.dumps(elements)
+    def record(self, seconds):
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def report(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+            elapsed = time.time() - self.started
+            self._reset()
+        if not latencies:
+            return '0 requests'
+        return '{} requests, {:.0f}/s, p50 {:.2f}ms, p99 {:.2f}ms'.format(
+            len(latencies),
+            len(latencies) / elapsed,
+            1000 * latencies[int(len(latencies) * 0.5)],
+            1000 * latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+        )
+
+
+store = CollectionStore()
+response_cache = ResponseCache()
+latency_stats = LatencyStats()
+request_stats = RequestStats()
+impairments = Impairments()
+
+def record_request(path, query, status, size, seconds):
+    """Count a response in the stats, unless it was to the test harness."""
+    if path in CONTROL_PATHS or path.startswith('/set-'):
+        return
+    latency_stats.record(seconds)
+    request_stats.record(path, query, status, size, seconds)
+
+def get_stats_json():
+    return json.dumps({'requests': request_stats.to_json(), 'cache': response_cache.to_json()})
+
+def reset_stats_json():
+    request_stats.reset()
+    response_cache.reset_counts()
+
+def get_collection_json(coll, query):
+    """JSON for a GET of a collection, or None if there is no such collection."""
+    if args.test_class:
+        # Test case data depends on the current time, so can't be cached
+        return _query_json(_collection_from_test(coll, args.test_class), _clocked_query(coll, query))
+    elif not CLOCK.is_real():
+        # Nor can data hidden until the virtual time reaches it
+        return _query_json(_collection_from_store(coll), _clocked_query(coll, query))
     else:
-        raise NotFound
+        return response_cache.get(coll, query, lambda: _query_json(_collection_from_store(coll), query))
 
-def _collection_from_cache(coll):
-    return cache.get(coll) if coll in COLLECTIONS else None
+def _clocked_query(coll, query):
+    if CLOCK.is_real():
+        return query
+    return virtual_clock.query_in_virtual_time(query, TIME_FIELDS.get(coll), CLOCK)
 
-def _collection_from_test(coll, test_class_name):
-    # XXX this is very fragile, but for now makes iterating much faster
-    reload(test_screenshots)
-    if coll == 'entries':
-        return getattr(test_screenshots, test_class_name)().sgvs()
-    elif coll == 'treatments':
-        return getattr(test_screenshots, test_class_name)().treatments()
-    elif coll == 'profile':
-        return getattr(test_screenshots, test_class_name)().profile()
-    elif coll == 'devicestatus':
-        return getattr(test_screenshots, test_class_name)().devicestatus()
+def set_collection_json(coll, body):
+    """Store the POSTed elements. Returns False if there is no such collection."""
+    if coll in store:
+        store.set(coll, json.loads(body))
+        response_cache.invalidate(coll)
+        return True
     else:
+        return False
+
+def set_impairments_json(body):
+    """Replace the impairment rules. Returns an error message if they're malformed."""
+    try:
+        impairments.set(json.loads(body or '{}'))
+    except ValueError as e:
+        return str(e)
+
+def set_clock_json(body):
+    """Set the virtual clock. Returns an error message if the settings are malformed."""
+    try:
+        CLOCK.update(json.loads(body or '{}'))
+    except ValueError as e:
+        return str(e)
+
+def _query_json(collection, query):
+    if collection is None:
+        return None
+    elements = collection.find(parse_query(query))
+    if CLOCK.shift_ms:
+        elements = virtual_clock.shift_times(elements, CLOCK.shift_ms)
+    return json.dumps(elements)
+
+def _collection_from_store(coll):
+    return store.get(coll) if coll in store else None
+
+FIXTURE_METHODS = {
+    'entries': 'sgvs',
+    'treatments': 'treatments',
+    'profile': 'profile',
+    'devicestatus': 'devicestatus',
+}
+
+class ScenarioLoader(object):
+    """Test case instances for --test-class, re-imported only when their module's source changes.
+
+    Fixtures are still evaluated on each request, since many are relative to the current time.
+    """
+    def __init__(self, module):
+        self.module = module
+        self._lock = threading.Lock()
+        self._mtime = self._source_mtime()
+        self._instances = {}
+
+    def _source_mtime(self):
+        return os.path.getmtime(os.path.splitext(self.module.__file__)[0] + '.py')
+
+    def get(self, class_name):
+        with self._lock:
+            mtime = self._source_mtime()
+            if mtime != self._mtime:
+                self.module = reload(self.module)
+                self._mtime = mtime
+                self._instances = {}
+            if class_name not in self._instances:
+                self._instances[class_name] = getattr(self.module, class_name)()
+            return self._instances[class_name]
+
+scenarios = ScenarioLoader(screenshot_scenarios)
+
+def _collection_from_test(coll, test_class_name):
+    if coll not in FIXTURE_METHODS:
         return None
+    elements = getattr(scenarios.get(test_class_name), FIXTURE_METHODS[coll])()
+    return IndexedCollection(elements, TIME_FIELDS.get(coll))
+
+
+########## Flask
+
+app = Flask(__name__)
 
-def _filter_treatments(treatments, query):
-    # XXX hard-coding the queries performed by the JS
-    if query.get('find[eventType]') == 'Temp Basal':
-        return [t for t in treatments if 'duration' in t]
-    elif query.get('find[insulin][$exists]'):
-        return [t for t in treatments if 'insulin' in t]
+def _get_post_body(request):
+    return request.data or request.form.keys()[0]
+
+@app.before_request
+def start_timer():
+    g.started = time.time()
+
+@app.after_request
+def count_request(response):
+    path, query, started = request.path, request.args.to_dict(), g.started
+    size = int(response.headers.get('Content-Length', 0))
+    def record():
+        record_request(path, query, response.status_code, size, time.time() - started)
+    if getattr(response, 'impaired', False):
+        # An impaired body takes a while to send, so count it once it has been
+        response.call_on_close(record)
     else:
-        return treatments
+        record()
+    return response
+
+@app.route('/api/v1/<coll>.json')
+def get_collection(coll):
+    plan = impairments.plan(coll)
+    time.sleep(plan.delay)
+    if plan.status:
+        return '', plan.status
+    try:
+        body = get_collection_json(coll, request.args.to_dict())
+    except ValueError as e:
+        # e.g. an unsupported query operator
+        raise BadRequest(str(e))
+    if body is None:
+        raise NotFound
+    if plan != impairment.NO_IMPAIRMENT:
+        return _impaired_response(body, plan)
+    return body
+
+def _impaired_response(body, plan):
+    def generate():
+        for pause, chunk in impairment.chunks(body, plan):
+            time.sleep(pause)
+            yield chunk
+    # If the response is dropped, the client sees the connection close before Content-Length bytes
+    response = Response(generate(), headers={'Content-Length': str(len(body))})
+    response.impaired = True
+    return response
 
 @app.route('/set-<coll>', methods=['post'])
 def set_collection(coll):
-    if coll in COLLECTIONS:
-        cache.set(coll, _get_post_json(request))
+    if set_collection_json(coll, _get_post_body(request)):
         return ''
     else:
         raise NotFound
@@ -90,5 +270,159 @@ def get_sgv():
 def set_sgv():
     return set_collection('entries')
 
+@app.route('/impair', methods=['get', 'post'])
+def impair():
+    if request.method == 'POST':
+        error = set_impairments_json(_get_post_body(request) if request.data or request.form else None)
+        if error:
+            raise BadRequest(error)
+    return json.dumps(impairments.to_json())
+
+@app.route('/clock', methods=['get', 'post'])
+def clock():
+    if request.method == 'POST':
+        error = set_clock_json(_get_post_body(request) if request.data or request.form else None)
+        if error:
+            raise BadRequest(error)
+    return json.dumps(CLOCK.to_json())
+
+@app.route('/stats')
+def get_stats():
+    return get_stats_json()
+
+@app.route('/stats/reset', methods=['post'])
+def reset_stats():
+    reset_stats_json()
+    return ''
+
+
+########## Tornado
+
+def _first_values(arguments):
+    return dict((key, values[0]) for key, values in arguments.items())
+
+class Handler(tornado.web.RequestHandler):
+    """Sends the reason for a 400 to the client, as Flask's BadRequest does."""
+    def write_error(self, status_code, **kwargs):
+        error = kwargs['exc_info'][1] if 'exc_info' in kwargs else None
+        if status_code == 400 and isinstance(error, tornado.web.HTTPError) and error.log_message:
+            self.finish(error.log_message % error.args)
+        else:
+            super(Handler, self).write_error(status_code, **kwargs)
+
+class CountedHandler(Handler):
+    """Counts each response in the stats once it's finished."""
+    def initialize(self):
+        self.bytes_written = 0
+
+    def write(self, chunk):
+        super(CountedHandler, self).write(chunk)
+        self.bytes_written += len(chunk) if isinstance(chunk, basestring) else 0
+
+    def on_finish(self):
+        record_request(self.request.path, _first_values(self.request.query_arguments),
+                       self.get_status(), self.bytes_written, self.request.request_time())
+
+class NotFoundHandler(CountedHandler):
+    def prepare(self):
+        raise tornado.web.HTTPError(404)
+
+class CollectionHandler(CountedHandler):
+    @tornado.gen.coroutine
+    def get(self, coll):
+        plan = impairments.plan(coll)
+        if plan.delay:
+            yield tornado.gen.sleep(plan.delay)
+        if plan.status:
+            raise tornado.web.HTTPError(plan.status)
+        try:
+            body = get_collection_json(coll, _first_values(self.request.query_arguments))
+        except ValueError as e:
+            raise tornado.web.HTTPError(400, '%s', e)
+        if body is None:
+            raise tornado.web.HTTPError(404)
+        if plan == impairment.NO_IMPAIRMENT:
+            self.write(body)
+            return
+        self.set_header('Content-Length', len(body))
+        for pause, chunk in impairment.chunks(body, plan):
+            if pause:
+                yield tornado.gen.sleep(pause)
+            self.write(chunk)
+            yield self.flush()
+        if plan.drop:
+            self.request.connection.stream.close()
+
+class SGVHandler(CollectionHandler):
+    def get(self):
+        return super(SGVHandler, self).get('entries')
+
+class SetCollectionHandler(tornado.web.RequestHandler):
+    def post(self, coll):
+        if not set_collection_json('entries' if coll == 'sgv' else coll, self.request.body):
+            raise tornado.web.HTTPError(404)
+
+class ImpairHandler(Handler):
+    def get(self):
+        self.write(json.dumps(impairments.to_json()))
+
+    def post(self):
+        error = set_impairments_json(self.request.body)
+        if error:
+            raise tornado.web.HTTPError(400, '%s', error)
+        self.get()
+
+class ClockHandler(Handler):
+    def get(self):
+        self.write(json.dumps(CLOCK.to_json()))
+
+    def post(self):
+        error = set_clock_json(self.request.body)
+        if error:
+            raise tornado.web.HTTPError(400, '%s', error)
+        self.get()
+
+class StatsHandler(tornado.web.RequestHandler):
+    def get(self):
+        self.write(get_stats_json())
+
+class ResetStatsHandler(tornado.web.RequestHandler):
+    def post(self):
+        reset_stats_json()
+
+def make_async_app():
+    return tornado.web.Application([
+        (r'/api/v1/entries/sgv\.json', SGVHandler),
+        (r'/api/v1/([^/]+)\.json', CollectionHandler),
+        (r'/set-([^/]+)', SetCollectionHandler),
+        (r'/impair', ImpairHandler),
+        (r'/clock', ClockHandler),
+        (r'/stats', StatsHandler),
+        (r'/stats/reset', ResetStatsHandler),
+    ], default_handler_class=NotFoundHandler)
+
+def run_async(port):
+    server = tornado.httpserver.HTTPServer(make_async_app())
+    server.bind(port, backlog=ASYNC_BACKLOG)
+    server.start()
+
+    def report():
+        print '{}; {}'.format(latency_stats.report(), response_cache.report())
+        sys.stdout.flush()
+    tornado.ioloop.PeriodicCallback(report, args.stats_interval * 1000).start()
+    print "Serving with Tornado on port {}".format(port)
+    tornado.ioloop.IOLoop.current().start()
+
+
 if __name__ == "__main__":
-    app.run(port=port)
+    if port == 0:
+        print "Port must be set via MOCK_SERVER_PORT or --port"
+        sys.exit()
+    if args.replay:
+        for coll, collection in nightscout_recording.load(args.replay, args.shift_to_now).items():
+            store.set_collection(coll, collection)
+    if args.async_mode:
+        run_async(port)
+    else:
+        # Threaded, so that impaired requests don't hold up others
+        app.run(port=port, threaded=True)
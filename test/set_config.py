@@ -9,7 +9,7 @@ import json
 import os
 import sys
 
-import test_screenshots
+import screenshot_scenarios
 from util import set_config
 
 PORT = os.environ.get('MOCK_SERVER_PORT')
@@ -21,7 +21,7 @@ parser.add_argument('--platform', default='basalt', help='which emulator')
 args = parser.parse_args()
 
 if args.test_class:
-    config = getattr(test_screenshots, args.test_class)().config
+    config = getattr(screenshot_scenarios, args.test_class)().config
 elif args.config_json:
     config = json.loads(args.config_json)
 else:
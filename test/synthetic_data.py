@@ -0,0 +1,220 @@
+"""
+Generate large, realistic-looking Nightscout histories: weeks or months of
+5-minute SGVs with noise, gaps and error codes, plus temp basals, boluses,
+Loop or OpenAPS devicestatus and a profile.
+
+Writes one file per collection, as a JSON array or as NDJSON (one element per
+line), and/or POSTs the data to a running mock server, e.g.:
+
+    python test/synthetic_data.py --days 90 --out /tmp/history
+    python test/synthetic_data.py --days 90 --post http://localhost:5555
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import requests
+
+SGV_INTERVAL_MS = 5 * 60 * 1000
+TEMP_BASAL_INTERVAL_MS = 30 * 60 * 1000
+
+# Dexcom special values, e.g. 1 = sensor not active, 5 = no antenna, 9 = ???, 10 = hourglass
+ERROR_CODES = [1, 2, 3, 5, 6, 9, 10]
+
+# (minimum rate of change in mg/dL/min, direction, trend)
+DIRECTIONS = [
+    (float('-inf'), 'DoubleDown', 7),
+    (-3, 'SingleDown', 6),
+    (-2, 'FortyFiveDown', 5),
+    (-1, 'Flat', 4),
+    (1, 'FortyFiveUp', 3),
+    (2, 'SingleUp', 2),
+    (3, 'DoubleUp', 1),
+]
+NOT_COMPUTABLE = ('NOT COMPUTABLE', 8)
+
+COLLECTIONS = ['entries', 'treatments', 'devicestatus', 'profile']
+
+
+def iso_dates(dates_ms):
+    """ISO 8601 UTC strings for an array of epoch milliseconds."""
+    return np.datetime_as_string(np.asarray(dates_ms, dtype='int64').astype('datetime64[ms]'), unit='s', timezone='UTC')
+
+def sgv_dates(count, end_ms=None):
+    """Epoch milliseconds of `count` readings 5 minutes apart, most recent first."""
+    end_ms = int(time.time() * 1000) if end_ms is None else end_ms
+    return end_ms - SGV_INTERVAL_MS * np.arange(count, dtype='int64')
+
+def sgv_series(count, rng):
+    """Blood sugars in mg/dL, most recent first: a daily cycle, meal spikes and a smoothed random walk."""
+    minutes = 5 * np.arange(count)
+    daily = 30 * np.sin(2 * np.pi * minutes / (24 * 60))
+    meals = np.zeros(count)
+    meal_starts = np.flatnonzero(rng.random_sample(count) < 3.0 / 288)
+    spike = 60 * np.exp(-np.arange(36) / 12.0) * (1 - np.exp(-np.arange(36) / 3.0))
+    for start in meal_starts:
+        end = min(count, start + len(spike))
+        meals[start:end] += spike[:end - start]
+    walk = np.cumsum(rng.normal(0, 2, count))
+    walk -= np.convolve(walk, np.ones(72) / 72, mode='same')
+    sgvs = 130 + daily + meals + walk + rng.normal(0, 3, count)
+    return np.clip(np.round(sgvs), 40, 400).astype(int)[::-1]
+
+def entries(count, end_ms=None, rng=None, gap_fraction=0.01, error_fraction=0.005):
+    """SGV entries, most recent first, with some readings missing or replaced by error codes."""
+    rng = rng or np.random.RandomState()
+    dates = sgv_dates(count, end_ms)
+    sgvs = sgv_series(count, rng)
+
+    # Rate of change over the last 5 minutes; readings are most recent first
+    rates = np.append(sgvs[:-1] - sgvs[1:], 0) / 5.0
+    direction_index = np.searchsorted([d[0] for d in DIRECTIONS[1:]], rates, side='right')
+
+    errors = rng.random_sample(count) < error_fraction
+    sgvs[errors] = rng.choice(ERROR_CODES, errors.sum())
+    noise = np.where(errors, 4, rng.choice([1, 1, 1, 2, 3], count))
+
+    # Gaps are runs of up to an hour, as when the receiver is out of range
+    keep = np.ones(count, dtype=bool)
+    for start in np.flatnonzero(rng.random_sample(count) < gap_fraction / 6):
+        keep[start:start + rng.randint(1, 13)] = False
+
+    out = []
+    for date, sgv, i, error, n in zip(dates[keep].tolist(), sgvs[keep].tolist(), direction_index[keep].tolist(),
+                                      errors[keep].tolist(), noise[keep].tolist()):
+        direction, trend = NOT_COMPUTABLE if error else DIRECTIONS[i][1:]
+        out.append({'type': 'sgv', 'sgv': sgv, 'date': date, 'direction': direction, 'trend': trend, 'noise': n})
+    return out
+
+def temp_basals(duration_ms, end_ms=None, rng=None):
+    rng = rng or np.random.RandomState()
+    end_ms = int(time.time() * 1000) if end_ms is None else end_ms
+    count = int(duration_ms // TEMP_BASAL_INTERVAL_MS)
+    dates = end_ms - TEMP_BASAL_INTERVAL_MS * np.arange(count, dtype='int64') - rng.randint(0, 5 * 60 * 1000, count)
+    rates = np.round(rng.choice([0, 0, 0.2, 0.5, 0.8, 1, 1.2, 1.5, 2], count), 2)
+    return [
+        {'eventType': 'Temp Basal', 'created_at': created_at, 'absolute': rate, 'duration': 30}
+        for created_at, rate in zip(iso_dates(dates).tolist(), rates.tolist())
+    ]
+
+def boluses(duration_ms, end_ms=None, rng=None, per_day=5):
+    rng = rng or np.random.RandomState()
+    end_ms = int(time.time() * 1000) if end_ms is None else end_ms
+    count = rng.poisson(per_day * duration_ms / (24 * 60 * 60 * 1000.0))
+    dates = np.sort(end_ms - rng.randint(0, duration_ms, count).astype('int64'))[::-1]
+    insulin = np.round(rng.gamma(2, 1.5, count), 1)
+    events = np.where(insulin > 2, 'Meal Bolus', 'Correction Bolus')
+    return [
+        {'eventType': event, 'created_at': created_at, 'insulin': units}
+        for event, created_at, units in zip(events.tolist(), iso_dates(dates).tolist(), insulin.tolist())
+    ]
+
+def treatments(duration_ms, end_ms=None, rng=None):
+    """Temp basals and boluses, most recent first."""
+    out = temp_basals(duration_ms, end_ms, rng) + boluses(duration_ms, end_ms, rng)
+    return sorted(out, key=lambda t: t['created_at'], reverse=True)
+
+def devicestatus(count, end_ms=None, rng=None, kind='loop'):
+    """Uploader status every 5 minutes, most recent first, from either Loop or OpenAPS."""
+    rng = rng or np.random.RandomState()
+    dates = sgv_dates(count, end_ms) - rng.randint(0, 60 * 1000, count)
+    created = iso_dates(dates).tolist()
+    iob = np.round(np.abs(rng.normal(1.5, 1, count)), 2).tolist()
+    cob = np.round(np.maximum(0, rng.normal(10, 15, count))).tolist()
+    evbg = np.clip(rng.normal(120, 30, count), 40, 400).astype(int).tolist()
+    battery = np.clip(100 - (np.arange(count) % 288) / 3, 5, 100).astype(int)[::-1].tolist()
+    rates = np.round(rng.choice([0, 0.5, 1, 1.5, 2], count), 2).tolist()
+    enacted = (rng.random_sample(count) < 0.5).tolist()
+
+    out = []
+    for i in xrange(count):
+        if kind == 'loop':
+            status = {
+                'created_at': created[i],
+                'loop': {
+                    'timestamp': created[i],
+                    'iob': {'iob': iob[i], 'timestamp': created[i]},
+                    'cob': {'cob': cob[i], 'timestamp': created[i]},
+                    'predicted': {'values': [evbg[i]], 'startDate': created[i]},
+                },
+                'pump': {'battery': {'voltage': round(1.2 + battery[i] / 400.0, 2)}},
+                'uploader': {'battery': battery[i]},
+            }
+            if enacted[i]:
+                status['loop']['enacted'] = {'rate': rates[i], 'duration': 30, 'timestamp': created[i], 'received': True}
+        else:
+            status = {
+                'created_at': created[i],
+                'uploaderBattery': battery[i],
+                'openaps': {
+                    'iob': {'iob': iob[i], 'timestamp': created[i]},
+                    'suggested': {'eventualBG': evbg[i], 'timestamp': created[i]},
+                },
+            }
+            if enacted[i]:
+                status['openaps']['enacted'] = {'rate': rates[i], 'duration': 30, 'timestamp': created[i], 'received': True}
+        out.append(status)
+    return out
+
+def profile(rng=None):
+    """A profile with a basal rate for every 3 hours."""
+    rng = rng or np.random.RandomState()
+    rates = np.round(rng.uniform(0.3, 1.5, 8), 2).tolist()
+    return [{'basal': [{'time': '{:02d}:00'.format(3 * i), 'value': rate} for i, rate in enumerate(rates)]}]
+
+def generate(days, end_ms=None, seed=None, kind='loop'):
+    """All collections for `days` of history, as a dict of collection name to elements."""
+    rng = np.random.RandomState(seed)
+    end_ms = int(time.time() * 1000) if end_ms is None else end_ms
+    duration_ms = int(days * 24 * 60 * 60 * 1000)
+    count = duration_ms // SGV_INTERVAL_MS
+    return {
+        'entries': entries(count, end_ms, rng),
+        'treatments': treatments(duration_ms, end_ms, rng),
+        'devicestatus': devicestatus(count, end_ms, rng, kind),
+        'profile': profile(rng),
+    }
+
+def write(data, out_dir, ndjson=False):
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    for coll, elements in data.items():
+        with open(os.path.join(out_dir, coll + ('.ndjson' if ndjson else '.json')), 'w') as f:
+            if ndjson:
+                f.writelines(json.dumps(e) + '\n' for e in elements)
+            else:
+                json.dump(elements, f)
+
+def post(data, host):
+    for coll, elements in data.items():
+        requests.post('{}/set-{}'.format(host, coll), data=json.dumps(elements))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--days', type=float, default=30)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--kind', choices=['loop', 'openaps'], default='loop', help='type of devicestatus')
+    parser.add_argument('--out', help='directory to write one file per collection to')
+    parser.add_argument('--ndjson', action='store_true', help='write one element per line')
+    parser.add_argument('--post', metavar='HOST', help='mock server to POST the data to')
+    args = parser.parse_args()
+    if not args.out and not args.post:
+        parser.error('one of --out or --post is required')
+
+    started = time.time()
+    data = generate(args.days, seed=args.seed, kind=args.kind)
+    print 'Generated {} in {:.1f}s'.format(
+        ', '.join('{} {}'.format(len(data[coll]), coll) for coll in COLLECTIONS),
+        time.time() - started
+    )
+    if args.out:
+        write(data, args.out, args.ndjson)
+    if args.post:
+        post(data, args.post)
+
+if __name__ == '__main__':
+    main()
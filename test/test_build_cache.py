@@ -0,0 +1,50 @@
+from build_cache import build_key
+from build_cache import is_built
+from build_cache import save_key
+
+
+def make_project(tmpdir):
+    tmpdir.join('wscript').write('build')
+    tmpdir.join('src', 'main.c').write('int main;', ensure=True)
+    tmpdir.join('src', 'js', 'app.js').write('app();', ensure=True)
+    tmpdir.mkdir('build')
+    return str(tmpdir)
+
+def test_key_depends_on_sources_and_env_but_not_generated_files(tmpdir):
+    project = make_project(tmpdir)
+    key = build_key(project, {'BUILD_ENV': 'test'})
+    assert build_key(project, {'BUILD_ENV': 'test', 'OTHER': '1'}) == key
+    assert build_key(project, {'BUILD_ENV': 'test', 'DEBUG': '1'}) != key
+
+    tmpdir.join('src', 'js', 'generated', 'constants.json').write('{}', ensure=True)
+    assert build_key(project, {'BUILD_ENV': 'test'}) == key
+
+    tmpdir.join('src', 'main.c').write('int main();')
+    assert build_key(project, {'BUILD_ENV': 'test'}) != key
+
+def test_is_built_needs_a_matching_key_and_the_pbw_it_built(tmpdir):
+    project = make_project(tmpdir)
+    build_dir = str(tmpdir.join('build'))
+    key = build_key(project, {})
+    save_key(build_dir, key)
+    assert not is_built(build_dir, key)
+
+    tmpdir.join('build', 'app.pbw').write('built')
+    assert not is_built(build_dir, key)
+    save_key(build_dir, key)
+    assert is_built(build_dir, key)
+    assert not is_built(build_dir, 'other')
+
+def test_is_built_is_false_once_the_pbw_changes(tmpdir):
+    project = make_project(tmpdir)
+    build_dir = str(tmpdir.join('build'))
+    key = build_key(project, {})
+    tmpdir.join('build', 'app.pbw').write('built')
+    save_key(build_dir, key)
+
+    # e.g. `pebble build` by hand, with other inputs
+    tmpdir.join('build', 'app.pbw').write('rebuilt')
+    assert not is_built(build_dir, key)
+
+    tmpdir.join('build', 'app.pbw').remove()
+    assert not is_built(build_dir, key)
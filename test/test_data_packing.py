@@ -0,0 +1,96 @@
+import json
+import random
+
+import pytest
+
+from data_packing import FIXTURES_FILE
+from data_packing import MODE_APPEND
+from data_packing import MODE_FULL
+from data_packing import check_messages
+from data_packing import fixtures
+from data_packing import pack_graph_extra
+from data_packing import pack_sgvs
+from data_packing import unpack_graph_extra
+from data_packing import unpack_sgvs
+
+
+def test_fixtures_for_the_js_tests_are_up_to_date():
+    with open(FIXTURES_FILE) as f:
+        assert json.load(f) == fixtures()
+
+@pytest.mark.parametrize('seed', range(20))
+def test_full_messages_round_trip(seed):
+    rng = random.Random(seed)
+    sgvs = []
+    graph_extra = []
+    sgv = rng.randint(40, 400)
+    for _ in range(rng.choice([36, 48, 144])):
+        sgv = max(1, min(500, sgv + rng.randint(-16, 16)))
+        sgvs.append(0 if rng.random() < 0.1 else sgv)
+        graph_extra.append(rng.choice([0, 0, 0, 1, 10, 11]))
+
+    assert unpack_sgvs(pack_sgvs(MODE_FULL, sgvs)) == sgvs
+    assert unpack_graph_extra(pack_graph_extra(MODE_FULL, graph_extra)) == graph_extra
+
+def test_sgvs_keep_full_resolution():
+    sgvs = [401, 123, 0, 57, 58]
+    assert pack_sgvs(MODE_FULL, sgvs) == [MODE_FULL, 5, 255, 1, 145, 255, 0, 123, 128, 255, 0, 57, 64 + 1]
+    assert unpack_sgvs(pack_sgvs(MODE_FULL, sgvs)) == sgvs
+
+def test_steady_data_packs_to_a_byte_per_sgv_and_a_few_for_graph_extra():
+    sgvs = [120 + i % 5 for i in range(144)]
+    assert len(pack_sgvs(MODE_FULL, sgvs)) == 2 + 3 + 143
+    assert len(pack_graph_extra(MODE_FULL, [0] * 144)) == 2 + 4
+
+def test_appended_values_push_the_oldest_off_the_end():
+    sgvs = [50, 51, 0, 53]
+    graph_extra = [0, 1, 0, 0]
+    assert unpack_sgvs(pack_sgvs(MODE_APPEND, [49, 0]), sgvs) == [49, 0, 50, 51]
+    assert unpack_graph_extra(pack_graph_extra(MODE_APPEND, [2, 2]), graph_extra) == [2, 2, 0, 1]
+    # Nothing new
+    assert unpack_sgvs(pack_sgvs(MODE_APPEND, []), sgvs) == sgvs
+
+def test_check_messages_decodes_each_against_the_last():
+    graphs = [
+        {'sgvs': [52, 51, 50], 'graphExtra': [0, 0, 0]},
+        {'sgvs': [53, 52, 51], 'graphExtra': [1, 0, 0]},
+        {'sgvs': [90, 200, 10], 'graphExtra': [1, 2, 1]},
+    ]
+    records = [
+        {'message': {'sgvsPacked': pack_sgvs(MODE_FULL, graphs[0]['sgvs']),
+                     'graphExtraPacked': pack_graph_extra(MODE_FULL, graphs[0]['graphExtra'])}, 'graph': graphs[0]},
+        {'message': {'sgvsPacked': pack_sgvs(MODE_APPEND, [53]),
+                     'graphExtraPacked': pack_graph_extra(MODE_APPEND, [1])}, 'graph': graphs[1]},
+        {'message': {'sgvsPacked': pack_sgvs(MODE_FULL, graphs[2]['sgvs']),
+                     'graphExtraPacked': pack_graph_extra(MODE_FULL, graphs[2]['graphExtra'])}, 'graph': graphs[2]},
+    ]
+    # Unpacked, each graph would be 2 bytes per SGV and 1 per graph extra value
+    assert check_messages(records) == ((7 + 4) + (5 + 3) + (11 + 5), 27, [])
+
+    # Appended to the wrong graph
+    records[1]['message']['sgvsPacked'] = pack_sgvs(MODE_APPEND, [54])
+    assert check_messages(records)[2] == [1]
+
+@pytest.mark.parametrize('packed, previous', [
+    # Header only partly there
+    ([MODE_FULL], None),
+    # Nothing to append to
+    ([MODE_APPEND, 1, 255, 0, 50], None),
+    # More new values than the watch has
+    ([MODE_APPEND, 3, 255, 0, 50, 64, 64], [50, 50]),
+    # Difference before any SGV
+    ([MODE_FULL, 1, 64], None),
+    # Fewer values than the header says
+    ([MODE_FULL, 3, 255, 0, 50, 64], None),
+    # An SGV cut short, and one too big for the watch
+    ([MODE_FULL, 1, 255, 0], None),
+    ([MODE_FULL, 1, 255, 128, 0], None),
+    # A run past the end
+    ([MODE_FULL, 2, 255, 0, 50, 129], None),
+    # Too many values
+    ([MODE_FULL, 145, 255, 0, 50, 127 + 127, 127 + 17], None),
+    ([7, 1, 255, 0, 50], None),
+])
+def test_bad_packing_is_rejected(packed, previous):
+    with pytest.raises(ValueError):
+        unpack_sgvs(packed, previous)
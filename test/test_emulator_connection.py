@@ -0,0 +1,52 @@
+import threading
+
+import pytest
+
+import emulator_connection
+from emulator_connection import EmulatorConnection
+
+
+class FakeConnection(EmulatorConnection):
+    def __init__(self):
+        super(FakeConnection, self).__init__('basalt')
+        self.disconnects = 0
+
+    def connect(self):
+        return None
+
+    def disconnect(self):
+        self.disconnects += 1
+
+def fake_screenshot(grab_image):
+    class FakeScreenshot(object):
+        def __init__(self, pebble):
+            pass
+    FakeScreenshot.grab_image = lambda self: grab_image()
+    return FakeScreenshot
+
+def test_screenshot_colours_are_corrected(monkeypatch):
+    # One row: white, then Pebble's pure blue
+    monkeypatch.setattr(emulator_connection, 'Screenshot', fake_screenshot(lambda: [bytearray([255, 255, 255, 0, 0, 255])]))
+    frame = FakeConnection().screenshot()
+    assert frame.shape == (1, 2, 3)
+    assert frame.tolist() == [[[255, 255, 255], [0, 104, 202]]]
+
+def test_screenshot_errors_are_raised(monkeypatch):
+    def fail():
+        raise ValueError('no screenshot')
+    monkeypatch.setattr(emulator_connection, 'Screenshot', fake_screenshot(fail))
+    with pytest.raises(ValueError):
+        FakeConnection().screenshot()
+
+def test_a_stuck_screenshot_times_out_and_disconnects(monkeypatch):
+    never = threading.Event()
+    monkeypatch.setattr(emulator_connection, 'Screenshot', fake_screenshot(never.wait))
+    monkeypatch.setattr(emulator_connection, 'SCREENSHOT_TIMEOUT_SECONDS', 0.05)
+    connection = FakeConnection()
+    try:
+        with pytest.raises(Exception) as error:
+            connection.screenshot()
+    finally:
+        never.set()
+    assert 'No screenshot from basalt' in str(error.value)
+    assert connection.disconnects == 1
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from gold_store import GoldStore
+from gold_store import decode
+from gold_store import encode
+from screenshot_diff import frames_match
+
+
+def frame(colors, shape=(168, 144)):
+    pixels = np.zeros(shape + (3,), dtype=np.uint8)
+    for i, color in enumerate(colors):
+        pixels[i::len(colors)] = color
+    return pixels
+
+@pytest.mark.parametrize('colors, encoding', [
+    ([(0, 0, 0), (255, 255, 255)], '1bit'),
+    ([(0, 0, 0), (255, 0, 0), (0, 170, 255)], 'palette8'),
+    ([(i % 256, i // 256, 0) for i in range(257)], 'rgb'),
+])
+def test_frames_round_trip(colors, encoding):
+    pixels = frame(colors, shape=(300, 144))
+    kind, palette, data = encode(pixels)
+    assert kind == encoding
+    assert (decode(kind, palette, data, [300, 144]) == pixels).all()
+
+def test_identical_frames_are_stored_once(tmpdir):
+    store = GoldStore(str(tmpdir))
+    store.put('TestA-aplite', frame([(0, 0, 0), (255, 255, 255)]))
+    store.put('TestB-aplite', frame([(0, 0, 0), (255, 255, 255)]))
+    store.put('TestA-basalt', frame([(0, 0, 0), (255, 0, 0), (0, 0, 255)]))
+    store.save()
+
+    reopened = GoldStore(str(tmpdir))
+    assert reopened.names() == ['TestA-aplite', 'TestA-basalt', 'TestB-aplite']
+    assert len(reopened.frames) == 2
+    assert reopened.frame_hash('TestA-aplite') == reopened.frame_hash('TestB-aplite')
+    assert (reopened.frame('TestA-basalt') == frame([(0, 0, 0), (255, 0, 0), (0, 0, 255)])).all()
+    assert reopened.frame('TestC-aplite') is None
+    assert reopened.frame_hash('TestC-aplite') is None
+
+def test_prune_drops_replaced_frames(tmpdir):
+    store = GoldStore(str(tmpdir))
+    store.put('TestA-basalt', frame([(0, 0, 0), (255, 0, 0), (0, 0, 255)]))
+    store.put('TestB-basalt', frame([(0, 0, 0), (0, 255, 0), (0, 0, 255)]))
+    store.save()
+    # Rebaseline TestA
+    store.put('TestA-basalt', frame([(0, 0, 0), (255, 255, 0), (0, 0, 255)]))
+    assert store.frame('TestB-basalt') is not None
+    assert store.prune() == 1
+
+    reopened = GoldStore(str(tmpdir))
+    assert len(reopened.frames) == 2
+    assert (reopened.frame('TestA-basalt') == frame([(0, 0, 0), (255, 255, 0), (0, 0, 255)])).all()
+    assert (reopened.frame('TestB-basalt') == frame([(0, 0, 0), (0, 255, 0), (0, 0, 255)])).all()
+
+def test_gold_frames_are_compared_without_files(tmpdir):
+    store = GoldStore(str(tmpdir))
+    gold = frame([(0, 0, 0), (255, 255, 255)])
+    store.put('TestA-aplite', gold)
+    test = gold.copy()
+    test[10, 10] = (0, 0, 0) if tuple(test[10, 10]) != (0, 0, 0) else (255, 255, 255)
+    diff_file = str(tmpdir.join('diff.png'))
+
+    assert frames_match(gold.copy(), store.frame('TestA-aplite'), diff_file)
+    assert frames_match(test, store.frame('TestA-aplite'), diff_file, tolerance=1)
+    assert not tmpdir.join('diff.png').check()
+    assert not frames_match(test, store.frame('TestA-aplite'), diff_file)
+    assert tmpdir.join('diff.png').check()
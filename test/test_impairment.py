@@ -0,0 +1,37 @@
+import pytest
+
+from impairment import Impairments
+from impairment import NO_IMPAIRMENT
+from impairment import Plan
+from impairment import chunks
+
+
+def test_rules_apply_per_collection_with_a_default():
+    impairments = Impairments(seed=0)
+    assert impairments.plan('entries') == NO_IMPAIRMENT
+    impairments.set({'entries': {'latency_ms': 2000}, '*': {'error_rate': 1, 'error_status': 503}})
+    assert impairments.plan('entries') == Plan(2.0, None, False, None)
+    assert impairments.plan('devicestatus') == Plan(0, 503, False, None)
+    impairments.set({})
+    assert impairments.plan('devicestatus') == NO_IMPAIRMENT
+
+def test_jitter_stays_within_bounds():
+    impairments = Impairments(seed=0)
+    impairments.set({'*': {'latency_ms': 1000, 'jitter_ms': 500}})
+    delays = [impairments.plan('entries').delay for _ in range(100)]
+    assert 0.5 <= min(delays) < max(delays) <= 1.5
+
+def test_unknown_settings_are_rejected():
+    impairments = Impairments()
+    with pytest.raises(ValueError):
+        impairments.set({'*': {'latency': 1000}})
+    with pytest.raises(ValueError):
+        impairments.set([])
+
+def test_chunks_pace_the_body_and_drop_halfway():
+    body = 'x' * 100
+    assert list(chunks(body, NO_IMPAIRMENT)) == [(0, body)]
+    assert list(chunks(body, Plan(0, None, True, None))) == [(0, 'x' * 50)]
+    paced = list(chunks(body, Plan(0, None, False, 200)))
+    assert [len(c) for _, c in paced] == [20] * 5
+    assert sum(pause for pause, _ in paced) == 0.5
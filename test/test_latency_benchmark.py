@@ -0,0 +1,28 @@
+from latency_benchmark import latest_run
+from latency_benchmark import medians
+from latency_benchmark import regressions
+from latency_benchmark import Timer
+
+
+def record(run, started, scenario, rendered, platform='basalt', kind='first_data'):
+    return {'run': run, 'time': started, 'scenario': scenario, 'platform': platform, 'kind': kind, 'phases': {'rendered': rendered}}
+
+def test_timer_records_phases_relative_to_start():
+    timer = Timer('TestFoo', 'aplite', 'first_data', started=100.0)
+    timer.mark('data_set', 100.5)
+    timer.mark('frame_changed', None)
+    assert timer.record()['phases'] == {'data_set': 0.5}
+
+def test_latest_run():
+    records = [record('a', 1, 'TestFoo', 1.0), record('b', 3, 'TestFoo', 2.0), record('b', 2, 'TestBar', 2.0)]
+    assert latest_run(records) == records[1:]
+    assert latest_run([]) == []
+
+def test_medians():
+    records = [record('a', 1, 'TestFoo', t) for t in [3.0, 1.0, 2.0, 10.0]]
+    assert medians(records) == {('TestFoo', 'basalt', 'first_data', 'rendered'): 2.5}
+
+def test_regressions_must_be_slower_relatively_and_absolutely():
+    baseline = [record('a', 1, 'TestFoo', 1.0), record('a', 1, 'TestBar', 0.1), record('a', 1, 'TestBaz', 1.0)]
+    current = [record('b', 2, 'TestFoo', 2.0), record('b', 2, 'TestBar', 0.3), record('b', 2, 'TestBaz', 1.1)]
+    assert regressions(current, baseline) == [(('TestFoo', 'basalt', 'first_data', 'rendered'), 1.0, 2.0)]
@@ -0,0 +1,53 @@
+import json
+import os
+import re
+
+import message_budget
+from message_budget import CONSTANTS
+from message_budget import message_size
+from message_budget import over_budget
+from message_budget import scenarios
+from message_budget import visible_points
+
+PACKAGE_FILE = os.path.join(os.path.dirname(__file__), '../package.json')
+APP_MESSAGES_HEADER = os.path.join(os.path.dirname(__file__), '../src/app_messages.h')
+
+
+def test_message_size_counts_tuple_headers_and_encoded_values():
+    # 1 + (7 + 4) + (7 + 3 + 1) + (7 + 2)
+    assert message_size({'msgType': 1, 'statusText': u'abc', 'sgvs': [1, 2]}) == 32
+    # An arrow is 3 bytes in UTF-8
+    assert message_size({'statusText': u'\u2192'}) == 1 + 7 + 4
+    assert message_size({'plotLine': True}) == 1 + 7 + 4
+
+def test_visible_points_matches_the_point_styles():
+    config = dict(CONSTANTS['DEFAULT_CONFIG'], **CONSTANTS['POINT_STYLES']['b'])
+    # 2 pixels per point, overlapping by a pixel
+    assert visible_points(144, config) == 72
+    config = dict(CONSTANTS['DEFAULT_CONFIG'], **CONSTANTS['POINT_STYLES']['d'])
+    assert visible_points(108, config) == 7
+
+def test_messages_use_only_keys_the_watchface_knows():
+    with open(PACKAGE_FILE) as f:
+        message_keys = json.load(f)['pebble']['messageKeys']
+    for _, _, _, messages in scenarios()[:1]:
+        for message in messages.values():
+            assert set(message) <= set(message_keys)
+
+def test_status_text_fits_the_watchface_buffer():
+    with open(APP_MESSAGES_HEADER) as f:
+        buffer_length = int(re.search(r'#define STATUS_BAR_MAX_LENGTH (\d+)', f.read()).group(1))
+    # Including the null terminator
+    assert CONSTANTS['STATUS_TEXT_MAX_BYTES'] + 1 <= buffer_length
+
+def test_every_scenario_fits_the_inbox():
+    for layout, point_style, status, messages in scenarios():
+        for kind, message in messages.items():
+            assert over_budget(message) is None, (layout, point_style, status, kind)
+
+def test_over_budget_names_the_largest_values():
+    message = {'msgType': 1, 'sgvs': [0] * 1000, 'statusText': u'x' * 10}
+    assert over_budget(message) == (
+        'Message is 1037 bytes, over the {}-byte inbox. Largest values: '
+        'sgvs (1007 bytes), statusText (18 bytes), msgType (11 bytes)'.format(message_budget.CONTENT_SIZE)
+    )
@@ -0,0 +1,85 @@
+import pytest
+
+from nightscout_query import IndexedCollection
+from nightscout_query import parse_query
+
+
+def find(elements, args, time_field=None):
+    return IndexedCollection(elements, time_field).find(parse_query(args))
+
+def test_parse_query_nests_keys_and_lists_indices():
+    assert parse_query({
+        'count': '5',
+        'find[date][$gt]': '100',
+        'find[$or][0][uploaderBattery][$exists]': 'true',
+        'find[$or][1][uploader][$exists]': 'true',
+    }) == {
+        'count': '5',
+        'find': {
+            'date': {'$gt': '100'},
+            '$or': [{'uploaderBattery': {'$exists': 'true'}}, {'uploader': {'$exists': 'true'}}],
+        },
+    }
+
+@pytest.mark.parametrize('args, message', [
+    ({'find[sgv][$regex]': '1'}, 'Unsupported query operator: $regex'),
+    ({'find[$or][0][sgv][$not][$in]': '1'}, 'Unsupported query operator: $in'),
+    ({'find[$or][sgv]': '1'}, '$or must be a list'),
+    ({'find': 'sgv'}, 'Query criteria must be fields'),
+    ({'count': 'ten'}, 'count must be a whole number: ten'),
+])
+def test_unsupported_queries_are_rejected_whatever_the_data(args, message):
+    with pytest.raises(ValueError) as e:
+        parse_query(args)
+    assert message in str(e.value)
+
+def test_date_range_and_count():
+    entries = [{'date': d, 'sgv': d} for d in [500, 400, 300, 200, 100]]
+    assert find(entries, {'find[date][$gt]': '200'}, 'date') == entries[:3]
+    assert find(entries, {'find[date][$gte]': '200', 'find[date][$lt]': '500'}, 'date') == entries[1:4]
+    assert find(entries, {'find[date][$gt]': '100', 'count': '2'}, 'date') == entries[:2]
+    assert find(entries, {'find[date][$gt]': '500'}, 'date') == []
+
+def test_results_are_most_recent_first():
+    entries = [{'date': d} for d in [200, 500, 100, 400]]
+    assert [e['date'] for e in find(entries, {}, 'date')] == [500, 400, 200, 100]
+
+def test_iso_dates_compare_as_times_across_offsets():
+    treatments = [
+        {'created_at': '2016-10-18T12:00:00-07:00'},
+        {'created_at': '2016-10-18T18:00:00Z'},
+    ]
+    assert find(treatments, {'find[created_at][$gt]': '2016-10-18T18:30:00+00:00'}, 'created_at') == treatments[:1]
+
+def test_equality_and_exists():
+    treatments = [
+        {'created_at': '2016-10-18T12:10:00Z', 'insulin': 1},
+        {'created_at': '2016-10-18T12:05:00Z', 'eventType': 'Temp Basal', 'duration': 30},
+        {'created_at': '2016-10-18T12:00:00Z', 'eventType': 'Meal Bolus', 'insulin': 2},
+    ]
+    assert find(treatments, {'find[eventType]': 'Temp Basal'}, 'created_at') == treatments[1:2]
+    assert find(treatments, {'find[insulin][$exists]': 'true'}, 'created_at') == [treatments[0], treatments[2]]
+    assert find(treatments, {'find[insulin][$exists]': 'false'}, 'created_at') == treatments[1:2]
+    assert find(treatments, {'find[insulin]': '2'}, 'created_at') == treatments[2:]
+
+def test_or_not_and_dotted_paths():
+    statuses = [
+        {'created_at': '2016-10-18T12:20:00Z', 'loop': {'failureReason': 'oops'}},
+        {'created_at': '2016-10-18T12:15:00Z', 'loop': {'enacted': {}}},
+        {'created_at': '2016-10-18T12:10:00Z', 'uploader': {'battery': 50}},
+        {'created_at': '2016-10-18T12:05:00Z', 'uploaderBattery': 80},
+    ]
+    assert find(statuses, {
+        'find[$or][0][uploaderBattery][$exists]': 'true',
+        'find[$or][1][uploader][$exists]': 'true',
+    }, 'created_at') == statuses[2:]
+    assert find(statuses, {
+        'find[loop][$exists]': 'true',
+        'find[loop.failureReason][$not][$exists]': 'true',
+    }, 'created_at') == statuses[1:2]
+    assert find(statuses, {'find[loop.enacted][$exists]': 'true'}, 'created_at') == statuses[1:2]
+
+def test_collection_without_time_field_keeps_order():
+    profiles = [{'name': 'a'}, {'name': 'b'}]
+    assert find(profiles, {}) == profiles
+    assert find(profiles, {'count': '1'}) == profiles[:1]
@@ -0,0 +1,85 @@
+import time
+import urlparse
+
+from nightscout_query import IndexedCollection
+from nightscout_query import TIME_FIELDS
+from nightscout_query import parse_query as _parse_query
+from nightscout_recording import load
+from nightscout_recording import write
+
+NOW = 1476817200000
+MINUTE = 60 * 1000
+
+DATA = {
+    'entries': [
+        {'type': 'sgv', 'date': NOW - i * 5 * MINUTE, 'sgv': 100 + i, 'direction': 'Flat' if i % 2 else 'FortyFiveUp'}
+        for i in range(20)
+    ] + [
+        {'type': 'mbg', 'date': NOW - 7 * MINUTE, 'mbg': 104.5},
+    ],
+    'treatments': [
+        {'created_at': '2016-10-18T19:00:00Z', 'insulin': 1.5, 'notes': u'caf\xe9'},
+        {'created_at': '2016-10-18T11:50:00-07:00', 'carbs': 30, 'insulin': None},
+        {'created_at': '2016-10-18T18:40:00.250Z', 'eventType': 'Temp Basal', 'absolute': 0.5, 'duration': 30},
+    ],
+    'devicestatus': [
+        {'created_at': '2016-10-18T19:00:00.000Z', 'uploaderBattery': 60, 'loop': {'iob': {'iob': 1.25}, 'enacted': {}}},
+        {'created_at': '2016-10-18T18:55:00.000Z', 'uploaderBattery': 61, 'loop': {'iob': {'iob': 1.5}, 'recommended': [1, 2]}},
+    ],
+    'profile': [
+        {'defaultProfile': 'a', 'store': {'a': {'basal': [{'time': '00:00', 'value': 0.8}]}}},
+        {'defaultProfile': 'b'},
+    ],
+}
+
+QUERIES = [
+    '',
+    'count=5',
+    'count=3&find[type]=sgv',
+    'find[date][$gte]={}'.format(NOW - 30 * MINUTE),
+    'find[created_at][$gte]=2016-10-18T18:50:00Z',
+    'find[sgv][$lt]=105&find[date][$lte]={}'.format(NOW - 10 * MINUTE),
+]
+
+
+def parse_query(query_string):
+    return _parse_query(dict(urlparse.parse_qsl(query_string)))
+
+def test_recording_is_queried_like_the_original_data(tmpdir):
+    write(DATA, str(tmpdir))
+    recording = load(str(tmpdir))
+    assert sorted(recording.keys()) == sorted(DATA.keys())
+    for coll, elements in DATA.items():
+        original = IndexedCollection(elements, TIME_FIELDS.get(coll))
+        for query in QUERIES:
+            expected = original.find(parse_query(query))
+            actual = recording[coll].find(parse_query(query))
+            if coll in ('treatments', 'devicestatus'):
+                # Times come back as UTC strings, so compare the rest of each element
+                expected = [dict(e, created_at=None) for e in expected]
+                actual = [dict(e, created_at=None) for e in actual]
+            assert actual == expected, (coll, query)
+
+def test_iso_times_are_normalized_to_utc(tmpdir):
+    write(DATA, str(tmpdir))
+    treatments = load(str(tmpdir))['treatments'].find({})
+    assert [t['created_at'] for t in treatments] == [
+        '2016-10-18T19:00:00.000Z',
+        '2016-10-18T18:50:00.000Z',
+        '2016-10-18T18:40:00.250Z',
+    ]
+
+def test_shift_to_now_moves_every_time(tmpdir):
+    write(DATA, str(tmpdir))
+    before = time.time() * 1000
+    recording = load(str(tmpdir), shift_to_now=True)
+    after = time.time() * 1000
+
+    entries = recording['entries'].find(parse_query('count=2'))
+    assert before <= entries[0]['date'] <= after
+    assert entries[0]['date'] - entries[1]['date'] == 5 * MINUTE
+    shift = entries[0]['date'] - NOW
+
+    treatment = recording['treatments'].find(parse_query('count=1'))[0]
+    assert abs(IndexedCollection([treatment], 'created_at').times[0] - (NOW + shift)) < 1000
+    assert recording['entries'].find(parse_query('find[date][$gte]={}'.format(int(NOW + shift - 6 * MINUTE)))) == entries
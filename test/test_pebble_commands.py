@@ -0,0 +1,88 @@
+import json
+import subprocess
+
+import pytest
+from libpebble2.exceptions import ConnectionError
+
+import pebble_commands
+
+
+class FakeWorker(object):
+    def __init__(self, home_dir, emulator_info):
+        self.home_dir = home_dir
+        self._emulator_info = emulator_info
+
+    def emulator_info(self):
+        return self._emulator_info
+
+def install_sdk(sdk_dir, version):
+    core = sdk_dir.ensure('SDKs', version, 'sdk-core', dir=True)
+    core.join('manifest.json').write(json.dumps({'version': version}))
+    sdk_dir.join('SDKs', 'current').mksymlinkto(core.dirpath())
+
+def test_kill_stops_every_emulator_process():
+    procs = [subprocess.Popen(['sleep', '60']) for _ in range(3)]
+    worker = FakeWorker(None, {
+        'aplite': {'4.3': {'qemu': {'pid': procs[0].pid, 'port': 1}, 'pypkjs': {'pid': procs[1].pid, 'port': 2}}},
+        # Already gone
+        'basalt': {'4.3': {'qemu': {'pid': procs[2].pid, 'port': 3}, 'pypkjs': {'pid': 999999, 'port': 4}}},
+    })
+    procs[2].kill()
+    procs[2].wait()
+
+    pebble_commands.kill(worker)
+    assert not any(pebble_commands._is_alive(p.pid) for p in procs)
+
+def test_wipe_only_erases_the_current_sdks_storage(tmpdir):
+    sdk_dir = tmpdir.mkdir('.pebble-sdk')
+    install_sdk(sdk_dir, '4.3')
+    sdk_dir.mkdir('4.3').mkdir('basalt').join('qemu_spi_flash.bin').write('flash')
+    sdk_dir.mkdir('4.2').mkdir('basalt').join('qemu_spi_flash.bin').write('flash')
+    sdk_dir.join('settings.json').write('{}')
+
+    pebble_commands.wipe(FakeWorker(str(tmpdir), {}))
+    assert sorted(p.basename for p in sdk_dir.listdir()) == ['4.2', 'SDKs', 'settings.json']
+    assert sdk_dir.join('SDKs', '4.3', 'sdk-core').check(dir=True)
+
+def test_failed_connections_fall_back_to_the_cli(monkeypatch):
+    class Disconnected(object):
+        platform = 'basalt'
+        def install(self, pbw_filename):
+            raise ConnectionError('Connection refused')
+    commands = []
+    monkeypatch.setattr(pebble_commands, '_run_cli', lambda command_str, **kwargs: commands.append((command_str, kwargs)))
+
+    pebble_commands.install(Disconnected(), '/project/build/urchin.pbw')
+    assert commands == [('pebble install /project/build/urchin.pbw --emulator basalt', {'cwd': pebble_commands.PROJECT_DIR})]
+
+def test_other_errors_are_raised(monkeypatch):
+    class Broken(object):
+        platform = 'basalt'
+        def install(self, pbw_filename):
+            raise KeyError('status')
+    commands = []
+    monkeypatch.setattr(pebble_commands, '_run_cli', lambda command_str, **kwargs: commands.append((command_str, kwargs)))
+
+    with pytest.raises(KeyError):
+        pebble_commands.install(Broken(), '/project/build/urchin.pbw')
+    assert commands == []
+
+def test_restoring_storage_undoes_later_changes(tmpdir):
+    sdk_dir = tmpdir.mkdir('.pebble-sdk')
+    install_sdk(sdk_dir, '4.3')
+    flash = sdk_dir.mkdir('4.3').mkdir('basalt').join('qemu_spi_flash.bin')
+    flash.write('installed')
+    other_version = sdk_dir.mkdir('4.2').join('settings.json')
+    other_version.write('{}')
+    worker = FakeWorker(str(tmpdir), {})
+    snapshot = str(tmpdir.join('snapshot'))
+
+    pebble_commands.save_storage(worker, snapshot)
+    flash.write('flaky')
+    sdk_dir.join('4.3').mkdir('chalk')
+    other_version.write('changed')
+    pebble_commands.restore_storage(worker, snapshot)
+
+    assert sorted(p.basename for p in sdk_dir.join('4.3').listdir()) == ['basalt']
+    assert flash.read() == 'installed'
+    assert other_version.read() == 'changed'
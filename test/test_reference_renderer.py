@@ -0,0 +1,56 @@
+"""
+Check the reference renderer against the gold images, without an emulator.
+"""
+
+import numpy as np
+import pytest
+
+from gold_store import GoldStore
+from reference_renderer import PLATFORMS
+from reference_renderer import count_mismatches
+from reference_renderer import coverage
+from reference_renderer import render_scenario
+from screenshot_scenarios import scenarios
+
+# How much of the frame is modelled, just below what it is now, so that modelling less fails:
+# 17.0% for the least modelled case, and 35.1% on average
+MIN_COVERAGE = 0.169
+MIN_MEAN_COVERAGE = 0.35
+
+# Gold images taken while the JS halved SGVs, whose modelled pixels have
+# changed since, and which have yet to be retaken on the emulator. The others
+# were updated from this renderer where it models every pixel which changed.
+STALE_GOLD = set([
+    'TestLayoutC', 'TestNiceLayout', 'TestNotRecentButNotYetStaleBGRow', 'TestRecencyLargePieGraphBottomLeft',
+    'TestTrimmingValues',
+])
+
+GOLD_STORE = GoldStore()
+SCENARIOS = [cls for cls in scenarios() if cls.gold_name(PLATFORMS[0]) in GOLD_STORE]
+
+@pytest.mark.parametrize('scenario_class', [
+    pytest.param(cls, id=cls.__name__, marks=pytest.mark.xfail(strict=True, reason='gold image predates full-resolution SGVs'))
+    if cls.__name__ in STALE_GOLD else pytest.param(cls, id=cls.__name__)
+    for cls in SCENARIOS
+])
+@pytest.mark.parametrize('platform', PLATFORMS)
+def test_render_matches_gold(scenario_class, platform):
+    pixels, modelled = render_scenario(scenario_class, platform)
+    mismatches = count_mismatches(pixels, modelled, GOLD_STORE.frame(scenario_class.gold_name(platform)), platform)
+    summary = '{} pixels differ; {:.1%} of the frame is modelled'.format(mismatches, coverage(modelled))
+    assert mismatches == 0, summary
+    assert coverage(modelled) >= MIN_COVERAGE, summary
+
+def test_mean_coverage():
+    fractions = [coverage(render_scenario(cls, platform)[1]) for cls in SCENARIOS for platform in PLATFORMS]
+    assert sum(fractions) / len(fractions) >= MIN_MEAN_COVERAGE
+
+@pytest.mark.parametrize('platform', PLATFORMS)
+def test_wrong_colors_dont_match(platform):
+    scenario_class = SCENARIOS[0]
+    pixels, modelled = render_scenario(scenario_class, platform)
+    gold = GOLD_STORE.frame(scenario_class.gold_name(platform))
+    assert count_mismatches(255 - pixels, modelled, gold, platform) > 0
+    # Colors which are right once corrected aren't right before
+    if platform != 'aplite':
+        assert np.any(pixels[modelled] != gold[modelled])
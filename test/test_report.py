@@ -0,0 +1,49 @@
+import os
+
+from report import ResultsFile
+from report import load_results
+from report import render
+
+
+def result(name, passed, time):
+    return {
+        'name': name,
+        'platform': 'basalt',
+        'doc': 'Checks <things>',
+        'passed': passed,
+        'image': 'img/{}-basalt.png'.format(name),
+        'diff': None if passed else 'diff/{}-basalt.png'.format(name),
+        'details': ['{"sgv": 100}', '1x /api/v1/entries.json\n2x /api/v1/treatments.json'],
+        'time': time,
+    }
+
+def write_results(out_dir):
+    ResultsFile(str(out_dir.join('results.jsonl'))).append(result('TestA', True, 1))
+    ResultsFile(str(out_dir.join('results.jsonl'))).append(result('TestB', False, 3))
+    worker = ResultsFile(str(out_dir.join('results-worker1.jsonl')))
+    worker.append(result('TestC', True, 2))
+    worker.append(result('TestD', True, 4))
+
+def test_results_from_every_process_are_loaded_failures_first(tmpdir):
+    write_results(tmpdir)
+    assert [r['name'] for r in load_results(str(tmpdir))] == ['TestB', 'TestA', 'TestC', 'TestD']
+
+def test_report_is_paginated(tmpdir):
+    write_results(tmpdir)
+    assert render(str(tmpdir), {'mmol': False}, page_size=3) == 4
+
+    first = tmpdir.join('screenshots.html').read()
+    second = tmpdir.join('screenshots-2.html').read()
+    assert '1 failed, 3 passed.' in first
+    assert first.index('TestB') < first.index('TestA') < first.index('TestC')
+    assert '<img src="diff/TestB-basalt.png">' in first
+    assert 'TestD' not in first and 'TestD' in second
+    assert '<a href="screenshots-2.html">2</a>' in first
+    assert '<a href="screenshots.html">1</a>' in second
+    assert 'Checks &lt;things&gt;' in first
+    assert '{&quot;mmol&quot;: false}' not in first and '{"mmol": false}' in first
+    assert not [f for f in os.listdir(str(tmpdir)) if f.endswith('.tmp')]
+
+def test_empty_report(tmpdir):
+    assert render(str(tmpdir), {}) == 0
+    assert '0 failed, 0 passed.' in tmpdir.join('screenshots.html').read()
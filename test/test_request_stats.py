@@ -0,0 +1,27 @@
+from request_stats import RequestStats
+from request_stats import format_stats
+
+
+def test_requests_are_grouped_by_path_normalized_query_and_status():
+    stats = RequestStats()
+    stats.record('/api/v1/entries/sgv.json', {'count': '10', '_': '1'}, 200, 100, 0.001)
+    stats.record('/api/v1/entries/sgv.json', {'count': '10', '_': '2'}, 200, 100, 0.003)
+    stats.record('/api/v1/entries/sgv.json', {'count': '10', '_': '3'}, 503, 0, 0.001)
+    stats.record('/api/v1/devicestatus.json', {}, 200, 20, 0.001)
+    assert stats.to_json() == [
+        {'path': '/api/v1/entries/sgv.json', 'query': {'count': '10'}, 'status': 200, 'count': 2, 'bytes': 200, 'seconds': 0.004},
+        {'path': '/api/v1/devicestatus.json', 'query': {}, 'status': 200, 'count': 1, 'bytes': 20, 'seconds': 0.001},
+        {'path': '/api/v1/entries/sgv.json', 'query': {'count': '10'}, 'status': 503, 'count': 1, 'bytes': 0, 'seconds': 0.001},
+    ]
+    assert format_stats(stats.to_json()) == [
+        '2x /api/v1/entries/sgv.json?count=10 (200): 200 bytes, 4.0ms',
+        '1x /api/v1/devicestatus.json (200): 20 bytes, 1.0ms',
+        '1x /api/v1/entries/sgv.json?count=10 (503): 0 bytes, 1.0ms',
+        'total: 4 requests, 220 bytes',
+    ]
+
+def test_reset():
+    stats = RequestStats()
+    stats.record('/api/v1/profile.json', {}, 200, 10, 0.001)
+    stats.reset()
+    assert stats.to_json() == []
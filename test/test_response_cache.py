@@ -0,0 +1,48 @@
+from response_cache import ResponseCache
+
+
+def test_least_recently_used_responses_are_evicted():
+    cache = ResponseCache(max_size=2)
+    cache.get('entries', {'count': '1'}, lambda: 'one')
+    cache.get('entries', {'count': '2'}, lambda: 'two')
+    # Used, so no longer the least recent
+    assert cache.get('entries', {'count': '1'}, lambda: 'recomputed') == 'one'
+    cache.get('entries', {'count': '3'}, lambda: 'three')
+
+    assert cache.get('entries', {'count': '1'}, lambda: 'recomputed') == 'one'
+    assert cache.get('entries', {'count': '2'}, lambda: 'recomputed') == 'recomputed'
+    assert cache.to_json() == {'hits': 2, 'misses': 4, 'entries': 2}
+
+def test_queries_are_the_same_whatever_their_order_or_cache_buster():
+    cache = ResponseCache()
+    cache.get('entries', {'count': '1', 'find[type]': 'sgv', '_': '123'}, lambda: 'body')
+    assert cache.get('entries', {'find[type]': 'sgv', 'count': '1', '_': '456'}, lambda: 'recomputed') == 'body'
+
+def test_invalidating_a_collection_leaves_the_others():
+    cache = ResponseCache()
+    cache.get('entries', {}, lambda: 'old entries')
+    cache.get('treatments', {}, lambda: 'treatments')
+    cache.invalidate('entries')
+    assert cache.get('entries', {}, lambda: 'new entries') == 'new entries'
+    assert cache.get('treatments', {}, lambda: 'recomputed') == 'treatments'
+
+def test_a_response_computed_during_a_set_is_not_stored():
+    cache = ResponseCache()
+    def compute_then_set():
+        # The collection is set after the old data was read, but before the response is stored
+        cache.invalidate('entries')
+        return 'old entries'
+    assert cache.get('entries', {}, compute_then_set) == 'old entries'
+    assert cache.get('entries', {}, lambda: 'new entries') == 'new entries'
+
+def test_missing_collections_are_not_stored():
+    cache = ResponseCache()
+    assert cache.get('nothing', {}, lambda: None) is None
+    assert cache.to_json()['entries'] == 0
+
+def test_counts_can_be_reset():
+    cache = ResponseCache()
+    cache.get('entries', {}, lambda: 'body')
+    cache.get('entries', {}, lambda: 'body')
+    cache.reset_counts()
+    assert cache.to_json() == {'hits': 0, 'misses': 0, 'entries': 1}
@@ -0,0 +1,59 @@
+import json
+import os
+import time
+import zipfile
+
+from result_cache import ResultCache
+from result_cache import normalize_times
+from result_cache import pbw_hash
+from result_cache import time_of_day
+
+
+def test_times_are_relative_and_rounded():
+    now = 1476800000000
+    data = [
+        {'date': now - 5 * 60 * 1000 + 700, 'sgv': 100},
+        {'created_at': '2016-10-18T14:10:00Z', 'insulin': 1, 'note': '2016'},
+        {'loop': {'timestamp': '2016-10-18T14:13:20.400Z'}},
+    ]
+    assert normalize_times(data, now) == [
+        {'date': {'ago': 300000}, 'sgv': 100},
+        {'created_at': {'ago': 200000}, 'insulin': 1, 'note': '2016'},
+        {'loop': {'timestamp': {'ago': 0}}},
+    ]
+
+def test_time_of_day_is_local_and_rounded(monkeypatch):
+    monkeypatch.setenv('TZ', 'America/Los_Angeles')
+    time.tzset()
+    try:
+        # 2016-10-18T14:13:24.600Z, 07:13:24.600 in Los Angeles
+        assert time_of_day(1476800004600) == (7 * 60 * 60 + 13 * 60 + 20) * 1000
+        # Rounded up past midnight
+        assert time_of_day(1476860399000) == 0
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+def write_pbw(filename, generated_at, binary):
+    with zipfile.ZipFile(filename, 'w') as pbw:
+        pbw.writestr('basalt/manifest.json', json.dumps({'generatedAt': generated_at, 'application': {'size': 3}}))
+        pbw.writestr('basalt/pebble-app.bin', binary)
+        pbw.writestr('basalt/app_resources.pbpack', '\1\0\0\0crc!' + str(generated_at)[-4:] + 'resources')
+
+def test_pbw_hash_ignores_build_time(tmpdir):
+    a, b, c = [str(tmpdir.join(name)) for name in ['a.pbw', 'b.pbw', 'c.pbw']]
+    write_pbw(a, 1476800000, 'abc')
+    write_pbw(b, 1476899999, 'abc')
+    write_pbw(c, 1476800000, 'abd')
+    assert pbw_hash(a) == pbw_hash(b)
+    assert pbw_hash(a) != pbw_hash(c)
+
+def test_cache_stores_screenshots_by_key(tmpdir):
+    cache = ResultCache(str(tmpdir.join('cache')))
+    screenshot = tmpdir.join('screenshot.png')
+    screenshot.write('png')
+    assert cache.lookup('abc') is None
+    cache.store('abc', str(screenshot))
+    assert open(cache.lookup('abc')).read() == 'png'
+    assert os.listdir(cache.dirname) == ['abc.png']
+    assert ResultCache(None).lookup('abc') is None
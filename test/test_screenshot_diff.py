@@ -0,0 +1,82 @@
+import threading
+
+import numpy as np
+
+from screenshot_diff import BAND_HEIGHT
+from screenshot_diff import ImageWriter
+from screenshot_diff import count_differing_pixels
+from screenshot_diff import frames_match
+from screenshot_diff import ignore_mask
+from screenshot_diff import load_image
+
+RED = (255, 0, 0)
+
+
+def blank():
+    return np.zeros((168, 144, 3), dtype=np.uint8)
+
+
+def test_image_writer_saves_in_the_background(tmpdir):
+    pixels = np.zeros((168, 144, 3), dtype=np.uint8)
+    pixels[10:20, 30:40] = (255, 0, 0)
+    written = []
+    writer = ImageWriter()
+    for name in ['a', 'b']:
+        writer.write(pixels, str(tmpdir.join(name + '.png')), lambda name=name: written.append(name))
+    writer.wait()
+
+    assert written == ['a', 'b']
+    assert (load_image(str(tmpdir.join('b.png'))) == pixels).all()
+
+def test_image_writer_stops_its_thread_when_closed(tmpdir):
+    writer = ImageWriter()
+    writer.write(blank(), str(tmpdir.join('a.png')))
+    thread_count = threading.active_count()
+    writer.close()
+
+    assert tmpdir.join('a.png').check()
+    assert threading.active_count() < thread_count
+
+def test_frames_match_within_tolerance(tmpdir):
+    diff_file = str(tmpdir.join('diff.png'))
+    test = blank()
+    test[5, 0:3] = (255, 255, 255)
+    assert frames_match(test, blank(), diff_file, tolerance=3)
+    assert not frames_match(test, blank(), diff_file, tolerance=2)
+
+def test_frames_match_outside_ignored_regions(tmpdir):
+    diff_file = str(tmpdir.join('diff.png'))
+    test = blank()
+    test[10:20, 30:40] = (255, 255, 255)
+    assert frames_match(test, blank(), diff_file, ignore_regions=[(30, 10, 10, 10)])
+    assert not frames_match(test, blank(), diff_file, ignore_regions=[(30, 10, 10, 9)])
+
+    mask = ignore_mask(test.shape, [(30, 10, 10, 9)])
+    assert count_differing_pixels(test, blank(), mask) == 10
+
+def test_counting_stops_once_over_the_limit():
+    test = blank()
+    test[:, 0] = (255, 255, 255)
+    assert count_differing_pixels(test, blank()) == 168
+    # The first band is already over, so the rest aren't counted
+    assert count_differing_pixels(test, blank(), limit=1) == BAND_HEIGHT
+
+def test_diff_is_only_written_on_failure(tmpdir):
+    diff_file = tmpdir.join('diff.png')
+    test = blank()
+    test[10:20, 30:40] = (255, 255, 255)
+    assert frames_match(test, test.copy(), str(diff_file))
+    assert not diff_file.exists()
+
+    assert not frames_match(test, blank(), str(diff_file))
+    diff = load_image(str(diff_file))
+    assert (diff[10:20, 30:40] == RED).all()
+    assert (diff == RED).all(axis=2).sum() == 100
+
+def test_diff_is_written_if_sizes_differ(tmpdir):
+    diff_file = tmpdir.join('diff.png')
+    assert not frames_match(blank()[:160], blank(), str(diff_file))
+    diff = load_image(str(diff_file))
+    assert diff.shape == (168, 144, 3)
+    assert (diff[160:] == RED).all()
+    assert not (diff[:160] == RED).all(axis=2).any()
@@ -0,0 +1,169 @@
+import json
+import os
+
+import pytest
+from tornado.testing import AsyncHTTPTestCase
+
+import server
+from nightscout_store import COLLECTIONS
+
+
+SGVS = [{'type': 'sgv', 'sgv': 100 + i, 'date': 1476000000000 - 300000 * i} for i in range(10)]
+
+
+def reset_server():
+    for coll in COLLECTIONS:
+        server.store.set(coll, [])
+        server.response_cache.invalidate(coll)
+    server.store.set('entries', SGVS)
+    server.impairments.set({})
+    server.reset_stats_json()
+    server.latency_stats.report()
+
+@pytest.fixture
+def client():
+    reset_server()
+    return server.app.test_client()
+
+def _stats(client):
+    return json.loads(client.get('/stats').data)['requests']
+
+def test_stats_count_every_request_the_client_makes(client):
+    client.get('/api/v1/entries/sgv.json?count=2')
+    client.get('/api/v1/entries/sgv.json?count=2')
+    # Not served by the mock, but still made
+    assert client.get('/api/v1/entries/cal.json?count=1').status_code == 404
+    assert [(s['path'], s['query'], s['status'], s['count']) for s in _stats(client)] == [
+        ('/api/v1/entries/sgv.json', {'count': '2'}, 200, 2),
+        ('/api/v1/entries/cal.json', {'count': '1'}, 404, 1),
+    ]
+
+def test_stats_leave_out_requests_controlling_the_server(client):
+    client.post('/set-entries', data='[]')
+    client.post('/impair', data='{}')
+    client.get('/clock')
+    client.get('/stats')
+    assert _stats(client) == []
+
+def test_stats_count_requests_failed_by_impairment(client):
+    client.post('/impair', data=json.dumps({'*': {'error_rate': 1, 'error_status': 503}}))
+    # The client retries the failing request
+    for _ in range(3):
+        assert client.get('/api/v1/entries/sgv.json?count=2').status_code == 503
+    client.post('/impair', data='{}')
+    assert client.get('/api/v1/entries/sgv.json?count=2').status_code == 200
+    assert [(s['status'], s['count']) for s in _stats(client)] == [(503, 3), (200, 1)]
+    assert len(server.latency_stats.latencies) == 4
+
+def test_stats_count_a_slowed_body_once_it_is_sent(client):
+    client.post('/impair', data=json.dumps({'*': {'bandwidth_bps': 1000000}}))
+    response = client.get('/api/v1/entries/sgv.json?count=2', buffered=True)
+    stats = _stats(client)
+    assert [(s['status'], s['count'], s['bytes']) for s in stats] == [(200, 1, len(response.data))]
+
+def test_bad_queries_are_rejected_with_the_reason(client):
+    response = client.get('/api/v1/entries/sgv.json?find[sgv][$regex]=1')
+    assert response.status_code == 400
+    assert 'Unsupported query operator: $regex' in response.data
+    response = client.get('/api/v1/treatments.json?count=ten')
+    assert response.status_code == 400
+    assert 'count must be a whole number: ten' in response.data
+
+def test_stats_include_the_response_cache(client):
+    client.get('/api/v1/entries/sgv.json?count=2')
+    client.get('/api/v1/entries/sgv.json?count=2&_=1')
+    client.post('/set-entries', data='[]')
+    client.get('/api/v1/entries/sgv.json?count=2')
+    assert json.loads(client.get('/stats').data)['cache'] == {'hits': 1, 'misses': 2, 'entries': 1}
+
+    client.post('/stats/reset')
+    assert json.loads(client.get('/stats').data)['cache'] == {'hits': 0, 'misses': 0, 'entries': 1}
+
+
+class TestTornado(AsyncHTTPTestCase):
+    def get_app(self):
+        reset_server()
+        return server.make_async_app()
+
+    def get_json(self, path):
+        response = self.fetch(path)
+        self.assertEqual(response.code, 200)
+        return json.loads(response.body)
+
+    def test_set_then_query_a_collection(self):
+        self.assertEqual(self.fetch('/set-treatments', method='POST', body='[{"insulin": 1}]').code, 200)
+        self.assertEqual(self.get_json('/api/v1/treatments.json'), [{'insulin': 1}])
+        self.assertEqual(self.fetch('/set-nothing', method='POST', body='[]').code, 404)
+
+        sgvs = self.get_json('/api/v1/entries/sgv.json?count=3&find[sgv][$gte]=105')
+        self.assertEqual([e['sgv'] for e in sgvs], [105, 106, 107])
+
+    def test_filter_treatments_as_the_watchface_queries_them(self):
+        temp_basal = {'eventType': 'Temp Basal', 'duration': 30}
+        self.fetch('/set-treatments', method='POST', body=json.dumps([{'insulin': 1}, temp_basal]))
+        self.assertEqual(self.get_json('/api/v1/treatments.json?find[eventType]=Temp%20Basal'), [temp_basal])
+        self.assertEqual(self.get_json('/api/v1/treatments.json?find[insulin][$exists]=true'), [{'insulin': 1}])
+
+    def test_unknown_collections_are_not_found(self):
+        self.assertEqual(self.fetch('/api/v1/nothing.json').code, 404)
+
+    def test_impairments_apply_to_the_collections_they_name(self):
+        rules = json.dumps({'entries': {'error_rate': 1, 'error_status': 503}})
+        self.assertEqual(self.fetch('/impair', method='POST', body=rules).code, 200)
+        self.assertEqual(self.get_json('/impair')['entries']['error_status'], 503)
+        self.assertEqual(self.fetch('/api/v1/entries/sgv.json').code, 503)
+        self.assertEqual(self.fetch('/api/v1/treatments.json').code, 200)
+
+        response = self.fetch('/impair', method='POST', body='{"entries": {"speed": 1}}')
+        self.assertEqual(response.code, 400)
+        self.assertIn('speed', response.body)
+
+    def test_bad_queries_are_rejected_with_the_reason(self):
+        response = self.fetch('/api/v1/entries/sgv.json?find[sgv][$regex]=1')
+        self.assertEqual(response.code, 400)
+        self.assertIn('Unsupported query operator: $regex', response.body)
+        response = self.fetch('/api/v1/treatments.json?count=ten')
+        self.assertEqual(response.code, 400)
+        self.assertIn('count must be a whole number: ten', response.body)
+
+    def test_stats_count_requests_by_status(self):
+        self.fetch('/api/v1/entries/sgv.json?count=2')
+        self.fetch('/api/v1/entries/sgv.json?count=2')
+        self.fetch('/api/v1/entries/cal.json?count=1')
+        self.fetch('/set-entries', method='POST', body='[]')
+        stats = self.get_json('/stats')
+        self.assertEqual([(s['path'], s['status'], s['count']) for s in stats['requests']], [
+            ('/api/v1/entries/sgv.json', 200, 2),
+            ('/api/v1/entries/cal.json', 404, 1),
+        ])
+        self.assertEqual(stats['cache'], {'hits': 1, 'misses': 1, 'entries': 0})
+
+        self.assertEqual(self.fetch('/stats/reset', method='POST', body='').code, 200)
+        self.assertEqual(self.get_json('/stats')['requests'], [])
+
+def test_scenarios_reload_only_when_their_source_changes(tmpdir, monkeypatch):
+    source = tmpdir.join('scenarios_under_test.py')
+    source.write('class TestA(object):\n    sgv = 100\n')
+    mtime = 1476000000
+    os.utime(str(source), (mtime, mtime))
+    monkeypatch.syspath_prepend(str(tmpdir))
+    monkeypatch.setattr('sys.dont_write_bytecode', True)
+    import scenarios_under_test
+    loader = server.ScenarioLoader(scenarios_under_test)
+
+    first = loader.get('TestA')
+    assert loader.get('TestA') is first
+
+    # Changed, but within the same mtime, as far as the loader can tell
+    source.write('class TestA(object):\n    sgv = 200\n')
+    os.utime(str(source), (mtime, mtime))
+    assert loader.get('TestA') is first
+
+    os.utime(str(source), (mtime + 10, mtime + 10))
+    second = loader.get('TestA')
+    assert second.sgv == 200
+    assert loader.get('TestA') is second
+
+    # Touched without being changed
+    os.utime(str(source), (mtime + 20, mtime + 20))
+    assert loader.get('TestA') is not second
@@ -0,0 +1,49 @@
+import calendar
+from datetime import datetime
+
+import numpy as np
+
+from synthetic_data import ERROR_CODES
+from synthetic_data import NOT_COMPUTABLE
+from synthetic_data import SGV_INTERVAL_MS
+from synthetic_data import generate
+
+END_MS = 1476000000000
+DAYS = 3
+
+
+def epoch_ms(iso_date):
+    return 1000 * calendar.timegm(datetime.strptime(iso_date, '%Y-%m-%dT%H:%M:%SZ').timetuple())
+
+def test_entries_are_newest_first_and_5_minutes_apart_except_for_gaps():
+    entries = generate(DAYS, END_MS, seed=1)['entries']
+    dates = np.array([e['date'] for e in entries])
+    assert dates[0] == END_MS
+    assert dates[-1] >= END_MS - DAYS * 24 * 60 * 60 * 1000
+    steps = -np.diff(dates)
+    assert (steps % SGV_INTERVAL_MS == 0).all()
+    assert steps.min() == SGV_INTERVAL_MS
+    # Gaps are an hour at most
+    assert steps.max() <= 13 * SGV_INTERVAL_MS
+    assert (steps > SGV_INTERVAL_MS).any()
+
+def test_sgvs_are_in_range_or_error_codes():
+    entries = generate(DAYS, END_MS, seed=1)['entries']
+    errors = [e for e in entries if e['direction'] == NOT_COMPUTABLE[0]]
+    readings = [e for e in entries if e['direction'] != NOT_COMPUTABLE[0]]
+    assert errors and all(e['sgv'] in ERROR_CODES for e in errors)
+    assert all(40 <= e['sgv'] <= 400 for e in readings)
+    assert all(0 < e['trend'] < 8 for e in readings)
+
+def test_treatments_and_devicestatus_are_newest_first_within_the_history():
+    data = generate(DAYS, END_MS, seed=1)
+    for coll in ['treatments', 'devicestatus']:
+        dates = [epoch_ms(e['created_at']) for e in data[coll]]
+        assert dates == sorted(dates, reverse=True)
+        assert END_MS - DAYS * 24 * 60 * 60 * 1000 <= dates[-1] and dates[0] <= END_MS
+    assert all(0 < t['insulin'] for t in data['treatments'] if 'insulin' in t)
+    assert all(0 <= t['absolute'] <= 2 for t in data['treatments'] if 'absolute' in t)
+
+def test_a_seed_gives_the_same_history():
+    assert generate(1, END_MS, seed=2) == generate(1, END_MS, seed=2)
+    assert generate(1, END_MS, seed=2) != generate(1, END_MS, seed=3)
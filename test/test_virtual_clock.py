@@ -0,0 +1,89 @@
+import time
+
+import pytest
+
+from nightscout_query import IndexedCollection
+from nightscout_query import parse_query
+from virtual_clock import VirtualClock
+from virtual_clock import parse
+from virtual_clock import query_in_virtual_time
+from virtual_clock import shift_times
+
+START = 1476817200.0
+MINUTE_MS = 60 * 1000
+
+
+def test_frozen_clock_stands_still_until_advanced():
+    clock = parse('frozen@2016-10-18T19:00:00Z')
+    assert clock.now() == START
+    time.sleep(0.01)
+    assert clock.now_ms() == START * 1000
+    clock.advance(300)
+    assert clock.now() == START + 300
+    assert not clock.is_real()
+
+def test_fast_clock_runs_at_its_rate():
+    clock = VirtualClock()
+    clock.set(START, rate=60, real_start=time.time() - 2)
+    assert START + 120 <= clock.now() < START + 130
+
+def test_unset_clock_is_real_time():
+    clock = parse('')
+    assert clock.is_real()
+    assert abs(clock.now() - time.time()) < 1
+
+@pytest.mark.parametrize('spec', ['slow', 'x', 'x-2', 'frozen@yesterday'])
+def test_bad_specs_are_rejected(spec):
+    with pytest.raises(ValueError):
+        parse(spec)
+
+def test_update_from_json():
+    clock = VirtualClock()
+    clock.update({'time': '2016-10-18T19:00:00Z', 'rate': 0})
+    assert clock.to_json() == {'time': START * 1000, 'rate': 0, 'shift_ms': 0}
+    clock.update({'advance_ms': 5 * MINUTE_MS})
+    assert clock.now_ms() == START * 1000 + 5 * MINUTE_MS
+    clock.update({})
+    assert clock.is_real()
+    for bad in [[], {'rate': -1}, {'rate': '2'}, {'time': 'soon'}, {'speed': 2}]:
+        with pytest.raises(ValueError):
+            clock.update(bad)
+
+def test_queries_are_moved_back_and_limited_to_the_virtual_time():
+    clock = VirtualClock()
+    clock.set(START, rate=0, shift=True, real_start=START + 3600)
+    query = query_in_virtual_time({
+        'count': '10',
+        'find[date][$gt]': str(int((START + 3600) * 1000 - 20 * MINUTE_MS)),
+        'find[sgv][$gt]': '100',
+    }, 'date', clock)
+    assert query == {
+        'count': '10',
+        'find[date][$gt]': str(int(START * 1000 - 20 * MINUTE_MS)),
+        'find[date][$lte]': str(int(START * 1000)),
+        'find[sgv][$gt]': '100',
+    }
+    assert query_in_virtual_time({'count': '1'}, None, clock) == {'count': '1'}
+
+def test_served_data_is_as_old_in_real_time_as_in_virtual_time():
+    clock = VirtualClock()
+    clock.set(START, rate=0, shift=True, real_start=START + 3600)
+    entries = IndexedCollection([
+        {'date': START * 1000 + i * 5 * MINUTE_MS, 'sgv': 100 + i} for i in range(-3, 3)
+    ], 'date')
+
+    served = shift_times(entries.find(parse_query(query_in_virtual_time({}, 'date', clock))), clock.shift_ms)
+    assert [e['sgv'] for e in served] == [100, 99, 98, 97]
+    assert served[0]['date'] == (START + 3600) * 1000
+
+    # Polling again with the latest served time gets nothing new until the clock moves on
+    since = {'find[date][$gt]': str(served[0]['date'])}
+    assert entries.find(parse_query(query_in_virtual_time(since, 'date', clock))) == []
+    clock.advance(5 * 60)
+    assert [e['sgv'] for e in entries.find(parse_query(query_in_virtual_time(since, 'date', clock)))] == [101]
+
+def test_shift_times_moves_nested_and_iso_times():
+    data = [{'created_at': '2016-10-18T12:00:00-07:00', 'loop': {'timestamp': '2016-10-18T19:05:00Z', 'iob': 1.5}, 'mills': 5}]
+    assert shift_times(data, MINUTE_MS) == [
+        {'created_at': '2016-10-18T19:01:00.000Z', 'loop': {'timestamp': '2016-10-18T19:06:00.000Z', 'iob': 1.5}, 'mills': 60005},
+    ]
@@ -1,67 +1,216 @@
+import atexit
+import functools
 import json
 import os
+import shutil
 import subprocess
 import time
 import urllib2
 from datetime import datetime
+from multiprocessing.pool import ThreadPool
 
 import requests
 from dateutil import parser
 from dateutil.tz import tzlocal
-from libpebble2.communication.transports.websocket import MessageTargetPhone
 from libpebble2.communication.transports.websocket.protocol import AppConfigResponse
 from libpebble2.communication.transports.websocket.protocol import AppConfigSetup
 from libpebble2.communication.transports.websocket.protocol import WebSocketPhonesimAppConfig
-from pebble_tool.sdk.emulator import ManagedEmulatorTransport
 
-PLATFORMS = ('aplite', 'basalt')
-PORT = os.environ.get('MOCK_SERVER_PORT', 5555)
-MOCK_HOST = 'http://localhost:{}'.format(PORT)
+import build_cache
+from emulator_connection import EmulatorConnection
+from emulator_logs import DATA_MESSAGE_SENT
+from emulator_logs import MESSAGE_SENT
+from emulator_logs import PREFERENCES_UPDATED
+from emulator_logs import RENDERED_DATA
+from emulator_logs import REQUEST_ISSUED
+from emulator_pool import EmulatorPool
+from emulator_pool import POOL_SIZE
+from gold_store import GoldStore
+import latency_benchmark
+import message_budget
+import pebble_commands
+import report
+import result_cache
+from request_stats import format_stats
+from result_cache import ResultCache
+import screenshot_diff
+from screenshot_diff import ImageWriter
+from screenshot_scenarios import BASE_CONFIG
+from screenshot_scenarios import Scenario
+from virtual_clock import CLOCK
 
-CONSTANTS = json.loads(
-    open(os.path.join(os.path.dirname(__file__), '../src/js/constants.json')).read()
-)
-BASE_CONFIG = CONSTANTS['DEFAULT_CONFIG']
+PLATFORMS = ('aplite', 'basalt')
+EMULATOR_POOL = EmulatorPool(POOL_SIZE, PLATFORMS)
+GOLD_STORE = GoldStore()
+# Screenshots of passing tests are saved for the report in the background
+IMAGE_WRITER = ImageWriter()
+CONNECTIONS = {}
+
+# How long to wait for the watchface to draw data after an install or config change
+RENDER_TIMEOUT_SECONDS = 30
+RENDER_SETTLE_SECONDS = 0.1
+# How long to wait for the JS to receive config before sending it again
+CONFIG_RETRY_SECONDS = 3
+CONFIG_ATTEMPTS = 3
+# How long to wait for a new frame when benchmarking; consecutive tests may draw the same one
+FRAME_CHANGE_TIMEOUT_SECONDS = 5
+# Between screenshots while waiting for a new frame
+FRAME_POLL_SECONDS = 0.05
+
+# Phases of latency_benchmark.PHASES which are read from the logs, in the order they happen
+LOGGED_PHASES = [
+    ('config_delivered', PREFERENCES_UPDATED),
+    ('fetch_issued', REQUEST_ISSUED),
+    ('message_sent', DATA_MESSAGE_SENT),
+    ('rendered', RENDERED_DATA),
+]
+
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+BUILD_DIR = os.path.join(PROJECT_DIR, 'build')
+
+def mock_host():
+    # The port changes when this process leases a worker from the emulator pool
+    return 'http://localhost:{}'.format(os.environ.get('MOCK_SERVER_PORT', 5555))
 
 def post_mock_server(url, data):
-    requests.post(MOCK_HOST + url, data=json.dumps(data))
-
-def pebble_install_and_run(platforms):
-    _call('pebble kill')
-    _call('pebble clean')
-    # TODO ensure this is called from the main project directory
-    _call('pebble build')
+    requests.post(mock_host() + url, data=json.dumps(data))
+
+def get_mock_server(url):
+    return requests.get(mock_host() + url).json()
+
+def set_mock_server_clock():
+    if CLOCK.is_real():
+        post_mock_server('/clock', {})
+    else:
+        # The JS in the emulator runs on real time, so the server moves the data to be as old to it as in virtual time
+        post_mock_server('/clock', {'time': CLOCK.now_ms(), 'rate': CLOCK.rate, 'shift': True})
+
+def pbw_filename():
+    return os.path.join(BUILD_DIR, next(f for f in os.listdir(BUILD_DIR) if f.endswith('.pbw')))
+
+def pebble_build():
+    env = dict(os.environ)
+    if latency_benchmark.enabled():
+        # Debug builds log each request the JS makes
+        env['DEBUG'] = '1'
+    key = build_cache.build_key(PROJECT_DIR, env)
+    if build_cache.is_built(BUILD_DIR, key):
+        print 'Build inputs unchanged, reusing {}'.format(pbw_filename())
+        return
+    build_cache.forget(BUILD_DIR)
+    # waf rebuilds whatever depends on changed sources, flags or BUILD_ENV/DEBUG, so no need to clean
+    _check_call('pebble build', env=env, cwd=PROJECT_DIR)
+    build_cache.save_key(BUILD_DIR, key)
+
+def connection(platform):
+    if platform not in CONNECTIONS:
+        CONNECTIONS[platform] = EmulatorConnection(platform)
+    return CONNECTIONS[platform]
+
+def for_each_platform(fn, platforms):
+    """Call fn(platform) for every platform concurrently. Returns the results in order."""
+    pool = ThreadPool(len(platforms))
+    try:
+        return pool.map(fn, platforms)
+    finally:
+        pool.close()
+
+def pebble_kill(worker):
+    for conn in CONNECTIONS.values():
+        conn.disconnect()
+    pebble_commands.kill(worker)
+
+def pebble_install_and_run(platforms, worker, app_hash):
+    if worker.installed_app() == app_hash:
+        print 'This build is already running on {}, not reinstalling'.format(worker)
+        return
+    pebble_kill(worker)
+    _install(platforms)
+    worker.set_installed_app(app_hash)
+
+def pebble_reinstall(platforms, worker, app_hash):
+    pebble_kill(worker)
+    pebble_commands.wipe(worker)
+    _install(platforms)
+    worker.set_installed_app(app_hash)
+
+def pebble_snapshot(platforms, worker, app_hash):
+    """Save the emulators' storage, with the app installed, for `pebble_restore`."""
+    # Storage is only consistent once the emulators have stopped writing to it
+    pebble_kill(worker)
+    worker.set_snapshot_app(None)
+    pebble_commands.save_storage(worker, worker.snapshot_dir)
+    worker.set_snapshot_app(app_hash)
+    _boot(platforms)
+    worker.set_installed_app(app_hash)
+
+def pebble_restore(platforms, worker, app_hash):
+    """Restart the emulators from the storage saved by `pebble_snapshot`, or reinstall if there's no snapshot of this app."""
+    if worker.snapshot_app() != app_hash:
+        return pebble_reinstall(platforms, worker, app_hash)
+    pebble_kill(worker)
+    pebble_commands.restore_storage(worker, worker.snapshot_dir)
+    _boot(platforms)
+    worker.set_installed_app(app_hash)
+
+def _install(platforms):
+    marks = {}
     for platform in platforms:
-        _call('pebble install --emulator {}'.format(platform))
-    # Give the watchface time to show up
-    time.sleep(10)
-
-def pebble_reinstall(platforms):
-    _call('pebble kill')
-    _call('pebble wipe')
+        # Connecting boots the emulator if it isn't running
+        connection(platform).connect()
+        marks[platform] = connection(platform).logs.mark()
+        pebble_commands.install(connection(platform), pbw_filename())
+    # Wait for the watchface to show up
     for platform in platforms:
-        _call('pebble install --emulator {}'.format(platform))
-    time.sleep(10)
+        wait_for_render(platform, marks[platform])
 
-def set_config(config, platforms):
-    for platform in platforms:
-        emu = ManagedEmulatorTransport(platform)
-        emu.connect()
-        time.sleep(0.5)
-        emu.send_packet(WebSocketPhonesimAppConfig(
-            config=AppConfigSetup()),
-            target=MessageTargetPhone()
-        )
-        time.sleep(0.5)
-        emu.send_packet(WebSocketPhonesimAppConfig(
-            config=AppConfigResponse(data=urllib2.quote(json.dumps(config)))),
-            target=MessageTargetPhone()
-        )
-    # Wait for the watchface to re-render and request data
-    time.sleep(0.5)
+def _boot(platforms):
+    # The installed watchface starts with the firmware, before its logs can be watched for,
+    # so configure it and wait for the render that follows
+    for_each_platform(lambda platform: connection(platform).connect(), platforms)
+    set_config(dict(BASE_CONFIG, nightscout_url=mock_host()), platforms)
+
+def wait_for_render(platform, since):
+    if connection(platform).logs.wait_for(RENDERED_DATA, since, RENDER_TIMEOUT_SECONDS) is None:
+        raise Exception('Timed out waiting for the watchface to render data on {}'.format(platform))
+    # The line is logged once the layers are marked dirty, just before they're drawn
+    time.sleep(RENDER_SETTLE_SECONDS)
 
-def pebble_screenshot(filename, platform):
-    _call('pebble screenshot --emulator {} --no-open {}'.format(platform, filename))
+def set_config(config, platforms):
+    setup = WebSocketPhonesimAppConfig(config=AppConfigSetup())
+    response = WebSocketPhonesimAppConfig(config=AppConfigResponse(data=urllib2.quote(json.dumps(config))))
+
+    def send(platform):
+        conn = connection(platform)
+        since = conn.logs.mark()
+        for _ in range(CONFIG_ATTEMPTS):
+            conn.send_to_phone(setup)
+            conn.send_to_phone(response)
+            received = conn.logs.wait_for(PREFERENCES_UPDATED, since, CONFIG_RETRY_SECONDS)
+            if received is not None:
+                # Wait for the watchface to re-render with the new preferences and data
+                return wait_for_render(platform, received)
+        raise Exception('Config was never received by the JS on {}'.format(platform))
+
+    for_each_platform(send, platforms)
+
+def set_watch_time(platforms):
+    for_each_platform(lambda platform: connection(platform).set_time(CLOCK.now()), platforms)
+
+def wait_for_frame_change(platform, frame, since, timeout=FRAME_CHANGE_TIMEOUT_SECONDS):
+    """When a screenshot first differed from `frame`, or None on timeout.
+
+    Screenshots are only taken once the watchface has logged rendering data after log position `since`.
+    """
+    deadline = time.time() + timeout
+    if connection(platform).logs.wait_for(RENDERED_DATA, since, timeout) is None:
+        return None
+    while True:
+        if not (connection(platform).screenshot() == frame).all():
+            return time.time()
+        if time.time() + FRAME_POLL_SECONDS > deadline:
+            return None
+        time.sleep(FRAME_POLL_SECONDS)
 
 def _call(command_str, **kwargs):
     print command_str
@@ -71,6 +220,18 @@ def _call(command_str, **kwargs):
         **kwargs
     ).communicate()
 
+def _check_call(command_str, **kwargs):
+    print command_str
+    process = subprocess.Popen(
+        command_str.split(' '),
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        **kwargs
+    )
+    out, err = process.communicate()
+    if process.returncode != 0:
+        raise Exception('`{}` failed:\n{}{}'.format(command_str, out, err))
+    return out, err
+
 def ensure_empty_dir(dirname):
     if os.path.isdir(dirname):
         _, err = _call('rm -r {}'.format(dirname))
@@ -78,20 +239,28 @@ def ensure_empty_dir(dirname):
             raise Exception(err)
     os.mkdir(dirname)
 
-def image_diff(test_file, gold_file, out_file):
-    # requires ImageMagick
-    _, diff = _call('compare -metric AE {} {} {}'.format(test_file, gold_file, out_file))
-    return diff == '0'
 
+class ScreenshotTest(Scenario):
+    # Number of pixels allowed to differ from the gold image
+    diff_tolerance = 0
+    # (x, y, w, h) rectangles excluded from the comparison, e.g. the time element
+    diff_ignore_regions = ()
 
-class ScreenshotTest(object):
     @staticmethod
     def out_dir():
         return os.path.join(os.path.dirname(__file__), 'output')
 
     @classmethod
     def summary_filename(cls):
-        return os.path.join(cls.out_dir(), 'screenshots.html')
+        return os.path.join(cls.out_dir(), report.INDEX_FILENAME)
+
+    @classmethod
+    def results_filename(cls):
+        worker = getattr(ScreenshotTest, 'worker', None)
+        if worker is None or worker.index == 0:
+            return os.path.join(cls.out_dir(), 'results.jsonl')
+        else:
+            return os.path.join(cls.out_dir(), 'results-worker{}.jsonl'.format(worker.index))
 
     def circleci_url(self):
         if os.environ.get('CIRCLECI'):
@@ -109,10 +278,6 @@ class ScreenshotTest(object):
     def test_filename(cls, platform):
         return os.path.join(cls.out_dir(), 'img', '{}-{}.png'.format(cls.__name__, platform))
 
-    @classmethod
-    def gold_filename(cls, platform):
-        return os.path.join(os.path.dirname(__file__), 'gold', '{}-{}.png'.format(cls.__name__, platform))
-
     @classmethod
     def diff_filename(cls, platform):
         return os.path.join(cls.out_dir(), 'diff', '{}-{}.png'.format(cls.__name__, platform))
@@ -122,29 +287,49 @@ class ScreenshotTest(object):
     def ensure_environment(cls):
         if not hasattr(ScreenshotTest, '_loaded_environment'):
             ScreenshotTest.test_count = 0
-            pebble_install_and_run(PLATFORMS)
-            ensure_empty_dir(cls.out_dir())
-            os.mkdir(os.path.join(cls.out_dir(), 'img'))
-            os.mkdir(os.path.join(cls.out_dir(), 'diff'))
-            ScreenshotTest.summary_file = SummaryFile(cls.summary_filename(), BASE_CONFIG)
+            ScreenshotTest.worker = EMULATOR_POOL.acquire()
+            ScreenshotTest.worker.activate()
+            if not ScreenshotTest.worker.mock_server_is_up():
+                raise Exception('No mock server for {}'.format(ScreenshotTest.worker))
+            # Test processes sharing the pool share the build and output directories
+            EMULATOR_POOL.run_once('build', pebble_build)
+            EMULATOR_POOL.run_once('output', cls.make_out_dirs)
+            ScreenshotTest.pbw_hash = result_cache.pbw_hash(pbw_filename())
+            ScreenshotTest.summary_file = SummaryFile(cls.results_filename(), cls.out_dir())
+            # Rendered once rather than after every result; the last test process to finish renders them all
+            atexit.register(cls.finish_report)
+            if latency_benchmark.enabled():
+                ScreenshotTest.benchmark_file = latency_benchmark.BenchmarkFile(latency_benchmark.BENCHMARK_FILE)
+                # Every test has to run to be measured
+                ScreenshotTest.result_cache = ResultCache(None)
+            else:
+                ScreenshotTest.result_cache = ResultCache()
             ScreenshotTest._loaded_environment = True
+
+    @classmethod
+    def finish_report(cls):
+        IMAGE_WRITER.close()
+        report.render(cls.out_dir(), BASE_CONFIG)
+
+    @classmethod
+    def ensure_emulators(cls):
+        # Emulators are only started once a test needs them, which may be never if all results are cached
+        if not hasattr(ScreenshotTest, '_installed'):
+            pebble_install_and_run(PLATFORMS, ScreenshotTest.worker, ScreenshotTest.pbw_hash)
+            if ScreenshotTest.worker.snapshot_app() != ScreenshotTest.pbw_hash:
+                pebble_snapshot(PLATFORMS, ScreenshotTest.worker, ScreenshotTest.pbw_hash)
+            ScreenshotTest._installed = True
         else:
             ScreenshotTest.test_count += 1
             # The Pebble emulator gets flaky after a while
-            if ScreenshotTest.test_count % 10 == 0:
-                pebble_reinstall(PLATFORMS)
-
-    def sgvs(self):
-        raise NotImplementedError
+            if ScreenshotTest.test_count % 10 == 0 or not ScreenshotTest.worker.is_healthy():
+                pebble_restore(PLATFORMS, ScreenshotTest.worker, ScreenshotTest.pbw_hash)
 
-    def treatments(self):
-        return []
-
-    def profile(self):
-        return []
-
-    def devicestatus(self):
-        return []
+    @classmethod
+    def make_out_dirs(cls):
+        ensure_empty_dir(cls.out_dir())
+        os.mkdir(os.path.join(cls.out_dir(), 'img'))
+        os.mkdir(os.path.join(cls.out_dir(), 'diff'))
 
     def test_screenshot(self):
         if not hasattr(self, 'config'):
@@ -153,122 +338,190 @@ class ScreenshotTest(object):
         # Create the SGVs at test run time, not at test definition time.
         # Otherwise, recency display in the screenshots can differ across runs.
         if not hasattr(self.sgvs, '__call__'):
-            raise "sgvs attribute of test instance must be callable"
+            raise Exception("sgvs attribute of test instance must be callable")
 
         self.ensure_environment()
 
-        # XXX this should all be run in a single process, e.g. with Tornado
         self.test_sgvs = self.sgvs()
-        post_mock_server('/set-sgv', self.test_sgvs)
-
         self.test_treatments = self.treatments()
-        post_mock_server('/set-treatments', self.test_treatments)
-
         self.test_profile = self.profile()
-        post_mock_server('/set-profile', self.test_profile)
-
         self.test_devicestatus = self.devicestatus()
+
+        result_keys = dict((platform, self.result_key(platform)) for platform in PLATFORMS)
+        cached = dict((platform, ScreenshotTest.result_cache.lookup(result_keys[platform])) for platform in PLATFORMS)
+        if all(cached.values()):
+            for platform in PLATFORMS:
+                shutil.copyfile(cached[platform], self.test_filename(platform))
+                ScreenshotTest.summary_file.add_test_result(self, platform, True)
+            return
+
+        self.ensure_emulators()
+        benchmark = latency_benchmark.enabled()
+        if benchmark:
+            latency = LatencyMeasurement(self.__class__.__name__, 'first_data', PLATFORMS)
+
+        # XXX this should all be run in a single process, e.g. with Tornado
+        post_mock_server('/set-sgv', self.test_sgvs)
+        post_mock_server('/set-treatments', self.test_treatments)
+        post_mock_server('/set-profile', self.test_profile)
         post_mock_server('/set-devicestatus', self.test_devicestatus)
 
-        set_config(dict(BASE_CONFIG, nightscout_url=MOCK_HOST, __CLEAR_CACHE__=True, **self.config), PLATFORMS)
+        set_mock_server_clock()
+        if not CLOCK.is_real():
+            set_watch_time(PLATFORMS)
+
+        if benchmark:
+            latency.data_set()
+        # Count only the requests made for this test's config
+        post_mock_server('/stats/reset', None)
+        config = dict(BASE_CONFIG, nightscout_url=mock_host(), **self.config)
+        log_marks = dict((platform, connection(platform).logs.mark()) for platform in PLATFORMS)
+        set_config(dict(config, __CLEAR_CACHE__=True), PLATFORMS)
+        too_big = dict((platform, self.check_message_sizes(platform, log_marks[platform])) for platform in PLATFORMS)
+        self.request_stats = get_mock_server('/stats')['requests']
+        if benchmark:
+            latency.finish(ScreenshotTest.benchmark_file)
+
+        # Capture and compare on both emulators at once, then record the results in platform order
+        gold_frames = dict((platform, GOLD_STORE.frame(self.gold_name(platform))) for platform in PLATFORMS)
+        results = for_each_platform(lambda platform: self.check_screenshot(platform, gold_frames[platform]), PLATFORMS)
 
         fails = []
-        for platform in PLATFORMS:
-            pebble_screenshot(self.test_filename(platform), platform)
-
-            try:
-                os.stat(self.gold_filename(platform))
-            except OSError:
-                images_match = False
-                reason = 'Test is missing "gold" image: {}'.format(self.gold_filename(platform))
+        for platform, (frame, images_match, reason) in zip(PLATFORMS, results):
+            reasons = ([] if images_match else [reason]) + too_big[platform]
+            if not reasons:
+                # Only needed for the report and the result cache
+                IMAGE_WRITER.write(frame, self.test_filename(platform), functools.partial(
+                    ScreenshotTest.result_cache.store, result_keys[platform], self.test_filename(platform)))
             else:
-                images_match = image_diff(self.test_filename(platform), self.gold_filename(platform), self.diff_filename(platform))
-                reason = 'Screenshot does not match expected: "{}"'.format(self.__class__.__doc__)
-                reason += '\n' + self.circleci_url() if self.circleci_url() else ''
+                screenshot_diff.save_image(frame, self.test_filename(platform))
+                fails.extend((platform, r) for r in reasons)
+            ScreenshotTest.summary_file.add_test_result(self, platform, not reasons)
 
-            ScreenshotTest.summary_file.add_test_result(self, platform, images_match)
-            if not images_match:
-                fails.append((platform, reason))
+        if benchmark:
+            # Same config, so the JS fetches with its caches intact
+            latency = LatencyMeasurement(self.__class__.__name__, 'refresh', PLATFORMS)
+            set_config(config, PLATFORMS)
+            latency.finish(ScreenshotTest.benchmark_file)
 
         assert fails == [], '\n'.join(['{}: {}'.format(p, reason) for p, reason in fails])
 
+    def check_screenshot(self, platform, gold_frame):
+        """Capture one platform's frame and compare it with the gold image. Returns (frame, matched, failure reason)."""
+        frame = connection(platform).screenshot()
+        if gold_frame is None:
+            return frame, False, 'Test is missing "gold" image: {}. To use the screenshot: python test/gold_store.py rebaseline {}'.format(
+                self.gold_name(platform), self.gold_name(platform))
+        images_match = screenshot_diff.frames_match(
+            frame,
+            gold_frame,
+            self.diff_filename(platform),
+            self.diff_tolerance,
+            self.diff_ignore_regions,
+        )
+        reason = 'Screenshot does not match expected: "{}"'.format(self.__class__.__doc__)
+        reason += '\n' + self.circleci_url() if self.circleci_url() else ''
+        return frame, images_match, reason
+
+    def check_message_sizes(self, platform, since):
+        """Reasons to fail for the messages the JS sent to the watchface since `since` which are too big for its inbox."""
+        reasons = []
+        for match in connection(platform).logs.matches_since(MESSAGE_SENT, since):
+            reason = message_budget.over_budget(json.loads(match.group(1)))
+            if reason:
+                reasons.append(reason)
+        return reasons
+
+    def result_key(self, platform):
+        """Key of this test's result in the result cache. See result_cache.py."""
+        now_ms = CLOCK.now_ms()
+        fixtures = result_cache.normalize_times(
+            [self.test_sgvs, self.test_treatments, self.test_profile, self.test_devicestatus],
+            now_ms
+        )
+        return result_cache.result_key(
+            ScreenshotTest.pbw_hash,
+            platform,
+            # Not including the mock server URL, which depends on the emulator worker
+            dict(BASE_CONFIG, **self.config),
+            fixtures,
+            result_cache.time_of_day(now_ms),
+            [self.diff_tolerance, self.diff_ignore_regions],
+            GOLD_STORE.frame_hash(self.gold_name(platform)),
+        )
+
+
+class LatencyMeasurement(object):
+    """Times the phases of one scenario on every platform. See latency_benchmark.py."""
+    def __init__(self, scenario, kind, platforms):
+        self.platforms = platforms
+        # A refresh doesn't change the frame, so there's nothing to compare against
+        self.frames = {}
+        if kind == 'first_data':
+            self.frames = dict(zip(platforms, for_each_platform(lambda p: connection(p).screenshot(), platforms)))
+        self.marks = dict((p, connection(p).logs.mark()) for p in platforms)
+        started = time.time()
+        self.timers = dict((p, latency_benchmark.Timer(scenario, p, kind, started)) for p in platforms)
+
+    def data_set(self):
+        now = time.time()
+        for timer in self.timers.values():
+            timer.mark('data_set', now)
+
+    def finish(self, benchmark_file):
+        """Read the phases from the logs once the watchface has rendered, then wait for a new frame."""
+        def measure(platform):
+            logs, timer = connection(platform).logs, self.timers[platform]
+            position = self.marks[platform]
+            for phase, pattern in LOGGED_PHASES:
+                found = logs.wait_for(pattern, position, 0)
+                if found is not None:
+                    timer.mark(phase, logs.time_of(found))
+                    position = found
+            if platform in self.frames:
+                timer.mark('frame_changed', wait_for_frame_change(platform, self.frames[platform], self.marks[platform]))
+
+        for_each_platform(measure, self.platforms)
+        for platform in self.platforms:
+            benchmark_file.append(self.timers[platform])
+
 
 class SummaryFile(object):
-    """Generate summary file with screenshots, in a very janky way for now."""
-    def __init__(self, out_file, base_config):
-        self.out_file = out_file
-        self.base_config = base_config
-        self.fails = ''
-        self.passes = ''
-
-    def write(self):
-        with open(self.out_file, 'w') as f:
-            f.write("""
-            <head>
-              <style>
-                td { border: 1px solid #666; padding: 4px; vertical-align: top; }
-                table { border-collapse: collapse; margin-bottom: 2em; }
-                img.pass { border: 5px solid #aea; }
-                img.fail { border: 5px solid red; }
-                code { display: block; border-top: 1px solid #999; margin-top: 0.5em; padding-top: 0.5em; }
-              </style>
-            </head>
-            <body>
-            """
-            +
-            """
-              <table>
-                {fails}
-              </table>
-              <table>
-                {passes}
-              </table>
-            """.format(fails=self.fails, passes=self.passes))
-
-            f.write("""
-            <strong>Default config</strong> (each test's config is merged into this):
-            <br>
-            <code>{}</code>
-            """.format(json.dumps(self.base_config)))
+    """Appends each result to this process's results file, from which report.py renders the HTML."""
+    def __init__(self, results_filename, out_dir):
+        self.results = report.ResultsFile(results_filename)
+        self.out_dir = out_dir
 
     def add_test_result(self, test_instance, platform, passed):
-        details = """
-            <strong>{classname} [{platform}]</strong> {doc}
-            <code>{config}</code>
-            <code>{sgvs}</code>
-        """.format(
-            classname=test_instance.__class__.__name__,
-            platform=platform,
-            doc=test_instance.__class__.__doc__ or '',
-            config=json.dumps(test_instance.config),
-            sgvs=json.dumps(self.formatted_sgvs(test_instance.test_sgvs))
-        )
+        details = [
+            json.dumps(test_instance.config),
+            json.dumps(self.formatted_sgvs(test_instance.test_sgvs)),
+        ]
         if test_instance.test_treatments:
-            details += "<code>{treatments}</code>".format(treatments=self.format_created_at(test_instance.test_treatments))
+            details.append(json.dumps(self.format_created_at(test_instance.test_treatments)))
         if test_instance.test_profile:
-            details += "<code>{profile}</code>".format(profile=test_instance.test_profile)
+            details.append(json.dumps(test_instance.test_profile))
         if test_instance.test_devicestatus:
-            details += "<code>{devicestatus}</code>".format(devicestatus=self.format_created_at(test_instance.test_devicestatus))
-        result = """
-        <tr>
-          <td><img src="{test_filename}" class="{klass}"></td>
-          <td><img src="{diff_filename}"></td>
-          <td>{details}</td>
-        </tr>
-        """.format(
-            test_filename=self.relative_path(test_instance.test_filename(platform)),
-            klass=('pass' if passed else 'fail'),
-            diff_filename=self.relative_path(test_instance.diff_filename(platform)),
-            details=details,
-        )
-        if passed:
-            self.passes += result
+            details.append(json.dumps(self.format_created_at(test_instance.test_devicestatus)))
+        if hasattr(test_instance, 'request_stats'):
+            # Requests from both platforms, which share a mock server
+            details.append('\n'.join(format_stats(test_instance.request_stats)))
         else:
-            self.fails += result
-        self.write()
+            details.append('Skipped: passed with the same build, config, data and gold image')
+        self.results.append({
+            'name': test_instance.__class__.__name__,
+            'platform': platform,
+            'doc': test_instance.__class__.__doc__ or '',
+            'passed': passed,
+            'image': self.relative_path(test_instance.test_filename(platform)),
+            # diff images are only written for failures
+            'diff': None if passed else self.relative_path(test_instance.diff_filename(platform)),
+            'details': details,
+            'time': time.time(),
+        })
 
     def relative_path(self, filename):
-        return os.path.relpath(filename, os.path.dirname(self.out_file))
+        return os.path.relpath(filename, self.out_dir)
 
     def formatted_sgvs(self, sgvs):
         return [
@@ -291,7 +544,7 @@ class SummaryFile(object):
 
     @staticmethod
     def format_ago(time):
-        minutes = int((datetime.now().replace(tzinfo=tzlocal()) - time).total_seconds() / 60)
+        minutes = int((CLOCK.now_datetime().replace(tzinfo=tzlocal()) - time).total_seconds() / 60)
         if minutes < 60:
             return '{}m'.format(minutes)
         else:
@@ -0,0 +1,195 @@
+"""
+A clock shared by the screenshot harness, its fixtures and the mock Nightscout
+server, which can be frozen or run at a multiple of real time.
+
+Fixtures are generated relative to the virtual time, so with a frozen clock a
+test's data is as old when it's rendered as when it was generated, however long
+the emulator took to get there. The harness sets the mock server's clock to its
+own before each test (POST /clock), and the server then:
+
+- hides elements from after the virtual time, so a long history (e.g. from
+  synthetic_data.py or a recording) is revealed as the clock advances
+- with `shift`, serves times moved by how far the virtual time was behind the
+  real time when the clock was set, and moves times in queries back. The JS in
+  the emulator runs on real time, so this makes the data as old to it as it is
+  in virtual time.
+
+Where the emulator supports it, the watch's clock is set to the virtual time.
+
+SCREENSHOT_CLOCK configures the harness's clock:
+
+    (unset)                     real time
+    frozen                      frozen at when the tests started
+    frozen@2016-10-18T12:34:00  frozen at the given time (local unless it has an offset)
+    x60                         60 times real time, from when the tests started
+    x60@2016-10-17T12:00:00     60 times real time, from the given time
+
+The mock server's clock can also be set by hand, e.g.:
+
+    curl -d '{"time": "2016-10-18T12:00:00", "rate": 0}' http://localhost:5555/clock
+    curl -d '{"advance_ms": 300000}' http://localhost:5555/clock
+
+    # Back to real time
+    curl -d '{}' http://localhost:5555/clock
+
+test/js/soak.js steps the server's clock this way to poll through a day of data
+in seconds.
+"""
+
+import os
+import re
+import time
+from datetime import datetime
+
+from nightscout_query import to_millis
+from result_cache import ISO_DATE
+from result_cache import MILLIS_KEYS
+
+_OPERATOR_KEY = re.compile(r'^find\[([^\]]+)\]\[(\$[a-z]+)\]$')
+
+
+class VirtualClock(object):
+    """Virtual time which started at `start` (epoch seconds) when the real time was `real_start`,
+    and has since moved at `rate` times real time. A rate of 0 is a frozen clock.
+    """
+    def __init__(self, start=None, rate=1, shift=False):
+        self.set(start, rate, shift)
+
+    def set(self, start=None, rate=1, shift=False, real_start=None):
+        """Start (by default from now) at `rate` times real time.
+
+        With `shift`, times served by the mock server are moved by how far
+        `start` is behind the real time.
+        """
+        real_start = time.time() if real_start is None else real_start
+        start = real_start if start is None else float(start)
+        shift_ms = int(round((real_start - start) * 1000)) if shift else 0
+        # Replaced as a whole, so that other threads never see half of a change
+        self._state = (real_start, start, float(rate), shift_ms)
+
+    def advance(self, seconds):
+        real_start, start, rate, shift_ms = self._state
+        self._state = (real_start, start + seconds, rate, shift_ms)
+
+    @property
+    def rate(self):
+        return self._state[2]
+
+    @property
+    def shift_ms(self):
+        return self._state[3]
+
+    def is_real(self):
+        real_start, start, rate, shift_ms = self._state
+        return start == real_start and rate == 1 and shift_ms == 0
+
+    def now(self):
+        real_start, start, rate, _ = self._state
+        return start + (time.time() - real_start) * rate
+
+    def now_ms(self):
+        return int(round(self.now() * 1000))
+
+    def now_datetime(self):
+        """The local time as a naive datetime, like datetime.now()."""
+        return datetime.fromtimestamp(self.now())
+
+    def to_json(self):
+        return {'time': self.now_ms(), 'rate': self.rate, 'shift_ms': self.shift_ms}
+
+    def update(self, body):
+        """Apply the JSON of a POST to /clock: `time` (epoch milliseconds or ISO 8601), `rate`,
+        `shift` and `advance_ms`, all optional. Raises ValueError if they're malformed.
+
+        Anything but `advance_ms` resets the others to their defaults, so `{}` is real time.
+        """
+        if not isinstance(body, dict):
+            raise ValueError('Expected an object, got {}'.format(body))
+        unknown = set(body) - set(['time', 'rate', 'shift', 'advance_ms'])
+        if unknown:
+            raise ValueError('Unknown clock settings: {}'.format(', '.join(sorted(unknown))))
+        if set(body) != set(['advance_ms']):
+            start = None
+            if body.get('time') is not None:
+                millis = to_millis(body['time'])
+                if millis is None:
+                    raise ValueError('Bad time: {}'.format(body['time']))
+                start = millis / 1000.0
+            rate = _number(body, 'rate', 1)
+            if rate < 0:
+                raise ValueError('Rate must not be negative')
+            self.set(start, rate, bool(body.get('shift')))
+        self.advance(_number(body, 'advance_ms', 0) / 1000.0)
+
+def _number(body, key, default):
+    value = body.get(key, default)
+    if isinstance(value, bool) or not isinstance(value, (int, long, float)):
+        raise ValueError('{} must be a number, got {}'.format(key, value))
+    return value
+
+def parse(spec):
+    """A VirtualClock configured by a SCREENSHOT_CLOCK value."""
+    if not spec:
+        return VirtualClock()
+    mode, _, start = spec.partition('@')
+    if mode == 'frozen':
+        rate = 0
+    elif mode.startswith('x'):
+        try:
+            rate = float(mode[1:])
+        except ValueError:
+            rate = -1
+    else:
+        rate = -1
+    if rate < 0:
+        raise ValueError('Bad SCREENSHOT_CLOCK {}: expected frozen or x<rate>, optionally @<time>'.format(spec))
+    start_ms = to_millis(start) if start else None
+    if start and start_ms is None:
+        raise ValueError('Bad SCREENSHOT_CLOCK time: {}'.format(start))
+    return VirtualClock(None if start_ms is None else start_ms / 1000.0, rate)
+
+CLOCK = parse(os.environ.get('SCREENSHOT_CLOCK'))
+
+
+########## Serving in virtual time
+
+def query_in_virtual_time(query, time_field, clock):
+    """Flat query args with times on `time_field` moved back by the clock's shift,
+    and limited to elements from no later than the virtual time.
+    """
+    if time_field is None:
+        return query
+    out = {}
+    until_ms = clock.now_ms()
+    for key, value in query.items():
+        m = _OPERATOR_KEY.match(key)
+        millis = to_millis(value) if m and m.group(1) == time_field else None
+        if millis is None:
+            out[key] = value
+        elif m.group(2) == '$lte':
+            until_ms = min(until_ms, millis - clock.shift_ms)
+        else:
+            out[key] = str(int(millis - clock.shift_ms))
+    out['find[{}][$lte]'.format(time_field)] = str(until_ms)
+    return out
+
+def shift_times(value, shift_ms):
+    """Elements with every time in them moved by `shift_ms`. ISO 8601 times come back in UTC."""
+    if isinstance(value, dict):
+        out = {}
+        for k, v in value.items():
+            if k in MILLIS_KEYS and isinstance(v, (int, long, float)) and not isinstance(v, bool):
+                out[k] = v + shift_ms
+            else:
+                out[k] = shift_times(v, shift_ms)
+        return out
+    elif isinstance(value, list):
+        return [shift_times(v, shift_ms) for v in value]
+    elif isinstance(value, basestring) and ISO_DATE.match(value):
+        millis = to_millis(value)
+        return value if millis is None else _iso(millis + shift_ms)
+    else:
+        return value
+
+def _iso(millis):
+    return datetime.utcfromtimestamp(millis / 1000.0).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'